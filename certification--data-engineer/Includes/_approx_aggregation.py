@@ -0,0 +1,490 @@
+# Databricks notebook source
+import builtins  # Lessons shadow sum, max and round with pyspark.sql.functions, e.g. DE 0.05
+import math
+
+AGGREGATION_MODES = ["exact", "approx"]
+AGGREGATION_MODE_KEY = "da.aggregation.mode"
+
+def get_aggregation_mode():
+    return spark.conf.get(AGGREGATION_MODE_KEY, "exact")
+
+def has_native_hll():
+    """
+    The hll_sketch_* functions are only available from Spark 3.5 (DBR 13.3); older runtimes use HyperLogLog below.
+    """
+    try:
+        spark.sql("SELECT hll_sketch_estimate(hll_sketch_agg(1))").collect()
+        return True
+    except Exception:
+        return False
+
+None
+
+# COMMAND ----------
+
+class HyperLogLog:
+    """
+    A mergeable HyperLogLog sketch built from SQL expressions, for runtimes without hll_sketch_agg.
+
+    Each value is hashed with xxhash64; the first precision bits select one of 2^precision registers and
+    the register keeps the maximum position of the first 1 bit among the remaining bits. Registers are stored
+    as a sparse map, and merging two sketches keeps the maximum of each register.
+    """
+
+    @staticmethod
+    def get_register_columns(column, precision):
+        hashed = F.xxhash64(column)
+        register = F.shiftrightunsigned(hashed, 64 - precision).cast("int")
+        # instr() of the 64 bit binary string is the number of leading zeros + 1, or 0 if all bits are 0
+        first_one = F.instr(F.lpad(F.bin(F.shiftleft(hashed, precision)), 64, "0"), "1")
+        rank = F.when(first_one == 0, F.lit(64 - precision + 1)).otherwise(first_one)
+        return register.alias("register"), rank.alias("rank")
+
+
+    @staticmethod
+    def estimate(registers, precision):
+        """
+        :param registers: {register: rank}, missing registers are 0
+        :return: the estimated number of distinct values
+        """
+        m = 2 ** precision
+        alpha = 0.7213 / (1 + 1.079 / m)
+        zeros = m - len(registers)
+        harmonic = zeros + builtins.sum(2.0 ** -rank for rank in registers.values())
+        estimate = alpha * m * m / harmonic
+
+        if estimate <= 2.5 * m and zeros > 0:
+            estimate = m * math.log(m / zeros)  # Linear counting is more accurate for small cardinalities
+        return int(builtins.round(estimate))
+
+None
+
+# COMMAND ----------
+
+class DDSketch:
+    """
+    A mergeable quantile sketch with a relative accuracy guarantee, built from SQL expressions.
+
+    Positive values are counted in logarithmic buckets, ceil(log(x) / log(gamma)) with
+    gamma = (1 + accuracy) / (1 - accuracy), so any quantile is estimated within the relative accuracy.
+    Negative values use the same buckets over their absolute value and zeros are counted separately.
+    Merging two sketches adds the counts of each bucket.
+    """
+
+    @staticmethod
+    def get_gamma(relative_accuracy):
+        return (1 + relative_accuracy) / (1 - relative_accuracy)
+
+
+    @staticmethod
+    def get_bucket_column(column, relative_accuracy):
+        gamma = DDSketch.get_gamma(relative_accuracy)
+        return F.ceil(F.log(F.abs(F.col(column))) / math.log(gamma)).cast("int")
+
+
+    @staticmethod
+    def get_quantiles(positive, negative, zeros, quantiles, relative_accuracy):
+        """
+        :param positive: {bucket: count} of positive values
+        :param negative: {bucket: count} of negative values
+        :param zeros: count of zeros
+        :return: list of estimates, one per quantile, or None if the sketch is empty
+        """
+        gamma = DDSketch.get_gamma(relative_accuracy)
+        value = lambda bucket: 2 * gamma ** bucket / (gamma + 1)
+
+        # Buckets in ascending order of the values they hold
+        buckets = [(-value(b), c) for b, c in sorted(negative.items(), reverse=True)]
+        if zeros: buckets.append((0.0, zeros))
+        buckets += [(value(b), c) for b, c in sorted(positive.items())]
+
+        total = builtins.sum(c for _, c in buckets)
+        if total == 0: return [None for q in quantiles]
+
+        estimates = []
+        for q in quantiles:
+            rank, seen = q * (total - 1), 0
+            for estimate, count in buckets:
+                seen += count
+                if seen > rank: break
+            estimates.append(estimate)
+        return estimates
+
+None
+
+# COMMAND ----------
+
+class SketchAggregation:
+    """
+    One definition of a dashboard's group-by, answered exactly, with Spark's built-in approximations,
+    or from mergeable sketches persisted in Delta.
+
+      Attributes:
+          group_by: grouping columns, e.g. ["geo.state"]
+          distinct_columns: columns to count distinct values of, e.g. ["user_id"]
+          quantile_columns: numeric columns to compute quantiles of, e.g. ["ecommerce.purchase_revenue_in_usd"]
+          quantiles: the quantiles to compute, e.g. [0.5, 0.9, 0.99]
+          heavy_hitter_column: column whose most frequent values are reported per group (optional)
+          top_k: number of heavy hitters per group
+          precision: HyperLogLog precision; the relative error of distinct counts is about 1.04 / sqrt(2^precision)
+          relative_accuracy: relative accuracy of the quantiles
+
+      Methods:
+          aggregate(df, mode=None): returns one row per group, exactly or approximately depending on the mode
+          get_sketches(df, day_column): returns the sketches of each day and group, to be persisted by SketchStore
+
+    The mode defaults to the "da.aggregation.mode" Spark configuration, so a whole dashboard can be
+    switched at once, e.g. with DA.set_aggregation_mode("approx").
+    """
+
+    def __init__(self, group_by, distinct_columns=None, quantile_columns=None, quantiles=None, heavy_hitter_column=None,
+                 top_k=10, precision=12, relative_accuracy=0.01):
+        self.group_by = group_by
+        self.distinct_columns = distinct_columns or []
+        self.quantile_columns = quantile_columns or []
+        self.quantiles = quantiles or [0.5, 0.9, 0.99]
+        self.heavy_hitter_column = heavy_hitter_column
+        self.top_k = top_k
+        self.precision = precision
+        self.relative_accuracy = relative_accuracy
+
+
+    @staticmethod
+    def get_alias(column):
+        return column.replace(".", "_")
+
+
+    def get_group_columns(self):
+        return [F.col(c).alias(SketchAggregation.get_alias(c)) for c in self.group_by]
+
+
+    def get_group_key(self):
+        return F.to_json(F.struct(*self.get_group_columns())).alias("group_key")
+
+
+    def aggregate(self, df, mode=None):
+        """
+        Returns one row per group with distinct_{column} counts and {column}_p{quantile} values;
+        heavy hitters are returned as an array of (value, count) structs named top_{column}.
+        """
+        mode = mode or get_aggregation_mode()
+        assert mode in AGGREGATION_MODES, f"Expected the mode to be one of {AGGREGATION_MODES}, found {mode}"
+
+        # The relative standard deviation of approx_count_distinct that matches the sketch's precision
+        rsd = builtins.max(0.01, 1.04 / math.sqrt(2 ** self.precision))
+        accuracy = int(1 / self.relative_accuracy)
+        aggregates = []
+
+        for column in self.distinct_columns:
+            distinct = F.countDistinct(column) if mode == "exact" else F.approx_count_distinct(column, rsd)
+            aggregates.append(distinct.alias(f"distinct_{SketchAggregation.get_alias(column)}"))
+
+        for column in self.quantile_columns:
+            quantiles = ", ".join(str(q) for q in self.quantiles)
+            function = f"percentile({column}, array({quantiles}))" if mode == "exact" else f"percentile_approx({column}, array({quantiles}), {accuracy})"
+            aggregates.append(F.expr(function).alias(f"{SketchAggregation.get_alias(column)}_quantiles"))
+
+        result = df.groupBy(*self.get_group_columns()).agg(*aggregates)
+        for column in self.quantile_columns:
+            alias = SketchAggregation.get_alias(column)
+            for i, q in enumerate(self.quantiles):
+                result = result.withColumn(f"{alias}_p{builtins.round(q*100)}", F.col(f"{alias}_quantiles")[i])
+            result = result.drop(f"{alias}_quantiles")
+
+        if self.heavy_hitter_column is not None:
+            # The exact heavy hitters need a full count per value; approx mode counts a 10% sample instead
+            source = df if mode == "exact" else df.sample(0.1, seed=42)
+            scale = 1 if mode == "exact" else 10
+            keys = [SketchAggregation.get_alias(c) for c in self.group_by]
+            alias = SketchAggregation.get_alias(self.heavy_hitter_column)
+            counts = (source.groupBy(*self.get_group_columns(), F.col(self.heavy_hitter_column).cast("string").alias("value"))
+                            .agg((F.count(F.lit(1)) * scale).alias("count")))
+            top = (counts.groupBy(*keys)
+                         .agg(F.slice(F.array_sort(F.collect_list(F.struct(-F.col("count"), "value", "count"))), 1, self.top_k).alias("top"))
+                         .select(*keys, F.transform("top", lambda t: F.struct(t["value"].alias("value"), t["count"].alias("count"))).alias(f"top_{alias}")))
+            result = result.join(top, keys, "left")
+
+        return result
+
+
+    def get_sketches(self, df, day_column):
+        """
+        Returns one row per day, group and metric with the sketch of that metric:
+          * distinct: HyperLogLog registers (or a native hll_sketch_agg binary when available)
+          * quantiles: DDSketch bucket counts
+          * heavy_hitters: a count_min_sketch binary plus the day's candidate values
+        """
+        native_hll = has_native_hll()
+        df = df.withColumn("day", F.col(day_column)).withColumn("group_key", self.get_group_key())
+        sketches = []
+
+        for column in self.distinct_columns:
+            values = df.where(F.col(column).isNotNull())
+            if native_hll:
+                sketch = (values.groupBy("day", "group_key")
+                                .agg(F.expr(f"hll_sketch_agg({column}, {self.precision})").alias("hll")))
+            else:
+                sketch = (values.select("day", "group_key", *HyperLogLog.get_register_columns(column, self.precision))
+                                .groupBy("day", "group_key", "register").agg(F.max("rank").alias("rank"))
+                                .groupBy("day", "group_key")
+                                .agg(F.map_from_entries(F.collect_list(F.struct("register", "rank"))).alias("registers")))
+            sketches.append(sketch.withColumn("metric", F.lit("distinct")).withColumn("column", F.lit(column)))
+
+        for column in self.quantile_columns:
+            values = df.where(F.col(column).isNotNull()).withColumn("bucket", DDSketch.get_bucket_column(column, self.relative_accuracy))
+            sketch = (values.groupBy("day", "group_key", F.signum(column).cast("int").alias("sign"), "bucket").count()
+                            .groupBy("day", "group_key")
+                            .agg(F.map_from_entries(F.collect_list(F.when(F.col("sign") > 0, F.struct("bucket", "count")))).alias("positive_buckets"),
+                                 F.map_from_entries(F.collect_list(F.when(F.col("sign") < 0, F.struct("bucket", "count")))).alias("negative_buckets"),
+                                 F.sum(F.when(F.col("sign") == 0, F.col("count")).otherwise(0)).alias("zero_count")))
+            sketches.append(sketch.withColumn("metric", F.lit("quantiles")).withColumn("column", F.lit(column)))
+
+        if self.heavy_hitter_column is not None:
+            column = self.heavy_hitter_column
+            values = df.withColumn("value", F.col(column).cast("string")).where(F.col("value").isNotNull())
+            # Keep twice top_k candidates per day so values that rank lower on one day can still surface when merged
+            candidates = (values.groupBy("day", "group_key", "value").count()
+                                .groupBy("day", "group_key")
+                                .agg(F.slice(F.array_sort(F.collect_list(F.struct(-F.col("count"), "value"))), 1, 2 * self.top_k).alias("top"))
+                                .select("day", "group_key", F.transform("top", lambda t: t["value"]).alias("candidates")))
+            cms = (values.groupBy("day", "group_key")
+                         .agg(F.expr(f"count_min_sketch(value, {self.relative_accuracy / 10}, 0.99, 42)").alias("cms")))
+            sketch = cms.join(candidates, ["day", "group_key"])
+            sketches.append(sketch.withColumn("metric", F.lit("heavy_hitters")).withColumn("column", F.lit(column)))
+
+        result = sketches[0]
+        for sketch in sketches[1:]: result = result.unionByName(sketch, allowMissingColumns=True)
+        return result
+
+None
+
+# COMMAND ----------
+
+class SketchStore:
+    """
+    Persists the sketches of a SketchAggregation in a Delta table, one row per day, group and metric,
+    and merges any range of days into estimates without re-reading the source data.
+
+      Attributes:
+          table_name: the Delta table holding the sketches
+          aggregation: the SketchAggregation the sketches belong to
+
+      Methods:
+          update(df, day_column): (re)writes the sketches of the days present in df
+          estimate(days=None): merges the sketches of the given days, or of all days, into one row per group
+    """
+
+    def __init__(self, table_name, aggregation):
+        self.table_name = table_name
+        self.aggregation = aggregation
+
+
+    def update(self, df, day_column):
+        """
+        Replaces the sketches of every day present in df, so re-running a day is idempotent.
+
+        :return: the list of days written
+        """
+        days = [r[0] for r in df.select(F.col(day_column)).distinct().collect()]
+        assert len(days) > 0, f"Expected at least one day of data in \"{day_column}\""
+        sketches = self.aggregation.get_sketches(df, day_column)
+
+        writer = sketches.write.format("delta").mode("overwrite").partitionBy("day")
+        if spark.catalog.tableExists(self.table_name):
+            day_list = ", ".join(f"'{d}'" for d in days)
+            writer = writer.option("replaceWhere", f"day IN ({day_list})")
+        writer.saveAsTable(self.table_name)
+        return days
+
+
+    def estimate(self, days=None):
+        """
+        :param days: list of days to merge; all days if None
+        :return: list of dictionaries, one per group, with the same keys as SketchAggregation.aggregate
+        """
+        import json
+
+        sketches = spark.table(self.table_name)
+        if days is not None: sketches = sketches.where(F.col("day").isin(days))
+
+        results = dict()
+        def get_result(group_key):
+            if group_key not in results: results[group_key] = json.loads(group_key)
+            return results[group_key]
+
+        for row in self.merge_distinct(sketches):
+            get_result(row["group_key"])[f"""distinct_{SketchAggregation.get_alias(row["column"])}"""] = row["estimate"]
+
+        for row in self.merge_quantiles(sketches):
+            estimates = DDSketch.get_quantiles(row["positive"] or dict(), row["negative"] or dict(), row["zero_count"] or 0,
+                                               self.aggregation.quantiles, self.aggregation.relative_accuracy)
+            for q, estimate in zip(self.aggregation.quantiles, estimates):
+                get_result(row["group_key"])[f"""{SketchAggregation.get_alias(row["column"])}_p{builtins.round(q*100)}"""] = estimate
+
+        for group_key, column, top in self.merge_heavy_hitters(sketches):
+            get_result(group_key)[f"top_{SketchAggregation.get_alias(column)}"] = top
+
+        return list(results.values())
+
+
+    def merge_distinct(self, sketches):
+        sketches = sketches.where("metric = 'distinct'")
+        if "hll" in sketches.columns and sketches.where("hll IS NOT NULL").limit(1).count() > 0:
+            return (sketches.groupBy("group_key", "column")
+                            .agg(F.expr("hll_sketch_estimate(hll_union_agg(hll))").alias("estimate"))
+                            .collect())
+
+        rows = (sketches.select("group_key", "column", F.explode("registers").alias("register", "rank"))
+                        .groupBy("group_key", "column", "register").agg(F.max("rank").alias("rank"))
+                        .groupBy("group_key", "column")
+                        .agg(F.map_from_entries(F.collect_list(F.struct("register", "rank"))).alias("registers"))
+                        .collect())
+        return [{"group_key": r["group_key"], "column": r["column"], "estimate": HyperLogLog.estimate(r["registers"], self.aggregation.precision)} for r in rows]
+
+
+    def merge_quantiles(self, sketches):
+        sketches = sketches.where("metric = 'quantiles'")
+        merge = lambda buckets: (sketches.select("group_key", "column", F.explode(buckets).alias("bucket", "count"))
+                                         .groupBy("group_key", "column", "bucket").agg(F.sum("count").alias("count"))
+                                         .groupBy("group_key", "column")
+                                         .agg(F.map_from_entries(F.collect_list(F.struct("bucket", "count"))).alias(buckets)))
+        zeros = sketches.groupBy("group_key", "column").agg(F.sum("zero_count").alias("zero_count"))
+
+        return (zeros.join(merge("positive_buckets"), ["group_key", "column"], "left")
+                     .join(merge("negative_buckets"), ["group_key", "column"], "left")
+                     .select("group_key", "column", "zero_count",
+                             F.col("positive_buckets").alias("positive"), F.col("negative_buckets").alias("negative"))
+                     .collect())
+
+
+    def merge_heavy_hitters(self, sketches):
+        """
+        Merges the count-min sketches of each group in the JVM and ranks the union of the candidates by their estimated count.
+        """
+        count_min_sketch = spark._jvm.org.apache.spark.util.sketch.CountMinSketch
+        merged = dict()
+
+        for row in sketches.where("metric = 'heavy_hitters'").select("group_key", "column", "cms", "candidates").collect():
+            key = (row["group_key"], row["column"])
+            sketch = count_min_sketch.readFrom(bytearray(row["cms"]))
+            if key not in merged: merged[key] = (sketch, set(row["candidates"]))
+            else:
+                merged[key][0].mergeInPlace(sketch)
+                merged[key][1].update(row["candidates"])
+
+        for (group_key, column), (sketch, candidates) in merged.items():
+            counts = sorted(((sketch.estimateCount(c), c) for c in candidates), reverse=True)[:self.aggregation.top_k]
+            yield group_key, column, [{"value": value, "count": count} for count, value in counts]
+
+None
+
+# COMMAND ----------
+
+class AggregationAccuracyReport:
+    """
+    Compares the exact, approximate and sketch-based answers of a SketchAggregation, for accuracy and speed.
+
+      Methods:
+          run(df, day_column, table_name): times each mode and computes the relative error of every estimate
+          display_report(): renders the timings and the errors as HTML
+    """
+
+    def __init__(self, aggregation):
+        self.aggregation = aggregation
+        self.timings = []
+        self.errors = []
+
+
+    @staticmethod
+    def time(function):
+        import time
+        start = time.time()
+        result = function()
+        return result, time.time() - start
+
+
+    def run(self, df, day_column, table_name):
+        aggregation = self.aggregation
+        keys = [SketchAggregation.get_alias(c) for c in aggregation.group_by]
+        group_key = lambda row: tuple(row.get(k) for k in keys)
+
+        exact, exact_seconds = AggregationAccuracyReport.time(lambda: [r.asDict(True) for r in aggregation.aggregate(df, "exact").collect()])
+        approx, approx_seconds = AggregationAccuracyReport.time(lambda: [r.asDict(True) for r in aggregation.aggregate(df, "approx").collect()])
+
+        store = SketchStore(table_name, aggregation)
+        _, update_seconds = AggregationAccuracyReport.time(lambda: store.update(df, day_column))
+        sketched, estimate_seconds = AggregationAccuracyReport.time(lambda: store.estimate())
+
+        self.timings = [
+            {"mode": "exact", "seconds": exact_seconds},
+            {"mode": "approx", "seconds": approx_seconds},
+            {"mode": "sketch_update", "seconds": update_seconds},
+            {"mode": "sketch_estimate", "seconds": estimate_seconds},
+        ]
+
+        expected = {group_key(r): r for r in exact}
+        self.errors = []
+        for mode, rows in [("approx", approx), ("sketch", sketched)]:
+            for metric in [k for k in exact[0].keys() if k not in keys and not k.startswith("top_")]:
+                relative_errors = []
+                for row in rows:
+                    actual, truth = row.get(metric), expected.get(group_key(row), dict()).get(metric)
+                    if actual is None or truth is None: continue
+                    relative_errors.append(builtins.abs(actual - truth) / builtins.abs(truth) if truth else builtins.abs(actual))
+                if len(relative_errors) == 0: continue
+                self.errors.append({"mode": mode, "metric": metric, "groups": len(relative_errors),
+                                    "mean_relative_error": builtins.sum(relative_errors) / len(relative_errors),
+                                    "max_relative_error": builtins.max(relative_errors)})
+        return self.errors
+
+
+    def display_report(self):
+        html = ""
+        for rows in [self.timings, self.errors]:
+            if len(rows) == 0: continue
+            html += """<table style="width:100%"><tr>"""
+            for key in rows[0].keys(): html += f"""<th style="text-align:left">{key}</th>"""
+            html += "</tr>"
+            for row in rows:
+                html += "<tr>"
+                for value in row.values():
+                    html += f"""<td>{value:,.4f}</td>""" if type(value) is float else f"""<td>{value}</td>"""
+                html += "</tr>"
+            html += "</table><br/>"
+        displayHTML(html)
+
+None
+
+# COMMAND ----------
+
+@DBAcademyHelper.monkey_patch
+def set_aggregation_mode(self, mode):
+    """
+    Switches every SketchAggregation.aggregate call that does not specify a mode between "exact" and "approx".
+    """
+    assert mode in AGGREGATION_MODES, f"Expected the mode to be one of {AGGREGATION_MODES}, found {mode}"
+    spark.conf.set(AGGREGATION_MODE_KEY, mode)
+
+
+@DBAcademyHelper.monkey_patch
+def report_aggregation_accuracy(self, df=None, table_name="events_state_sketches"):
+    """
+    Compares exact, approximate and sketch-based aggregates of events per state, as in DE 0.05.
+
+    :param df: overrides spark.table("events") (optional)
+    :param table_name: the Delta table the daily sketches are written to
+    :return: the AggregationAccuracyReport
+    """
+    if df is None: df = spark.table("events")
+    df = df.withColumn("event_date", F.to_date(F.from_unixtime(F.col("event_timestamp") / 1e6)))
+
+    aggregation = SketchAggregation(group_by=["geo.state"],
+                                    distinct_columns=["user_id"],
+                                    quantile_columns=["ecommerce.purchase_revenue_in_usd"],
+                                    heavy_hitter_column="geo.city")
+    report = AggregationAccuracyReport(aggregation)
+    report.run(df, "event_date", table_name)
+    report.display_report()
+    return report
+
+None
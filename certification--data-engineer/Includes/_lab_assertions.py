@@ -0,0 +1,161 @@
+# Databricks notebook source
+class DataFrameValidator:
+    """
+    Validates a learner's DataFrame against declarative expectations with as few Spark jobs as possible.
+
+    Row counts, null counts, conditional counts, distinct counts and first values are compiled into a
+    single aggregate query. Expected rows need a second (sorted, limited) query; only then is the source
+    cached, so the two queries do not both recompute it.
+
+      Attributes:
+          columns: expected column names; a list is compared in order, a set ignores the order
+          row_count: expected number of rows
+          null_counts: {column: expected number of nulls}
+          counts_where: {SQL condition: expected number of matching rows}
+          distinct_counts: {column or tuple of columns: expected number of distinct values, nulls included}
+          first_values: {column: expected value of the column in the first row}
+          rows: expected leading rows, as tuples of values of row_columns
+          row_columns: columns compared against rows (defaults to all columns)
+          order_by: column(s) to sort by before taking the leading rows
+
+      Methods:
+          get_actual_values(df): computes every actual value
+          add_tests(suite, df): adds one test per expectation to a DA.tests suite
+    """
+
+    def __init__(self, columns=None, row_count=None, null_counts=None, counts_where=None, distinct_counts=None,
+                 first_values=None, rows=None, row_columns=None, order_by=None):
+        self.columns = columns
+        self.row_count = row_count
+        self.null_counts = null_counts or dict()
+        self.counts_where = counts_where or dict()
+        self.distinct_counts = distinct_counts or dict()
+        self.first_values = first_values or dict()
+        self.rows = rows
+        self.row_columns = row_columns
+        self.order_by = order_by
+
+
+    @staticmethod
+    def distinct_key(columns):
+        if type(columns) is str: columns = (columns,)
+        return ", ".join(columns)
+
+
+    def get_aggregates(self):
+        """
+        Returns (alias, column) pairs computed by the single aggregate query.
+        """
+        aggregates = []
+        if self.row_count is not None:
+            aggregates.append(("row_count", F.count(F.lit(1))))
+
+        for i, column in enumerate(self.null_counts.keys()):
+            aggregates.append((f"null_count_{i}", F.sum(F.when(F.col(column).isNull(), 1).otherwise(0))))
+
+        for i, condition in enumerate(self.counts_where.keys()):
+            aggregates.append((f"count_where_{i}", F.sum(F.when(F.expr(condition), 1).otherwise(0))))
+
+        for i, columns in enumerate(self.distinct_counts.keys()):
+            if type(columns) is str: columns = (columns,)
+            # Counting structs keeps rows with nulls, matching select(...).drop_duplicates().count()
+            aggregates.append((f"distinct_count_{i}", F.countDistinct(F.struct(*columns))))
+
+        for i, column in enumerate(self.first_values.keys()):
+            aggregates.append((f"first_value_{i}", F.first(column)))
+
+        return aggregates
+
+
+    def get_actual_values(self, df):
+        """
+        Runs one aggregate job, plus one job for the leading rows if rows were specified.
+
+        :return: dictionary of actual values, keyed by the same aliases as get_aggregates()
+        """
+        aggregates = self.get_aggregates()
+        cache = len(aggregates) > 0 and self.rows is not None
+        if cache: df = df.cache()
+
+        try:
+            actual = dict()
+            if len(aggregates) > 0:
+                row = df.agg(*[column.alias(alias) for alias, column in aggregates]).first()
+                actual = row.asDict()
+
+            if self.rows is not None:
+                rows_df = df.select(*self.row_columns) if self.row_columns else df
+                if self.order_by is not None: rows_df = rows_df.sort(self.order_by)
+                actual["rows"] = [tuple(r) for r in rows_df.limit(len(self.rows)).collect()]
+
+            return actual
+        finally:
+            if cache: df.unpersist()
+
+
+    def add_tests(self, suite, df):
+        """
+        Computes the actual values and adds one test per expectation to the suite.
+        """
+        actual = self.get_actual_values(df)
+
+        if self.columns is not None:
+            if type(self.columns) is set:
+                suite.test_equals(lambda: set(df.columns), self.columns, description=f"Expected the columns {sorted(self.columns)}.", hint=f"Found [[ACTUAL_VALUE]].")
+            else:
+                suite.test_equals(lambda: df.columns, list(self.columns), description=f"Expected the columns {list(self.columns)}.", hint=f"Found [[ACTUAL_VALUE]].")
+
+        if self.row_count is not None:
+            suite.test_equals(lambda: actual.get("row_count"), self.row_count,
+                              description=f"Expected {self.row_count:,} rows.", hint=f"Found [[ACTUAL_VALUE]].")
+
+        for i, (column, expected) in enumerate(self.null_counts.items()):
+            suite.test_equals(lambda key=f"null_count_{i}": actual.get(key), expected,
+                              description=f"Expected {expected:,} null value(s) in \"<b>{column}</b>\".", hint=f"Found [[ACTUAL_VALUE]].")
+
+        for i, (condition, expected) in enumerate(self.counts_where.items()):
+            suite.test_equals(lambda key=f"count_where_{i}": actual.get(key), expected,
+                              description=f"Expected {expected:,} row(s) where <b>{condition}</b>.", hint=f"Found [[ACTUAL_VALUE]].")
+
+        for i, (columns, expected) in enumerate(self.distinct_counts.items()):
+            suite.test_equals(lambda key=f"distinct_count_{i}": actual.get(key), expected,
+                              description=f"Expected {expected:,} distinct value(s) of \"<b>{DataFrameValidator.distinct_key(columns)}</b>\".", hint=f"Found [[ACTUAL_VALUE]].")
+
+        for i, (column, expected) in enumerate(self.first_values.items()):
+            suite.test_equals(lambda key=f"first_value_{i}": actual.get(key), expected,
+                              description=f"Expected the first value of \"<b>{column}</b>\" to be <b>{expected}</b>.", hint=f"Found [[ACTUAL_VALUE]].")
+
+        if self.rows is not None:
+            suite.test_equals(lambda: actual.get("rows"), [tuple(r) for r in self.rows],
+                              description=f"Expected the first {len(self.rows)} row(s) to match.", hint=f"Found [[ACTUAL_VALUE]].")
+
+None
+
+# COMMAND ----------
+
+@DBAcademyHelper.monkey_patch
+def validate_dataframe(self, df, name="Check Your Work", display=True, **expectations):
+    """
+    Validates a DataFrame against declarative expectations in a single pass and reports them as a DA.tests suite.
+
+    Example:
+        DA.validate_dataframe(conversions_df, "conversions_df",
+                              columns=["email", "user_id", "user_first_touch_timestamp", "updated", "converted"],
+                              row_count=38939,
+                              null_counts={"email": 0},
+                              counts_where={"converted = false": 28429})
+
+    See also DataFrameValidator for the supported expectations.
+
+    :param df: the DataFrame to validate
+    :param name: name of the test suite
+    :param display: if True (default), displays the results
+    :param expectations: keyword arguments of DataFrameValidator
+    """
+    suite = self.tests.new(name)
+    DataFrameValidator(**expectations).add_tests(suite, df)
+
+    if display: suite.display_results()
+    assert suite.passed, "One or more tests failed; please double check your work."
+
+None
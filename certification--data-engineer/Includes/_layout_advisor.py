@@ -0,0 +1,356 @@
+# Databricks notebook source
+# MAGIC %run ./_plan_inspector
+
+# COMMAND ----------
+
+import re
+
+class SourceFilter:
+    """
+    One predicate pushed into a scan, parsed from its PushedFilters, e.g. EqualTo(event_name,finalize).
+
+    Only the predicates that min/max statistics can skip files with are kept: comparisons, IN and
+    string prefixes, in a conjunction. IsNotNull, Or, Not and the like are ignored, as if they never skip.
+
+      Attributes:
+          column: e.g. "event_name" or "geo.state"
+          operator: "=", "<", "<=", ">", ">=", "in" or "startswith"
+          values: the literal values, as strings
+    """
+
+    OPERATORS = {"EqualTo": "=", "EqualNullSafe": "=", "LessThan": "<", "LessThanOrEqual": "<=",
+                 "GreaterThan": ">", "GreaterThanOrEqual": ">=", "In": "in", "StringStartsWith": "startswith"}
+    PATTERN = re.compile(r"^(\w+)\((.*)\)$")
+
+    def __init__(self, column, operator, values):
+        self.column = column
+        self.operator = operator
+        self.values = values
+
+
+    @staticmethod
+    def parse(text):
+        """
+        :return: list of SourceFilters, flattening And(...) and skipping the filters that cannot skip files
+        """
+        match = SourceFilter.PATTERN.match(text.strip())
+        if match is None: return []
+
+        name, arguments = match.groups()
+        arguments = split_top_level(arguments, ",")
+
+        if name == "And": return [f for a in arguments for f in SourceFilter.parse(a)]
+        if name not in SourceFilter.OPERATORS or len(arguments) < 2: return []
+
+        operator = SourceFilter.OPERATORS[name]
+        if operator == "in":
+            values = [v.strip() for v in split_top_level(",".join(arguments[1:]).strip("[]"), ",")]
+        else:
+            values = [",".join(arguments[1:])]
+        return [SourceFilter(arguments[0].strip("`"), operator, values)]
+
+
+    def get_key(self):
+        return f"""{self.column} {self.operator} {",".join(self.values)}"""
+
+
+    def may_match(self, minimum, maximum, data_type):
+        """
+        Whether a file with these min/max statistics may hold a matching row, as a boolean Column.
+        """
+        values = [F.lit(v).cast(data_type) for v in self.values]
+        if self.operator == "=": return (minimum <= values[0]) & (maximum >= values[0])
+        if self.operator == "<": return minimum < values[0]
+        if self.operator == "<=": return minimum <= values[0]
+        if self.operator == ">": return maximum > values[0]
+        if self.operator == ">=": return maximum >= values[0]
+        if self.operator == "startswith":
+            prefix = F.lit(self.values[0])
+            return (F.substring(minimum, 1, len(self.values[0])) <= prefix) & (F.substring(maximum, 1, len(self.values[0])) >= prefix)
+
+        may_match = F.lit(False)
+        for v in values: may_match = may_match | ((minimum <= v) & (maximum >= v))
+        return may_match
+
+None
+
+# COMMAND ----------
+
+class LayoutAdvisor:
+    """
+    Recommends partition columns or clustering keys for Delta tables from the predicates their queries push down.
+
+    Predicates are collected from the plans of DataFrames passed to observe() and, with observe_executed(),
+    from the plans of the SQL queries already executed by this cluster, read from the Spark UI's REST API
+    (Python has no QueryExecutionListener). The advisor then simulates data skipping for every candidate layout:
+
+      * current: the min/max of every file of the table, the statistics Delta skips files with
+      * cluster: the rows range partitioned by one column into as many files as the table has today
+      * partition: one directory per distinct value of one top-level column; nested fields, e.g. geo.state,
+        cannot be partition columns
+
+    For each layout and observed query, the bytes of the files whose min/max may match every predicate are
+    summed; the recommendation is the layout scanning the fewest bytes, excluding partitionings whose
+    partitions would be smaller than min_partition_bytes.
+
+      Attributes:
+          tables: names of the tables to advise on
+          queries: {table_name: [[SourceFilter]]}, the conjunction of the predicates of every observed scan
+          max_partition_values: columns with more distinct values are not partitioning candidates
+          min_partition_bytes: average size of a partition below which partitioning is not recommended
+
+      Methods:
+          observe(df): records the predicates pushed into the scans of a DataFrame
+          observe_executed(): records the predicates of the queries executed so far
+          simulate(table_name): bytes scanned by the observed queries for every candidate layout
+          recommend(table_name): the best layout, with its estimated reduction of bytes scanned
+          display_report(): renders the simulation of every table as HTML
+    """
+
+    SCAN_PATTERN = re.compile(r"^\(\d+\) (?:Photon)?Scan \w+ (\S+)")
+
+    def __init__(self, tables=None, max_partition_values=1000, min_partition_bytes=1024*1024*1024):
+        self.tables = []
+        self.queries = dict()
+        self.max_partition_values = max_partition_values
+        self.min_partition_bytes = min_partition_bytes
+        self.observed_executions = set()
+        self.simulations = dict()
+
+        for table_name in tables or []: self.add_table(table_name)
+
+
+    def add_table(self, table_name):
+        if table_name not in self.tables:
+            self.tables.append(table_name)
+            self.queries[table_name] = []
+
+
+    def get_table(self, name):
+        name = name.split("[")[0].strip("`").lower()
+        for table_name in self.tables:
+            if name == table_name.lower() or name.endswith(f".{table_name.lower()}"): return table_name
+        return None
+
+
+    def record(self, table_name, pushed_filters):
+        filters = [f for text in pushed_filters for f in SourceFilter.parse(text)]
+        if table_name is not None and len(filters) > 0:
+            self.queries[table_name].append(filters)
+        return filters
+
+
+    def observe(self, df, name=None):
+        """
+        :return: {table_name: [predicates]} recorded from this DataFrame
+        """
+        found = dict()
+        for scan in PlanInspector(df, name).get_scans():
+            table_name = next((self.get_table(t) for t in scan.details.split(" ")[:3] if self.get_table(t) is not None), None)
+            filters = self.record(table_name, scan.get_list("PushedFilters") or [])
+            if table_name is not None: found[table_name] = [f.get_key() for f in filters]
+        return found
+
+
+    def observe_executed(self):
+        """
+        Records the predicates of the scans of every SQL execution not observed yet, from the formatted
+        physical plans of the Spark UI, e.g. "(1) Scan parquet spark_catalog.db.events" followed by its PushedFilters.
+
+        :return: the number of executions read
+        """
+        import json, urllib.request
+
+        sc = spark.sparkContext
+        if sc.uiWebUrl is None: return 0
+
+        url = f"{sc.uiWebUrl}/api/v1/applications/{sc.applicationId}/sql?details=false&planDescription=true&offset=0&length=10000"
+        try:
+            with urllib.request.urlopen(url, timeout=30) as response:
+                executions = json.loads(response.read())
+        except Exception as e:
+            print(f"WARNING: Unable to read the executed queries from the Spark UI: {e}")
+            return 0
+
+        count = 0
+        for execution in executions:
+            if execution.get("id") in self.observed_executions or execution.get("status") != "COMPLETED": continue
+            self.observed_executions.add(execution.get("id"))
+            count += 1
+
+            table_name = None
+            for line in (execution.get("planDescription") or "").splitlines():
+                match = LayoutAdvisor.SCAN_PATTERN.match(line.strip())
+                if match is not None: table_name = self.get_table(match.group(1))
+                elif line.startswith("PushedFilters: [") and table_name is not None:
+                    self.record(table_name, split_top_level(line[len("PushedFilters: ["):].rstrip("]"), ","))
+                    table_name = None
+
+        return count
+
+
+    @staticmethod
+    def get_alias(column):
+        return column.replace(".", "_")
+
+
+    def get_file_stats(self, df, columns, layout, column=None, files=None):
+        """
+        Returns a DataFrame of one row per (simulated) file: the rows, the bytes and the min/max of every column.
+        """
+        aggregates = [F.count(F.lit(1)).alias("rows")]
+        aggregates += [F.min(c).alias(f"min_{LayoutAdvisor.get_alias(c)}") for c in columns]
+        aggregates += [F.max(c).alias(f"max_{LayoutAdvisor.get_alias(c)}") for c in columns]
+
+        if layout == "current":
+            stats = df.select("*", "_metadata.file_path", "_metadata.file_size").groupBy("file_path").agg(F.first("file_size").alias("bytes"), *aggregates)
+            return stats.drop("file_path")
+
+        if layout == "cluster": grouped = df.repartitionByRange(files, F.col(column)).groupBy(F.spark_partition_id().alias("file"))
+        else: grouped = df.groupBy(F.col(column).alias("file"))
+        return grouped.agg(*aggregates).drop("file")
+
+
+    def get_bytes_scanned(self, stats, table_name, types, total_rows, total_bytes):
+        """
+        Sums the bytes of the files that may match every predicate of each query.
+        """
+        sums = []
+        for i, filters in enumerate(self.queries[table_name]):
+            may_match = F.lit(True)
+            for f in filters:
+                if f.column not in types: continue  # An unknown column, e.g. of another table in a join
+                alias = LayoutAdvisor.get_alias(f.column)
+                may_match = may_match & F.coalesce(f.may_match(F.col(f"min_{alias}"), F.col(f"max_{alias}"), types[f.column]), F.lit(True))
+            sums.append(F.sum(F.when(may_match, F.col("bytes")).otherwise(0)).alias(f"query_{i}"))
+
+        if "bytes" not in stats.columns:
+            stats = stats.withColumn("bytes", F.col("rows") / total_rows * total_bytes)
+        row = stats.agg(*sums).first()
+        return sum(row[f"query_{i}"] or 0 for i in range(len(sums)))
+
+
+    def get_types(self, df, columns):
+        types = dict()
+        for column in columns:
+            try:
+                types[column] = df.select(column).schema.fields[0].dataType.simpleString()
+            except Exception:
+                pass  # Not a column of this table
+        return types
+
+
+    def simulate(self, table_name):
+        """
+        :return: list of dictionaries, one per layout, with the bytes scanned by the observed queries
+        """
+        assert len(self.queries[table_name]) > 0, f"No query of {table_name} was observed; call observe() or observe_executed() first."
+
+        df = spark.table(table_name)
+        detail = spark.sql(f"DESCRIBE DETAIL {table_name}").first()
+        files, total_bytes = max(detail["numFiles"] or 1, 1), detail["sizeInBytes"] or 0
+        total_rows = df.count()
+
+        candidates = sorted({f.column for filters in self.queries[table_name] for f in filters})
+        types = self.get_types(df, candidates)
+        columns = [c for c in candidates if c in types]
+        distinct_values = df.agg(*[F.approx_count_distinct(c).alias(LayoutAdvisor.get_alias(c)) for c in columns]).first() if len(columns) > 0 else dict()
+
+        layouts = [("current", None)] + [("cluster", c) for c in columns]
+        layouts += [("partition", c) for c in columns if "." not in c and distinct_values[LayoutAdvisor.get_alias(c)] <= self.max_partition_values]
+
+        simulation = []
+        for layout, column in layouts:
+            stats = self.get_file_stats(df, columns, layout, column, files)
+            bytes_scanned = self.get_bytes_scanned(stats, table_name, types, total_rows, total_bytes)
+            partitions = distinct_values[LayoutAdvisor.get_alias(column)] if layout == "partition" else None
+
+            simulation.append({
+                "table": table_name,
+                "layout": layout,
+                "column": column,
+                "queries": len(self.queries[table_name]),
+                "bytes_scanned": float(bytes_scanned),
+                "partitions": partitions,
+                "eligible": layout != "partition" or total_bytes / max(partitions, 1) >= self.min_partition_bytes,
+            })
+
+        current = simulation[0].get("bytes_scanned")
+        for s in simulation:
+            s["reduction"] = 1 - s.get("bytes_scanned") / current if current else 0.0
+
+        self.simulations[table_name] = simulation
+        return simulation
+
+
+    def recommend(self, table_name):
+        """
+        :return: the simulated layout scanning the fewest bytes, e.g. {"layout": "cluster", "column": "event_name", "reduction": 0.83, ...}
+        """
+        simulation = self.simulations.get(table_name) or self.simulate(table_name)
+        best = min([s for s in simulation if s.get("eligible")], key=lambda s: s.get("bytes_scanned"))
+
+        if best.get("layout") == "cluster": best["statement"] = f"""OPTIMIZE {table_name} ZORDER BY ({best.get("column")})"""
+        elif best.get("layout") == "partition": best["statement"] = f"""CREATE OR REPLACE TABLE {table_name} PARTITIONED BY ({best.get("column")}) AS SELECT * FROM {table_name}"""
+        else: best["statement"] = None
+        return best
+
+
+    def display_report(self):
+        rows = [s for table_name in self.tables for s in self.simulations.get(table_name, [])]
+        if len(rows) == 0:
+            print("No simulation to report; call simulate() first.")
+            return
+        displayHTML(PlanComparison.to_html(rows))
+
+None
+
+# COMMAND ----------
+
+@DBAcademyHelper.monkey_patch
+def get_layout_advisor(self, **options):
+    """
+    Returns the LayoutAdvisor of this lesson, creating it on first use.
+
+    :param options: constructor arguments of LayoutAdvisor, applied on creation only
+    """
+    if not hasattr(self, "layout_advisor"): self.layout_advisor = LayoutAdvisor(**options)
+    return self.layout_advisor
+
+
+@DBAcademyHelper.monkey_patch
+def advise_layout(self, *table_names, queries=None, observe_executed=True):
+    """
+    Simulates data skipping of the observed queries for candidate layouts and prints a recommendation per table.
+
+    Example:
+        DA.advise_layout("events", queries=[spark.table("events").filter("event_name = 'finalize'")])
+
+    See also LayoutAdvisor
+
+    :param queries: DataFrames whose pushed predicates are recorded (optional)
+    :param observe_executed: if True (default), also records the predicates of the queries executed so far
+    :return: {table_name: recommendation}
+    """
+    advisor = self.get_layout_advisor()
+    for table_name in table_names: advisor.add_table(table_name)
+    assert len(advisor.tables) > 0, "Expected at least one table to advise on"
+
+    for df in queries or []: advisor.observe(df)
+    if observe_executed: advisor.observe_executed()
+
+    recommendations = dict()
+    for table_name in advisor.tables:
+        if len(advisor.queries[table_name]) == 0:
+            print(f"No query of {table_name} was observed")
+            continue
+
+        advisor.simulate(table_name)
+        recommendation = advisor.recommend(table_name)
+        recommendations[table_name] = recommendation
+        print(f"""{table_name}: {recommendation.get("layout")} {recommendation.get("column") or ""} scans an estimated {recommendation.get("reduction"):.0%} fewer bytes""")
+
+    advisor.display_report()
+    return recommendations
+
+None
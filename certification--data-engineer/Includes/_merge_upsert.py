@@ -0,0 +1,272 @@
+# Databricks notebook source
+# MAGIC %run ./_plan_inspector
+
+# COMMAND ----------
+
+def to_sql_literal(value):
+    """
+    Formats a value collected from a DataFrame as a SQL literal, e.g. 'UA000000102357305' or DATE'2020-06-01'.
+    """
+    import datetime, decimal
+
+    if value is None: return "NULL"
+    if type(value) is bool: return "true" if value else "false"
+    if isinstance(value, (int, float, decimal.Decimal)): return str(value)
+    if isinstance(value, datetime.datetime): return f"TIMESTAMP'{value.isoformat(sep=' ')}'"
+    if isinstance(value, datetime.date): return f"DATE'{value.isoformat()}'"
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+class MergeUpsert:
+    """
+    Upserts a batch into a Delta table with MERGE, touching as few of the target's files as possible.
+
+    A MERGE whose condition only equates the keys has to read every file of the target that may hold a
+    matching key. Before merging, the batch is deduplicated on its keys and its key range (and, for
+    partitioned targets, its set of partitions) is computed in a single aggregation. These bounds are
+    added to the merge condition as literal predicates on the target, which Delta uses to skip files
+    by their min/max statistics and to prune partitions.
+
+    The partition columns of the target are treated as part of the key: a row only matches a row of the same partition.
+
+      Attributes:
+          target_table: the Delta table to upsert into
+          keys: columns identifying a row
+          order_by: column deciding which duplicate of a key to keep, the greatest wins (optional)
+          range_columns: key columns whose min/max bound the merge, defaults to keys
+          partition_columns: defaults to the partition columns of the target
+          max_partition_values: above this many partitions in a batch, no partition predicate is added
+          log: list of dictionaries, one per upsert()
+
+      Methods:
+          deduplicate(source_df): keeps one row per key
+          get_pruning_predicates(source_df): the predicates on the target bounding the batch
+          get_condition(source_df, prune=True): the full merge condition
+          upsert(source_df, ...): merges the batch and returns its log entry
+    """
+
+    def __init__(self, target_table, keys, order_by=None, range_columns=None, partition_columns=None, max_partition_values=1000):
+        self.target_table = target_table
+        self.keys = keys
+        self.order_by = order_by
+        self.range_columns = range_columns or keys
+        self.max_partition_values = max_partition_values
+        self.log = []
+
+        if partition_columns is None:
+            partition_columns = spark.sql(f"DESCRIBE DETAIL {target_table}").first()["partitionColumns"]
+        self.partition_columns = list(partition_columns)
+
+
+    def deduplicate(self, source_df):
+        """
+        MERGE fails when several source rows match the same target row, so keep one row per key.
+        """
+        from pyspark.sql.window import Window
+
+        keys = self.keys + [c for c in self.partition_columns if c not in self.keys]
+        if self.order_by is None: return source_df.dropDuplicates(keys)
+
+        window = Window.partitionBy(*keys).orderBy(F.col(self.order_by).desc())
+        return source_df.withColumn("__rank", F.row_number().over(window)).filter("__rank = 1").drop("__rank")
+
+
+    def get_pruning_predicates(self, source_df):
+        aggregates = [F.min(c).alias(f"min_{c}") for c in self.range_columns]
+        aggregates += [F.max(c).alias(f"max_{c}") for c in self.range_columns]
+        aggregates += [F.collect_set(c).alias(f"set_{c}") for c in self.partition_columns]
+        bounds = source_df.agg(*aggregates).first()
+
+        predicates = []
+        for c in self.range_columns:
+            if bounds[f"min_{c}"] is None: continue  # An empty batch, or only null keys, which never match
+            predicates.append(f"t.{c} BETWEEN {to_sql_literal(bounds[f'min_{c}'])} AND {to_sql_literal(bounds[f'max_{c}'])}")
+
+        for c in self.partition_columns:
+            values = bounds[f"set_{c}"]
+            if len(values) == 0 or len(values) > self.max_partition_values: continue
+            predicates.append(f"""t.{c} IN ({", ".join(to_sql_literal(v) for v in sorted(values))})""")
+
+        return predicates
+
+
+    def get_condition(self, source_df, prune=True):
+        keys = self.keys + [c for c in self.partition_columns if c not in self.keys]
+        conditions = [f"t.{k} = s.{k}" for k in keys]
+        if prune: conditions += self.get_pruning_predicates(source_df)
+        return " AND ".join(conditions)
+
+
+    def get_last_metrics(self):
+        """
+        Reads the operation metrics of the MERGE from the table history; the names are those of Delta's MergeIntoCommand.
+        """
+        history = spark.sql(f"DESCRIBE HISTORY {self.target_table} LIMIT 1").first()
+        assert history["operation"] == "MERGE", f"Expected the last operation on {self.target_table} to be a MERGE, found {history['operation']}"
+
+        metrics = history["operationMetrics"] or dict()
+        get = lambda key: int(metrics[key]) if key in metrics else None
+        return {
+            "version": history["version"],
+            "files_before_skipping": get("numTargetFilesBeforeSkipping"),
+            "files_touched": get("numTargetFilesAfterSkipping"),
+            "files_rewritten": get("numTargetFilesRemoved"),
+            "files_added": get("numTargetFilesAdded"),
+            "rows_updated": get("numTargetRowsUpdated"),
+            "rows_inserted": get("numTargetRowsInserted"),
+            "rows_copied": get("numTargetRowsCopied"),
+        }
+
+
+    def upsert(self, source_df, matched_condition=None, set=None, insert=True, prune=True, deduplicate=True):
+        """
+        Merges the batch into the target.
+
+        Example, as in DE 3.5:
+            MergeUpsert("users", ["user_id"]).upsert(spark.table("users_update"),
+                                                     matched_condition="t.email IS NULL AND s.email IS NOT NULL",
+                                                     set={"email": "s.email", "updated": "s.updated"})
+
+        :param matched_condition: extra condition of WHEN MATCHED, with the target aliased t and the source s
+        :param set: {column: expression} to update, by default every column (UPDATE SET *)
+        :param insert: if True (default), inserts the rows that do not match (INSERT *)
+        :param prune: if True (default), adds the key range and partition predicates to the condition
+        :param deduplicate: if True (default), keeps one row per key of the batch
+        :return: the log entry with the condition, duration and files touched versus rewritten
+        """
+        import time
+        from delta.tables import DeltaTable
+
+        start = time.time()
+        if deduplicate: source_df = self.deduplicate(source_df)
+        source_df = source_df.cache()
+        try:
+            condition = self.get_condition(source_df, prune)
+            merge = DeltaTable.forName(spark, self.target_table).alias("t").merge(source_df.alias("s"), condition)
+
+            if set is None: merge = merge.whenMatchedUpdateAll(condition=matched_condition)
+            else: merge = merge.whenMatchedUpdate(condition=matched_condition, set=set)
+            if insert: merge = merge.whenNotMatchedInsertAll()
+
+            merge.execute()
+        finally:
+            source_df.unpersist()
+
+        entry = {"target": self.target_table, "condition": condition, "seconds": time.time() - start}
+        entry.update(self.get_last_metrics())
+        self.log.append(entry)
+        return entry
+
+None
+
+# COMMAND ----------
+
+class MergeBenchmark:
+    """
+    Compares a plain MERGE on the keys with the pruned MERGE of MergeUpsert, each on its own shallow clone of the target.
+
+      Methods:
+          run(): merges the batch into both clones and returns the report
+          verify(): asserts that both clones end with the same rows
+          display_report(): renders the report as HTML
+          cleanup(): drops the clones
+    """
+
+    VARIANTS = {"plain": False, "pruned": True}
+
+    def __init__(self, target_table, source_df, keys, order_by=None, **upsert_options):
+        self.target_table = target_table
+        self.source_df = source_df
+        self.keys = keys
+        self.order_by = order_by
+        self.upsert_options = upsert_options
+        self.report = []
+
+
+    def get_clone_name(self, variant):
+        return f"{self.target_table}_merge_{variant}"
+
+
+    def run(self):
+        # Materialize the batch once so that both variants merge the same rows, e.g. the same current_timestamp()
+        self.source_df = self.source_df.cache()
+        self.source_df.count()
+
+        self.report = []
+        for variant, prune in MergeBenchmark.VARIANTS.items():
+            clone_name = self.get_clone_name(variant)
+            spark.sql(f"CREATE OR REPLACE TABLE {clone_name} SHALLOW CLONE {self.target_table}")
+
+            print(f"Merging into {clone_name}", end="...")
+            upsert = MergeUpsert(clone_name, self.keys, order_by=self.order_by)
+            entry = upsert.upsert(self.source_df, prune=prune, **self.upsert_options)
+            print(f"""{entry.get("seconds"):,.2f} seconds""")
+
+            self.report.append({
+                "variant": variant,
+                "seconds": entry.get("seconds"),
+                "files_before_skipping": entry.get("files_before_skipping"),
+                "files_touched": entry.get("files_touched"),
+                "files_rewritten": entry.get("files_rewritten"),
+                "rows_updated": entry.get("rows_updated"),
+                "rows_inserted": entry.get("rows_inserted"),
+                "rows_copied": entry.get("rows_copied"),
+            })
+        return self.report
+
+
+    def verify(self):
+        expected, actual = (spark.table(self.get_clone_name(v)) for v in MergeBenchmark.VARIANTS.keys())
+        differences = expected.exceptAll(actual).count() + actual.exceptAll(expected).count()
+        assert differences == 0, f"Expected the plain and pruned merges to produce the same rows, found {differences} differences"
+
+
+    def display_report(self):
+        displayHTML(PlanComparison.to_html(self.report))
+
+
+    def cleanup(self):
+        self.source_df.unpersist()
+        for variant in MergeBenchmark.VARIANTS.keys():
+            spark.sql(f"DROP TABLE IF EXISTS {self.get_clone_name(variant)}")
+
+None
+
+# COMMAND ----------
+
+@DBAcademyHelper.monkey_patch
+def merge_upsert(self, target_table, source, keys, order_by=None, **upsert_options):
+    """
+    Deduplicates a batch and merges it into a Delta table with pruning predicates.
+
+    Example:
+        DA.merge_upsert("users", "users_update", ["user_id"], order_by="updated")
+
+    See also MergeUpsert.upsert
+
+    :param source: a table or view name, or a DataFrame
+    :return: the log entry of the merge
+    """
+    source_df = spark.table(source) if type(source) is str else source
+    return MergeUpsert(target_table, keys, order_by=order_by).upsert(source_df, **upsert_options)
+
+
+@DBAcademyHelper.monkey_patch
+def benchmark_merge_upsert(self, target_table="users", source="users_update", keys=None, order_by="updated", verify=True, **upsert_options):
+    """
+    Benchmarks a plain MERGE against the pruned MergeUpsert on clones of the target, leaving the target unchanged.
+
+    :return: the MergeBenchmark
+    """
+    source_df = spark.table(source) if type(source) is str else source
+
+    benchmark = MergeBenchmark(target_table, source_df, keys or ["user_id"], order_by=order_by, **upsert_options)
+    try:
+        benchmark.run()
+        if verify: benchmark.verify()
+        benchmark.display_report()
+    finally:
+        benchmark.cleanup()
+    return benchmark
+
+None
@@ -0,0 +1,281 @@
+# Databricks notebook source
+# MAGIC %run ./_pipeline_config
+
+# COMMAND ----------
+
+class PipelineBenchmark:
+    """
+    Replays a fixed DataFactory workload against variants of one pipeline and measures
+    the latency from a file landing in the source directory to its rows being visible in the gold table.
+
+      Attributes:
+          config: PipelineConfig used as the template for every variant
+          data_factory: object with target_dir, current_batch, max_batch and load(), e.g. the DLT lessons' DataFactory
+          gold_table: name of the table, within each variant's target schema, that marks a batch as visible
+          working_dir: root directory for each variant's source and storage directories
+          results: list of dictionaries, one per variant and batch, filled by run() and run_local()
+
+      Methods:
+          run(variants=None): benchmarks DLT pipelines, by default triggered and continuous, with photon off and on
+          run_local(definitions, continuous=False): benchmarks the same tables on plain Structured Streaming
+          get_report(): summarizes results per variant
+          display_report(): renders get_report() as HTML
+    """
+
+    DEFAULT_VARIANTS = [
+        {"continuous": False, "photon": False},
+        {"continuous": False, "photon": True},
+        {"continuous": True,  "photon": False},
+        {"continuous": True,  "photon": True},
+    ]
+
+    def __init__(self, config, data_factory, gold_table, working_dir, max_batches=None, poll_seconds=1, timeout_seconds=900):
+        self.config = config
+        self.data_factory = data_factory
+        self.gold_table = gold_table
+        self.working_dir = working_dir
+        self.max_batches = min(max_batches or data_factory.max_batch, data_factory.max_batch)
+        self.poll_seconds = poll_seconds
+        self.timeout_seconds = timeout_seconds
+        self.results = []
+
+
+    @staticmethod
+    def variant_name(continuous, photon):
+        mode = "continuous" if continuous else "triggered"
+        return f"{mode}_photon" if photon else mode
+
+
+    def reset_factory(self, target_dir):
+        """
+        Points the data factory at a fresh landing directory and rewinds it to the first batch,
+        so every variant replays exactly the same files.
+        """
+        dbutils.fs.rm(target_dir, True)
+        self.data_factory.target_dir = target_dir
+        self.data_factory.current_batch = 0
+
+
+    def get_variant_config(self, name, continuous, photon):
+        """
+        Returns a copy of self.config with its own name, source, storage and target so that variants do not share state.
+        """
+        import copy
+
+        config = copy.deepcopy(self.config)
+        config.name = f"{self.config.name}-benchmark-{name}"
+        config.storage = f"{self.working_dir}/{name}/storage"
+        config.target = f"{self.config.target}_{name}"
+        config.configuration = {**self.config.configuration, "source": f"{self.working_dir}/{name}/stream-source"}
+        config.continuous = continuous
+        config.photon = photon
+        return config
+
+
+    def count_gold_rows(self, target):
+        try:
+            return spark.table(f"{target}.{self.gold_table}").count()
+        except Exception:
+            return 0  # The table does not exist until the first update has written to it
+
+
+    def wait_for_visibility(self, target, previous_count):
+        """
+        Blocks until the gold table holds more rows than previous_count.
+
+        :return: (seconds waited, new row count)
+        """
+        import time
+        start = time.time()
+
+        while time.time() - start < self.timeout_seconds:
+            count = self.count_gold_rows(target)
+            if count > previous_count: return time.time() - start, count
+            time.sleep(self.poll_seconds)
+
+        raise AssertionError(f"No new rows in \"{target}.{self.gold_table}\" after {self.timeout_seconds} seconds")
+
+
+    def record(self, variant, batch, landed_seconds, latency_seconds, rows):
+        self.results.append({
+            "variant": variant,
+            "batch": batch,
+            "land_seconds": landed_seconds,
+            "latency_seconds": latency_seconds,
+            "gold_rows": rows,
+        })
+
+
+    def start_update(self, pipeline_id, blocking):
+        """
+        Starts an update and, if blocking, waits until it has completed.
+        """
+        import time
+
+        update_id = DA.client.pipelines().start_by_id(pipeline_id).get("update_id")
+        state = None
+
+        while blocking and state not in PipelineEventLog.TERMINAL_STATES:
+            time.sleep(self.poll_seconds)
+            state = DA.client.pipelines().get_update_by_id(pipeline_id, update_id).get("update").get("state")
+
+        assert state in [None, "COMPLETED"], f"Expected the state to be COMPLETED, found {state}"
+        return update_id
+
+
+    def land_batch(self):
+        import time
+        start = time.time()
+        self.data_factory.load()
+        return time.time() - start
+
+
+    def run(self, variants=None):
+        """
+        Creates one pipeline per variant, replays the workload batch by batch and records the latency of each batch.
+
+        Triggered variants start one update per landed batch, so their latency includes cluster start-up;
+        continuous variants are started once and then observed as each batch lands.
+
+        :param variants: list of {"continuous": bool, "photon": bool}, defaults to DEFAULT_VARIANTS
+        :return: get_report()
+        """
+        import time
+
+        for variant in variants or PipelineBenchmark.DEFAULT_VARIANTS:
+            name = PipelineBenchmark.variant_name(variant.get("continuous"), variant.get("photon"))
+            config = self.get_variant_config(name, variant.get("continuous"), variant.get("photon"))
+            print(f"Benchmarking \"{config.name}\"")
+
+            self.reset_factory(config.configuration.get("source"))
+            dbutils.fs.rm(config.storage, True)
+            settings = config.get_pipeline_settings()
+
+            # Land the first batch so the pipeline's sources resolve when it starts
+            landed = self.land_batch()
+            pipeline_id = DA.create_pipeline_from_settings(settings)
+            rows = 0
+
+            try:
+                if config.continuous:
+                    self.start_update(pipeline_id, blocking=False)
+
+                for batch in range(1, self.max_batches+1):
+                    if batch > 1: landed = self.land_batch()
+                    start = time.time()
+                    if not config.continuous: self.start_update(pipeline_id, blocking=True)
+                    _, rows = self.wait_for_visibility(config.target, rows)
+                    self.record(name, batch, landed, time.time() - start, rows)
+            finally:
+                DA.client.pipelines().delete_by_name(settings["name"])  # Also stops continuous updates
+
+        return self.get_report()
+
+
+    def run_local(self, definitions, continuous=False, processing_time="1 second"):
+        """
+        Runs the same table definitions on plain Structured Streaming and records the latency of each batch.
+
+        Each definition is a (table_name, build) tuple, listed upstream first, where build(source, read)
+        returns a streaming DataFrame; source is the landing directory and read(name) streams an upstream table.
+
+        :param definitions: list of (table_name, build) tuples; the last one must produce self.gold_table
+        :param continuous: if True, run every table as a long-lived query, otherwise run each once per batch with availableNow
+        :param processing_time: trigger interval of the continuous queries
+        :return: get_report()
+        """
+        import time
+
+        name = f"local_{PipelineBenchmark.variant_name(continuous, False)}"
+        target = f"{self.config.target}_{name}"
+        source = f"{self.working_dir}/{name}/stream-source"
+        checkpoints = f"{self.working_dir}/{name}/checkpoints"
+
+        print(f"Benchmarking \"{name}\"")
+        self.reset_factory(source)
+        dbutils.fs.rm(checkpoints, True)
+        spark.sql(f"DROP SCHEMA IF EXISTS {target} CASCADE")
+        spark.sql(f"CREATE SCHEMA {target}")
+
+        def read(table_name):
+            return spark.readStream.table(f"{target}.{table_name}")
+
+        def start(table_name, build):
+            writer = (build(source, read)
+                      .writeStream
+                      .option("checkpointLocation", f"{checkpoints}/{table_name}")
+                      .queryName(f"{name}_{table_name}"))
+            if continuous: writer = writer.trigger(processingTime=processing_time)
+            else:          writer = writer.trigger(availableNow=True)
+            return writer.toTable(f"{target}.{table_name}")
+
+        rows = 0
+        queries = []
+        try:
+            for batch in range(1, self.max_batches+1):
+                landed = self.land_batch()
+                begin = time.time()
+
+                if not continuous:
+                    for table_name, build in definitions: start(table_name, build).awaitTermination()
+                elif batch == 1:
+                    # Upstream tables must exist before downstream queries can stream from them
+                    for table_name, build in definitions:
+                        queries.append(start(table_name, build))
+                        queries[-1].processAllAvailable()
+
+                _, rows = self.wait_for_visibility(target, rows)
+                self.record(name, batch, landed, time.time() - begin, rows)
+        finally:
+            for query in queries: query.stop()
+
+        return self.get_report()
+
+
+    def get_report(self):
+        """
+        Summarizes the recorded batches per variant.
+
+        :return: list of dictionaries with the batch count and the mean, median and maximum latency per variant
+        """
+        import statistics
+
+        variants = dict()
+        for result in self.results:
+            variants.setdefault(result.get("variant"), []).append(result)
+
+        report = []
+        for variant, results in variants.items():
+            latencies = [r.get("latency_seconds") for r in results]
+            report.append({
+                "variant": variant,
+                "batches": len(results),
+                "gold_rows": results[-1].get("gold_rows"),
+                "mean_latency_seconds": statistics.mean(latencies),
+                "median_latency_seconds": statistics.median(latencies),
+                "max_latency_seconds": max(latencies),
+            })
+        return report
+
+
+    def display_report(self):
+        """
+        Displays get_report() as an HTML table.
+        """
+        report = self.get_report()
+        if len(report) == 0:
+            print("No results to report; call run() or run_local() first.")
+            return
+
+        html = """<table style="width:100%"><tr>"""
+        for key in report[0].keys(): html += f"""<th style="text-align:left">{key}</th>"""
+        html += "</tr>"
+        for row in report:
+            html += "<tr>"
+            for value in row.values():
+                html += f"""<td>{value:,.2f}</td>""" if type(value) is float else f"""<td>{value}</td>"""
+            html += "</tr>"
+        html += "</table>"
+        displayHTML(html)
+
+None
@@ -0,0 +1,138 @@
+# Databricks notebook source
+# MAGIC %run ./_pipeline_event_log
+
+# COMMAND ----------
+
+class RegressionDetector:
+    """
+    Flags pipeline updates whose flows got slower than their own recent history.
+
+      Attributes:
+          window: number of preceding updates of the same flow used as the baseline
+          threshold: allowed relative regression, e.g. 0.25 flags a flow 25% slower than its baseline
+          min_history: minimum number of preceding updates required before a flow is evaluated
+
+      Methods:
+          detect(flow_history, update_id=None):
+              Returns the regressions found in flow_history, optionally only for one update
+
+    The input is plain rows (dictionaries) so the detector can be run against the fact tables
+    of a live PipelineEventLog or against rows recorded from an earlier event log.
+    """
+
+    def __init__(self, window=5, threshold=0.25, min_history=3):
+        assert window >= min_history > 0, f"Expected window >= min_history > 0, found window={window}, min_history={min_history}"
+        assert threshold > 0, f"Expected a positive threshold, found {threshold}"
+
+        self.window = window
+        self.threshold = threshold
+        self.min_history = min_history
+
+
+    @staticmethod
+    def rows_per_second(row):
+        duration = row.get("duration_seconds")
+        rows = row.get("num_output_rows")
+        if not duration or rows is None: return None
+        return rows / duration
+
+
+    @staticmethod
+    def baseline(values):
+        """
+        Returns the (mean, stdev) of the non-null values, or (None, None) if there are none.
+        """
+        import statistics
+
+        values = [v for v in values if v is not None]
+        if len(values) == 0: return None, None
+        stdev = statistics.pstdev(values) if len(values) > 1 else 0.0
+        return statistics.mean(values), stdev
+
+
+    def detect(self, flow_history, update_id=None):
+        """
+        Compares each update of each flow against the rolling baseline of its preceding updates.
+
+        :param flow_history: rows with update_id, flow_name, start_time, duration_seconds and num_output_rows,
+                             e.g. from PipelineEventLog.get_flow_history()
+        :param update_id: if provided, only evaluate this update
+        :return: list of dictionaries describing each regression, empty if none were found
+        """
+        # Updates still starting have no start_time yet and sort last
+        flows = dict()
+        for row in sorted(flow_history, key=lambda r: (r.get("start_time") is None, r.get("start_time") or 0)):
+            flows.setdefault(row.get("flow_name"), []).append(row)
+
+        regressions = []
+        for flow_name, rows in flows.items():
+            for i, row in enumerate(rows):
+                if update_id is not None and row.get("update_id") != update_id: continue
+
+                history = rows[max(0, i-self.window):i]
+                if len(history) < self.min_history: continue
+
+                duration_mean, duration_stdev = RegressionDetector.baseline([r.get("duration_seconds") for r in history])
+                duration = row.get("duration_seconds")
+                if duration is not None and duration_mean and duration > duration_mean * (1 + self.threshold):
+                    regressions.append(self.regression(row, "duration_seconds", duration, duration_mean, duration_stdev))
+
+                rate_mean, rate_stdev = RegressionDetector.baseline([RegressionDetector.rows_per_second(r) for r in history])
+                rate = RegressionDetector.rows_per_second(row)
+                if rate is not None and rate_mean and rate < rate_mean * (1 - self.threshold):
+                    regressions.append(self.regression(row, "rows_per_second", rate, rate_mean, rate_stdev))
+
+        return regressions
+
+
+    def regression(self, row, metric, actual, mean, stdev):
+        return {
+            "update_id": row.get("update_id"),
+            "flow_name": row.get("flow_name"),
+            "metric": metric,
+            "actual": actual,
+            "baseline": mean,
+            "change": (actual - mean) / mean,
+            "z_score": (actual - mean) / stdev if stdev else None,
+        }
+
+None
+
+# COMMAND ----------
+
+@DBAcademyHelper.monkey_patch
+def find_pipeline_regressions(self, update_id=None, window=5, threshold=0.25, storage_location=None):
+    """
+    Refreshes the pipeline event log and returns the flows that regressed against their rolling baseline.
+
+    See also RegressionDetector.detect
+    See also DBAcademyHelper.get_pipeline_event_log
+
+    :param update_id: if provided, only evaluate this update; otherwise evaluate every ingested update
+    :param window: number of preceding updates used as the baseline
+    :param threshold: allowed relative regression of the runtime or rows-per-second
+    :param storage_location: overrides self.paths.storage_location (optional)
+    :return: list of regressions
+    """
+    event_log = self.get_pipeline_event_log(storage_location)
+    event_log.refresh()
+
+    detector = RegressionDetector(window=window, threshold=threshold, min_history=min(3, window))
+    return detector.detect(event_log.get_flow_history(), update_id=update_id)
+
+
+@DBAcademyHelper.monkey_patch
+def assert_no_pipeline_regressions(self, update_id, window=5, threshold=0.25, storage_location=None):
+    """
+    Asserts that no flow of the update regressed beyond the threshold.
+
+    :param update_id: the update to evaluate, e.g. the value returned by start_pipeline
+    """
+    regressions = self.find_pipeline_regressions(update_id, window=window, threshold=threshold, storage_location=storage_location)
+
+    for r in regressions:
+        print(f"""Regression in "{r["flow_name"]}": {r["metric"]} was {r["actual"]:,.2f} vs. a baseline of {r["baseline"]:,.2f} ({r["change"]:+.0%})""")
+
+    assert len(regressions) == 0, f"Found {len(regressions)} performance regression(s) in update {update_id}"
+
+None
@@ -0,0 +1,208 @@
+# Databricks notebook source
+class Provisioner:
+    """
+    Provisions catalogs, schemas, tables with their seed data, and grants from a declarative spec.
+
+    The objects form a dependency graph (a schema depends on its catalog, a table on its schema, a grant on
+    its securable), which is run in waves: every object of a wave only depends on objects of earlier waves,
+    so the DDL of a wave is issued concurrently. Seed rows are loaded with a DataFrame write instead of an
+    INSERT of SQL literals.
+
+    Reruns are idempotent and cheap: catalogs and schemas are created IF NOT EXISTS, a table is only
+    replaced if its columns differ from the spec, and seed data is only written when its fingerprint,
+    recorded in the table's TBLPROPERTIES, changed or the table was written since. Names are qualified
+    with the catalog instead of relying on USE CATALOG, which would not be safe across threads.
+
+    Example spec:
+        {"schemas": ["silver", "gold"],
+         "tables": [{"name": "silver.heartrate_device",
+                     "columns": "device_id INT, mrn STRING, name STRING, time TIMESTAMP, heartrate DOUBLE",
+                     "seed": [(23, "40580129", "Nicholas Spears", "2020-02-01T00:01:58.000+0000", 54.0122153343)]}],
+         "grants": [{"privilege": "SELECT", "on": "TABLE silver.heartrate_device", "to": "account users"}]}
+
+      Attributes:
+          spec: dictionary of "catalogs", "schemas", "tables" and "grants", each optional
+          catalog: catalog qualifying the names of the spec that have none (optional)
+          max_concurrency: maximum number of statements issued at once
+          report: list of dictionaries, one per object, filled by run()
+
+      Methods:
+          get_nodes(): {id: node} of every object, with its dependencies
+          get_waves(): the ids of the nodes, grouped in waves
+          run(): provisions every object and returns the report
+          display_report(): renders the report as HTML
+    """
+
+    SEED_FINGERPRINT_KEY = "dbacademy.seed.fingerprint"
+
+    def __init__(self, spec, catalog=None, max_concurrency=4):
+        self.spec = spec
+        self.catalog = catalog
+        self.max_concurrency = max_concurrency
+        self.report = []
+
+
+    def qualify(self, name, parts):
+        """
+        Prefixes the catalog to a name with fewer parts than a fully qualified one, e.g. silver.heartrate_device.
+        """
+        if self.catalog is None or len(name.split(".")) >= parts: return name
+        return f"{self.catalog}.{name}"
+
+
+    def get_nodes(self):
+        nodes = dict()
+
+        for catalog in self.spec.get("catalogs", []):
+            nodes[f"catalog:{catalog}"] = {"kind": "catalog", "name": catalog, "depends_on": [], "run": lambda c=catalog: self.create_catalog(c)}
+
+        for schema in self.spec.get("schemas", []):
+            name = self.qualify(schema, 2)
+            depends_on = [f"catalog:{name.split('.')[0]}"] if len(name.split(".")) == 2 else []
+            nodes[f"schema:{name}"] = {"kind": "schema", "name": name, "depends_on": depends_on, "run": lambda n=name: self.create_schema(n)}
+
+        for table in self.spec.get("tables", []):
+            name = self.qualify(table.get("name"), 3)
+            depends_on = [f"schema:{name.rsplit('.', 1)[0]}"] if "." in name else []
+            nodes[f"table:{name}"] = {"kind": "table", "name": name, "depends_on": depends_on, "run": lambda n=name, t=table: self.create_table(n, t)}
+
+        for grant in self.spec.get("grants", []):
+            kind, securable = grant.get("on").split(" ", 1)
+            securable = self.qualify(securable, {"CATALOG": 1, "SCHEMA": 2}.get(kind.upper(), 3))
+            statement = f"""GRANT {grant.get("privilege")} ON {kind} {securable} TO `{grant.get("to")}`"""
+            nodes[f"grant:{statement}"] = {"kind": "grant", "name": statement, "depends_on": [f"{kind.lower()}:{securable}"], "run": lambda s=statement: self.grant(s)}
+
+        # Dependencies outside of the spec are expected to exist already
+        for node in nodes.values():
+            node["depends_on"] = [d for d in node.get("depends_on") if d in nodes]
+        return nodes
+
+
+    def get_waves(self, nodes=None):
+        nodes = nodes or self.get_nodes()
+        done, waves = set(), []
+
+        while len(done) < len(nodes):
+            wave = [i for i, node in nodes.items() if i not in done and all(d in done for d in node.get("depends_on"))]
+            assert len(wave) > 0, f"Found a dependency cycle among {sorted(set(nodes.keys()) - done)}"
+            waves.append(wave)
+            done.update(wave)
+
+        return waves
+
+
+    def create_catalog(self, name):
+        spark.sql(f"CREATE CATALOG IF NOT EXISTS {name}")
+        return "ensured"
+
+
+    def create_schema(self, name):
+        spark.sql(f"CREATE SCHEMA IF NOT EXISTS {name}")
+        return "ensured"
+
+
+    def get_fingerprint(self, rows):
+        import hashlib, json
+        return hashlib.md5(json.dumps([list(r) for r in rows], default=str).encode("utf-8")).hexdigest()
+
+
+    def create_table(self, name, table):
+        """
+        Creates or replaces the table if its columns differ from the spec, then writes its seed rows if they changed.
+        """
+        expected = spark.createDataFrame([], table.get("columns")).schema
+        try:
+            current = spark.table(name).schema
+        except Exception:
+            current = None  # The table does not exist
+
+        actions = []
+        columns_match = current is not None and [(f.name, f.dataType) for f in current] == [(f.name, f.dataType) for f in expected]
+        if not columns_match:
+            spark.sql(f"""CREATE OR REPLACE TABLE {name} ({table.get("columns")})""")
+            actions.append("created" if current is None else "replaced")
+
+        rows = table.get("seed")
+        if rows is not None:
+            fingerprint = self.get_fingerprint(rows)
+            properties = {r.key: r.value for r in spark.sql(f"SHOW TBLPROPERTIES {name}").collect()}
+
+            # The fingerprint is set by the last commit of a seeding; any later commit changed the rows
+            seeded = properties.get(Provisioner.SEED_FINGERPRINT_KEY) == fingerprint and len(actions) == 0
+            if seeded: seeded = spark.sql(f"DESCRIBE HISTORY {name} LIMIT 1").first()["operation"] == "SET TBLPROPERTIES"
+
+            if not seeded:
+                # Infer the types of the Python values, then cast them, e.g. timestamps given as strings
+                seed_df = spark.createDataFrame(rows, [f.name for f in expected])
+                seed_df = seed_df.select(*[F.col(f.name).cast(f.dataType) for f in expected])
+                seed_df.write.insertInto(name, overwrite=True)
+
+                spark.sql(f"ALTER TABLE {name} SET TBLPROPERTIES ('{Provisioner.SEED_FINGERPRINT_KEY}' = '{fingerprint}')")
+                actions.append(f"seeded {len(rows)} rows")
+
+        return ", ".join(actions) if len(actions) > 0 else "unchanged"
+
+
+    def grant(self, statement):
+        # GRANT is idempotent
+        spark.sql(statement)
+        return "granted"
+
+
+    def run_node(self, node_id, node, wave):
+        import time
+
+        start = time.time()
+        action = node.get("run")()
+        return {"wave": wave, "kind": node.get("kind"), "name": node.get("name"), "action": action, "seconds": time.time() - start}
+
+
+    def run(self):
+        """
+        Provisions every object, wave by wave, and returns the report.
+        """
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+
+        start = time.time()
+        nodes = self.get_nodes()
+        self.report = []
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            for wave, node_ids in enumerate(self.get_waves(nodes)):
+                self.report.extend(executor.map(lambda i: self.run_node(i, nodes[i], wave), node_ids))
+
+        changed = len([r for r in self.report if r.get("action") not in ["ensured", "unchanged", "granted"]])
+        print(f"Provisioned {len(self.report)} object(s), {changed} changed, in {time.time() - start:,.2f} seconds")
+        return self.report
+
+
+    def display_report(self):
+        html = """<table style="width:100%"><tr>"""
+        for key in self.report[0].keys(): html += f"""<th style="text-align:left">{key}</th>"""
+        html += "</tr>"
+        for row in self.report:
+            html += "<tr>"
+            for value in row.values():
+                html += f"""<td>{value:,.2f}</td>""" if type(value) is float else f"""<td>{value}</td>"""
+            html += "</tr>"
+        html += "</table>"
+        displayHTML(html)
+
+None
+
+# COMMAND ----------
+
+@DBAcademyHelper.monkey_patch
+def provision(self, spec, catalog=None, max_concurrency=4):
+    """
+    Provisions the catalogs, schemas, tables, seed data and grants of a spec; see Provisioner.
+
+    :param catalog: catalog qualifying the names of the spec that have none (optional)
+    :return: the Provisioner, whose report lists the action and seconds per object
+    """
+    provisioner = Provisioner(spec, catalog=catalog, max_concurrency=max_concurrency)
+    provisioner.run()
+    return provisioner
+
+None
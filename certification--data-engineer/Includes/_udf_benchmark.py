@@ -0,0 +1,191 @@
+# Databricks notebook source
+import builtins  # Lessons may shadow max with pyspark.sql.functions
+import pyspark.sql.functions as F
+from pyspark.accumulators import AccumulatorParam
+
+class MaxAccumulatorParam(AccumulatorParam):
+    """
+    Accumulates the maximum of the values reported by the Python workers.
+    """
+    def zero(self, value):
+        return 0
+
+    def addInPlace(self, value1, value2):
+        return builtins.max(value1, value2)
+
+None
+
+# COMMAND ----------
+
+class UdfBenchmark:
+    """
+    Runs the same string transform, the first letter of a column as in DE 2.7B, as a row-at-a-time
+    Python UDF, a pandas UDF, an Arrow-native mapInArrow function and the built-in substring.
+
+    Every variant is timed by writing its result to the "noop" sink, which forces full evaluation
+    without the cost of storing the output. Each Python variant is also run as an identity transform
+    (the value is returned unchanged); its time is reported as the serialization time, i.e. the cost
+    of moving the rows between the JVM and the Python worker rather than of the transform itself.
+
+    Python workers are reused across tasks, so their peak memory since start would carry over from one
+    variant to the next. Instead, each task records the resident memory of its worker at its first call
+    and reports how far it grew above that; the largest growth of any task is the variant's memory cost.
+
+    Only the SparkSession is required, so the suite also runs on a local[*] session outside of the course.
+
+      Attributes:
+          df: source DataFrame, e.g. spark.table("sales")
+          column: string column to transform, e.g. "email"
+          batch_sizes: values of spark.sql.execution.arrow.maxRecordsPerBatch to sweep
+          results: list of dictionaries, one per variant and batch size, filled by run()
+
+      Methods:
+          run(): runs every variant for every batch size and returns the results
+          display_report(): displays the results as a table
+          cleanup(): releases the cached source column
+    """
+
+    VARIANTS = ["python_udf", "pandas_udf", "map_in_arrow", "builtin"]
+    BATCH_SIZE_KEY = "spark.sql.execution.arrow.maxRecordsPerBatch"
+
+    def __init__(self, df, column="email", batch_sizes=None):
+        self.df = df.select(column).cache()
+        self.column = column
+        self.batch_sizes = batch_sizes or [1000, 10000, 100000]
+        self.row_count = self.df.count()  # Also materializes the cache, so no variant pays for the source scan
+        self.results = []
+
+
+    @staticmethod
+    def get_memory_kb():
+        """
+        The current resident memory of the Python worker; ru_maxrss would be its peak since the worker started.
+        """
+        import os
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+    @staticmethod
+    def get_memory_tracker(peak_memory):
+        """
+        Returns a function reporting the growth of the worker's memory since its first call; the closure is
+        deserialized for every task, so each task measures from its own starting point.
+        """
+        get_memory_kb = UdfBenchmark.get_memory_kb
+        baseline = []
+
+        def track():
+            current = get_memory_kb()
+            if len(baseline) == 0: baseline.append(current)
+            peak_memory.add(current - baseline[0])
+        return track
+
+
+    def build(self, variant, identity, peak_memory):
+        """
+        Returns the transformed DataFrame for the variant, with a single string column named "value".
+        """
+        from pyspark.sql.functions import udf, pandas_udf
+        import pandas as pd
+
+        column = self.column
+        track_memory = UdfBenchmark.get_memory_tracker(peak_memory)
+
+        if variant == "builtin":
+            return self.df.select((F.col(column) if identity else F.substring(column, 1, 1)).alias("value"))
+
+        if variant == "python_udf":
+            calls = [0]
+            @udf("string")
+            def first_letter(value):
+                # Sample the memory every 10,000 rows; a system call per row would dominate the timing
+                calls[0] += 1
+                if calls[0] % 10000 == 1: track_memory()
+                if identity or value is None: return value
+                return value[0]
+            return self.df.select(first_letter(column).alias("value"))
+
+        if variant == "pandas_udf":
+            @pandas_udf("string")
+            def first_letter(values: pd.Series) -> pd.Series:
+                track_memory()
+                return values if identity else values.str[0]
+            return self.df.select(first_letter(column).alias("value"))
+
+        if variant == "map_in_arrow":
+            def first_letter(batches):
+                import pyarrow as pa
+                import pyarrow.compute as pc
+                for batch in batches:
+                    values = batch.column(0)
+                    if not identity: values = pc.utf8_slice_codeunits(values, 0, 1)
+                    track_memory()
+                    yield pa.RecordBatch.from_arrays([values], names=["value"])
+            return self.df.mapInArrow(first_letter, "value string")
+
+        raise ValueError(f"Unknown variant \"{variant}\", expected one of {UdfBenchmark.VARIANTS}")
+
+
+    def time_variant(self, variant, identity):
+        """
+        :return: (elapsed seconds, largest growth of a Python worker's memory in KB, or None for the built-in variant)
+        """
+        import time
+
+        peak_memory = spark.sparkContext.accumulator(0, MaxAccumulatorParam())
+        df = self.build(variant, identity, peak_memory)
+
+        start = time.time()
+        df.write.format("noop").mode("overwrite").save()
+        elapsed = time.time() - start
+
+        return elapsed, (peak_memory.value if variant != "builtin" else None)
+
+
+    def run(self, variants=None):
+        """
+        Runs each variant once per batch size; the built-in variant ignores the Arrow batch size and runs once.
+
+        :param variants: subset of VARIANTS (optional)
+        :return: list of dictionaries with rows_per_second, serialization_seconds and python_memory_growth_mb
+        """
+        previous = spark.conf.get(UdfBenchmark.BATCH_SIZE_KEY)
+
+        try:
+            for variant in variants or UdfBenchmark.VARIANTS:
+                batch_sizes = [None] if variant == "builtin" else self.batch_sizes
+                for batch_size in batch_sizes:
+                    if batch_size is not None: spark.conf.set(UdfBenchmark.BATCH_SIZE_KEY, batch_size)
+                    print(f"Running {variant} with {batch_size or 'n/a'} records per batch", end="...")
+
+                    elapsed, growth_kb = self.time_variant(variant, identity=False)
+                    serialization = None if variant == "builtin" else self.time_variant(variant, identity=True)[0]
+                    print(f"{elapsed:,.2f} seconds")
+
+                    self.results.append({
+                        "variant": variant,
+                        "max_records_per_batch": batch_size,
+                        "seconds": elapsed,
+                        "rows_per_second": self.row_count / elapsed if elapsed else None,
+                        "serialization_seconds": serialization,
+                        "python_memory_growth_mb": None if growth_kb is None else growth_kb / 1024,
+                    })
+        finally:
+            spark.conf.set(UdfBenchmark.BATCH_SIZE_KEY, previous)
+
+        return self.results
+
+
+    def display_report(self):
+        """
+        Displays the results as a table, fastest variant first.
+        """
+        assert len(self.results) > 0, "No results to report; call run() first."
+        display(spark.createDataFrame(self.results).orderBy(F.desc("rows_per_second")))
+
+
+    def cleanup(self):
+        self.df.unpersist()
+
+None
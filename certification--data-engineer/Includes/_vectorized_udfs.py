@@ -0,0 +1,198 @@
+# Databricks notebook source
+import pandas as pd
+import pyspark.sql.functions as F
+
+class VectorizedUdf:
+    """
+    A Python UDF together with its vectorized equivalents.
+
+      Attributes:
+          name: function name, used for the SQL registration
+          scalar_function: the original row-at-a-time Python function; the reference for correctness
+          return_type: DDL return type, e.g. "string"
+          parameters: DDL parameter list for the SQL registration, e.g. "text string"
+          column_function: builds a Catalyst expression from Column arguments (optional)
+          sql_body: the same expression in SQL, over the parameter names (required with column_function)
+          pandas_function: pandas.Series based equivalent run as a pandas (Arrow) UDF (optional)
+
+    The Catalyst expression is preferred, then the pandas UDF, then the scalar UDF.
+    """
+
+    def __init__(self, name, scalar_function, return_type, parameters, column_function=None, sql_body=None, pandas_function=None):
+        assert (column_function is None) == (sql_body is None), f"Expected both or neither of column_function and sql_body for \"{name}\""
+
+        self.name = name
+        self.scalar_function = scalar_function
+        self.return_type = return_type
+        self.parameters = parameters
+        self.column_function = column_function
+        self.sql_body = sql_body
+        self.pandas_function = pandas_function
+
+
+    def get_scalar_udf(self):
+        return F.udf(self.scalar_function, self.return_type)
+
+
+    def get_vectorized_function(self):
+        """
+        Returns a function of Columns (or column names) producing the fastest available Column.
+        """
+        if self.column_function is not None:
+            return lambda *cols: self.column_function(*[F.col(c) if type(c) is str else c for c in cols])
+        if self.pandas_function is not None:
+            return F.pandas_udf(self.pandas_function, self.return_type)
+        return self.get_scalar_udf()
+
+None
+
+# COMMAND ----------
+
+class VectorizedUdfRegistry:
+    """
+    Registers vectorized UDFs for both the DataFrame and the SQL APIs. A function uses its vectorized
+    equivalent only once verify() has shown it returns what the original scalar UDF returns; until then,
+    or after a mismatch, the scalar UDF is used.
+
+      Attributes:
+          udfs: {name: VectorizedUdf}
+          verified: names of the functions whose vectorized equivalent matched the scalar UDF
+
+      Methods:
+          add(udf): adds a VectorizedUdf
+          get(name): returns the function to use from the DataFrame API
+          register_sql(name=None): registers one or all functions for use from SQL
+          verify(name, df, *columns): compares the vectorized and scalar outputs on df, falling back on a mismatch
+    """
+
+    def __init__(self):
+        self.udfs = dict()
+        self.verified = set()
+
+
+    def add(self, udf):
+        self.udfs[udf.name] = udf
+        return udf
+
+
+    def get(self, name):
+        udf = self.udfs[name]
+        if name not in self.verified: return udf.get_scalar_udf()
+        return udf.get_vectorized_function()
+
+
+    def register_sql(self, name=None):
+        """
+        Registers the function(s) as session-scoped SQL functions.
+
+        Catalyst equivalents are registered as temporary SQL functions so they stay inlined in the plan;
+        the others are registered as Python UDFs. Functions not verified are registered as their scalar UDF.
+        """
+        for udf in [self.udfs[name]] if name else self.udfs.values():
+            spark.sql(f"DROP TEMPORARY FUNCTION IF EXISTS {udf.name}")
+
+            if udf.name not in self.verified:
+                print(f"WARNING: The vectorized \"{udf.name}\" was not verified; registering the scalar UDF.")
+                spark.udf.register(udf.name, udf.get_scalar_udf())
+            elif udf.sql_body is None and udf.pandas_function is None:
+                spark.udf.register(udf.name, udf.get_scalar_udf())
+            elif udf.sql_body is not None:
+                spark.sql(f"CREATE TEMPORARY FUNCTION {udf.name}({udf.parameters}) RETURNS {udf.return_type} RETURN {udf.sql_body}")
+            else:
+                spark.udf.register(udf.name, F.pandas_udf(udf.pandas_function, udf.return_type))
+
+
+    def verify(self, name, df, *columns):
+        """
+        Proves that the vectorized function returns exactly what the scalar function returns on df.
+
+        Rows are compared with null-safe equality in one pass; on any mismatch the registry falls back
+        to the scalar UDF for this function, for both the DataFrame and the SQL APIs. A comparison that fails,
+        e.g. a scalar function raising a TypeError on a null, counts as a mismatch.
+
+        :param name: the registered function
+        :param df: sample data
+        :param columns: the argument columns
+        :return: True if the outputs are identical
+        """
+        udf = self.udfs[name]
+        compared = df.select(udf.get_scalar_udf()(*columns).alias("expected"),
+                             udf.get_vectorized_function()(*columns).alias("actual"))
+        try:
+            mismatches = compared.filter(~F.col("expected").eqNullSafe(F.col("actual"))).count()
+            difference = f"differs from the scalar UDF on {mismatches:,} row(s)"
+        except Exception as e:
+            mismatches = None
+            difference = f"could not be compared with the scalar UDF: {str(e)[:1000]}"
+
+        if mismatches == 0:
+            self.verified.add(name)
+            return True
+
+        print(f"WARNING: The vectorized \"{name}\" {difference}; falling back to the scalar UDF.")
+        self.verified.discard(name)
+        if spark.catalog.functionExists(name): self.register_sql(name)
+        return False
+
+None
+
+# COMMAND ----------
+
+def extract_email_vectorized(text: pd.Series) -> pd.Series:
+    emails = text.str.extract(r"<(.*?)>", expand=False)
+    return emails.where(emails.notna(), None)
+
+None
+
+# COMMAND ----------
+
+def get_elt_udfs(extract_email, sale_announcement, item_preference):
+    """
+    Builds the registry of the UDFs of section2-spark-ELT-D from the lesson's own scalar functions, so that
+    verify() compares the equivalents below with the functions the lesson actually runs.
+
+    extract_email also has a pandas equivalent to illustrate the Arrow-based fallback tier.
+    Python's round() rounds half to even, hence bround() rather than round() in the equivalents.
+
+    Example:
+        elt_udfs = get_elt_udfs(extract_email, sale_announcement, item_preference)
+    """
+    registry = VectorizedUdfRegistry()
+
+    registry.add(VectorizedUdf(
+        name="extract_email",
+        scalar_function=extract_email,
+        return_type="string",
+        parameters="text string",
+        column_function=lambda text: F.when(text.rlike("<(.*?)>"), F.regexp_extract(text, "<(.*?)>", 1)),
+        sql_body="CASE WHEN text RLIKE '<(.*?)>' THEN regexp_extract(text, '<(.*?)>', 1) END",
+        pandas_function=extract_email_vectorized))
+
+    registry.add(VectorizedUdf(
+        name="sale_announcement",
+        scalar_function=sale_announcement,
+        return_type="string",
+        parameters="item_name string, item_price double",
+        column_function=lambda item_name, item_price: F.concat(F.lit("The "), item_name, F.lit(" is on sale for $"),
+                                                               F.bround(item_price * 0.8, 0).cast("double").cast("string")),
+        sql_body="concat('The ', item_name, ' is on sale for $', CAST(CAST(bround(item_price * 0.8, 0) AS DOUBLE) AS STRING))"))
+
+    registry.add(VectorizedUdf(
+        name="item_preference",
+        scalar_function=item_preference,
+        return_type="string",
+        parameters="name string, price double",
+        column_function=lambda name, price: (F.when(name == "Standard Queen Mattress", F.lit("This is my default mattress"))
+                                              .when(name == "Premium Queen Mattress", F.lit("This is my favorite mattress"))
+                                              .when(price > 100, F.concat(F.lit("I'd wait until the "), name, F.lit(" is on sale for $"),
+                                                                          F.bround(price * 0.8, 0).cast("long").cast("string")))
+                                              .otherwise(F.concat(F.lit("I don't need a "), name))),
+        sql_body="""CASE WHEN name = 'Standard Queen Mattress' THEN 'This is my default mattress'
+                         WHEN name = 'Premium Queen Mattress' THEN 'This is my favorite mattress'
+                         WHEN price > 100 THEN concat('I\\'d wait until the ', name, ' is on sale for $', CAST(CAST(bround(price * 0.8, 0) AS BIGINT) AS STRING))
+                         ELSE concat('I don\\'t need a ', name)
+                    END"""))
+
+    return registry
+
+None
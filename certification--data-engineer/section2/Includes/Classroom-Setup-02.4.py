@@ -4,6 +4,10 @@
 
 # COMMAND ----------
 
+# MAGIC %run ../../Includes/_deduplication
+
+# COMMAND ----------
+
 # lesson: Writing delta 
 def _create_eltwss_users_update():
     import time
@@ -434,6 +434,62 @@ dedupedDF.count()
 
 # COMMAND ----------
 
+# MAGIC %md
+# MAGIC ### 1 回の集計で最新レコードを残す（max_by による重複排除）
+# MAGIC
+# MAGIC 上記の `ROW_NUMBER` は全行をシャッフルしてソートし、`GROUP BY` と結合を組み合わせる方法は 2 回シャッフルしたうえで、最新の`updated`が同じ行をすべて残してしまう。
+# MAGIC
+# MAGIC `DA.deduplicate_latest()` は、キーごとに `max_by` と struct の順序（`updated`、次にその他の列）で最新のレコードを選ぶ。集計はシャッフルの前に部分集計されるため、シャッフルは 1 回だけで、同じ`updated`の行がある場合も常に同じ行が残る。
+
+# COMMAND ----------
+
+deduplicated_df = DA.deduplicate_latest("users_dirty", keys=["email"], order_by="updated")
+deduplicated_df.count()
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC 3 つの方法を実行し、行数、シャッフルの回数、実行時間を比較する。`GROUP BY`と結合を組み合わせる方法は、上記と同じく`user_id`と`email`でグループ化する。
+
+# COMMAND ----------
+
+DA.benchmark_deduplication("users_dirty", keys=["email"], order_by="updated", join_keys=["user_id", "email"])
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC #### 重複排除済み Delta テーブルの増分更新
+# MAGIC
+# MAGIC `DA.deduplicate_into()` は、前回の実行以降にソーステーブルに追加された行だけを Delta ストリームで読み取り、重複を排除してから`users_deduplicated`に MERGE する。既存のレコードは、新しい行の方が新しい場合にのみ置き換えられる。初回の実行ではテーブルを作成する。
+# MAGIC
+# MAGIC 以降のセクションで使用する`users_dirty`を変更しないように、そのコピー`users_dirty_appends`に行を追加する。コピーを作り直すため、`users_deduplicated`とそのチェックポイントも削除しておく。
+
+# COMMAND ----------
+
+# MAGIC %sql
+# MAGIC CREATE OR REPLACE TABLE users_dirty_appends AS SELECT * FROM users_dirty;
+# MAGIC DROP TABLE IF EXISTS users_deduplicated
+
+# COMMAND ----------
+
+dbutils.fs.rm(f"{DA.paths.working_dir}/deduplication/users_deduplicated", True)
+DA.deduplicate_into("users_dirty_appends", "users_deduplicated", keys=["email"], order_by="updated")
+
+# COMMAND ----------
+
+# MAGIC %sql
+# MAGIC INSERT INTO users_dirty_appends
+# MAGIC SELECT user_id, user_first_touch_timestamp, email, current_timestamp() AS updated
+# MAGIC FROM users_dirty
+# MAGIC WHERE email IS NOT NULL
+# MAGIC LIMIT 5
+
+# COMMAND ----------
+
+DA.deduplicate_into("users_dirty_appends", "users_deduplicated", keys=["email"], order_by="updated")
+
+# COMMAND ----------
+
 # MAGIC %md
 # MAGIC ## ● すべての行に対してプライマリキーが一意であることを確認する。
 
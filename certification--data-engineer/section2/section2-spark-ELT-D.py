@@ -2322,3 +2322,30 @@ item_df = item_df.withColumn("preference", item_preference_udf(col("name"), col(
 
 # 結果表示
 display(item_df)
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC #### ベクトル化したUDFを利用する
+# MAGIC
+# MAGIC 上記の Python UDF は、1行ずつ Python ワーカーとの間でシリアライズされる。`Includes/_vectorized_udfs` は、`extract_email`、`sale_announcement`、`item_preference` と同じ処理を Catalyst の式（または Pandas UDF）として DataFrame API と SQL の両方に登録する。
+# MAGIC
+# MAGIC `get_elt_udfs()` には、このノートブックで定義した元の関数を渡す。`verify()` は元の UDF と出力が完全に一致することを検証し、一致しない場合や元の関数がエラーになる場合は元の UDF にフォールバックする。検証していない関数は、元の UDF として登録される。
+
+# COMMAND ----------
+
+# MAGIC %run ../Includes/_vectorized_udfs
+
+# COMMAND ----------
+
+elt_udfs = get_elt_udfs(extract_email, sale_announcement, item_preference)
+
+info_df = spark.createDataFrame([("John Doe <john.doe@example.com>",), ("Jane Smith <jane.smith@example.net>",), ("No email address",)], ["info"])
+elt_udfs.verify("extract_email", info_df, "info")
+elt_udfs.verify("item_preference", item_df, "name", "price")
+elt_udfs.verify("sale_announcement", itemsDF, "name", "price")
+elt_udfs.register_sql()
+
+item_preference_vectorized = elt_udfs.get("item_preference")
+display(item_df.withColumn("preference", item_preference_vectorized("name", "price")))
+display(itemsDF.selectExpr("*", "sale_announcement(name, price) AS message"))
@@ -4,6 +4,10 @@
 
 # COMMAND ----------
 
+# MAGIC %run ../../Includes/_pipeline_event_log
+
+# COMMAND ----------
+
 lesson_name = "pipeline_demo"
 
 # COMMAND ----------
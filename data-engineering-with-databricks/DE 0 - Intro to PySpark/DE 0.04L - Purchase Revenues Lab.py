@@ -82,7 +82,7 @@ display(purchases_df)
 
 # COMMAND ----------
 
-assert purchases_df.filter(col("revenue").isNull()).count() == 0, "Nulls in 'revenue' column"
+DA.validate_dataframe(purchases_df, "2.1: purchases_df", null_counts={"revenue": 0})
 print("All test pass")
 
 # COMMAND ----------
@@ -152,7 +152,7 @@ display(final_df)
 
 # COMMAND ----------
 
-assert(final_df.count() == 9056)
+DA.validate_dataframe(final_df, "5.1: final_df", row_count=9056)
 print("All test pass")
 
 # COMMAND ----------
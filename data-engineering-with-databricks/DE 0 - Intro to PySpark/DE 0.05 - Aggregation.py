@@ -193,6 +193,30 @@ display(spark.range(10)  # Create a DataFrame with a single column called "id" w
 
 # COMMAND ----------
 
+# DBTITLE 0,--i18n-9f2d6b31-7e48-4a05-b3c9-1d8e5f0a7c26
+# MAGIC %md
+# MAGIC ### 近似集約 (Approximate Aggregation)
+# MAGIC
+# MAGIC **`SketchAggregation`** は、1つのグループ集約の定義を、正確な集約と近似集約（HyperLogLog による一意の数、分位点、頻出値）のどちらでも実行できるようにします。 **`DA.set_aggregation_mode`** で、ダッシュボード全体のモードを一度に切り替えられます。
+# MAGIC
+# MAGIC 近似集約のスケッチは日ごとにDeltaテーブルに保存され、元のデータを読み直さずに任意の期間でマージできます。次のセルは、 **`events`** テーブルで正確な集約、近似集約、スケッチによる集約の精度と速度を比較します。
+
+# COMMAND ----------
+
+state_aggregation = SketchAggregation(group_by=["geo.state"],
+                                      distinct_columns=["user_id"],
+                                      quantile_columns=["ecommerce.purchase_revenue_in_usd"])
+
+DA.set_aggregation_mode("approx")
+display(state_aggregation.aggregate(df))
+DA.set_aggregation_mode("exact")
+
+# COMMAND ----------
+
+accuracy_report = DA.report_aggregation_accuracy(df)
+
+# COMMAND ----------
+
 # DBTITLE 0,--i18n-d03fb77f-5e4c-43b8-a293-884cd7cb174c
 # MAGIC %md
 # MAGIC ### クラスルームで使ったリソースの削除 (Clean up classroom)
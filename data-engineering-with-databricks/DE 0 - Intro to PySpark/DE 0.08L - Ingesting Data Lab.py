@@ -53,7 +53,7 @@ products_df.printSchema()
 
 # COMMAND ----------
 
-assert(products_df.count() == 12)
+DA.validate_dataframe(products_df, "1.1: products_df", row_count=12)
 print("All test pass")
 
 # COMMAND ----------
@@ -112,7 +112,7 @@ products_df3 = FILL_IN
 
 # COMMAND ----------
 
-assert(products_df3.count() == 12)
+DA.validate_dataframe(products_df3, "3.1: products_df3", row_count=12)
 print("All test pass")
 
 # COMMAND ----------
@@ -152,6 +152,22 @@ print("All test pass")
 
 # COMMAND ----------
 
+# DBTITLE 0,--i18n-d95f3b06-2c7e-4a18-b4d9-5e0a8f1c7b23
+# MAGIC %md
+# MAGIC ### ボーナス：スキーマのキャッシュ (Bonus: Caching Inferred Schemas)
+# MAGIC
+# MAGIC **`DA.read_with_cached_schema`** は推論したスキーマをDDLとして保存し、2回目以降の読み込みではスキーマ推論のためのデータの読み取りを省略します。
+
+# COMMAND ----------
+
+for i in range(2):
+    cached_products_df = DA.read_with_cached_schema("csv", DA.paths.products_csv, header=True)
+
+print(DA.get_schema_cache().get_schema("csv", DA.paths.products_csv, header=True)[0])
+DA.get_schema_cache().display_report()
+
+# COMMAND ----------
+
 # DBTITLE 0,--i18n-42fb4bd4-287f-4863-b6ea-f635f315d8ec
 # MAGIC %md
 # MAGIC ### クラスルームで使ったリソースの削除 (Clean up classroom)
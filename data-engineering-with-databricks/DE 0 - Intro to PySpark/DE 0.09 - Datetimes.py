@@ -182,6 +182,27 @@ display(plus_2_df)
 
 # COMMAND ----------
 
+# DBTITLE 0,--i18n-c41e7a09-3b6d-4f25-8e91-6a2d0f5b8c73
+# MAGIC %md
+# MAGIC ### 日付ディメンション (Date Dimensions)
+# MAGIC
+# MAGIC 上記のように **`date_format`** や **`year`** などを毎回すべての行で計算する代わりに、日付（1日1行）と時刻（1秒1行）のディメンションテーブルを一度だけ作成し、ブロードキャスト結合で属性を追加することができます。マイクロ秒からタイムスタンプへの変換も、取り込み時に一度だけ行います。
+# MAGIC
+# MAGIC 次のセルでは、行ごとの変換とディメンションとの結合を比較します。
+
+# COMMAND ----------
+
+DA.create_date_dimensions()
+
+enriched_df = enrich_with_dimensions(spark.table("events_timestamped"), spark.table("dim_date"), spark.table("dim_time"))
+display(enriched_df.select("user_id", "timestamp", "date_string", "time_string", "year", "month", "dayofweek", "minute", "second"))
+
+# COMMAND ----------
+
+date_benchmark = DA.benchmark_date_dimensions()
+
+# COMMAND ----------
+
 # DBTITLE 0,--i18n-3669ec6f-2f26-4607-9f58-656d463308b5
 # MAGIC %md
 # MAGIC ### クラスルームで使ったリソースの削除 (Clean up classroom)
@@ -85,11 +85,10 @@ expected_columns = ["email", "converted"]
 
 expected_count = 10510
 
-assert converted_users_df.columns == expected_columns, "converted_users_df does not have the correct columns"
-
-assert converted_users_df.count() == expected_count, "converted_users_df does not have the correct number of rows"
-
-assert converted_users_df.select(col("converted")).first()[0] == True, "converted column not correct"
+DA.validate_dataframe(converted_users_df, "1.1: converted_users_df",
+                      columns=expected_columns,
+                      row_count=expected_count,
+                      first_values={"converted": True})
 print("All test pass")
 
 # COMMAND ----------
@@ -126,13 +125,11 @@ expected_count = 38939
 
 expected_false_count = 28429
 
-assert conversions_df.columns == expected_columns, "Columns are not correct"
-
-assert conversions_df.filter(col("email").isNull()).count() == 0, "Email column contains null"
-
-assert conversions_df.count() == expected_count, "There is an incorrect number of rows"
-
-assert conversions_df.filter(col("converted") == False).count() == expected_false_count, "There is an incorrect number of false entries in converted column"
+DA.validate_dataframe(conversions_df, "2.1: conversions_df",
+                      columns=expected_columns,
+                      row_count=expected_count,
+                      null_counts={"email": 0},
+                      counts_where={"converted = false": expected_false_count})
 print("All test pass")
 
 # COMMAND ----------
@@ -167,11 +164,10 @@ expected_columns = ["user_id", "cart"]
 
 expected_count = 24574
 
-assert carts_df.columns == expected_columns, "Incorrect columns"
-
-assert carts_df.count() == expected_count, "Incorrect number of rows"
-
-assert carts_df.select(col("user_id")).drop_duplicates().count() == expected_count, "Duplicate user_ids present"
+DA.validate_dataframe(carts_df, "3.1: carts_df",
+                      columns=expected_columns,
+                      row_count=expected_count,
+                      distinct_counts={"user_id": expected_count})
 print("All test pass")
 
 # COMMAND ----------
@@ -209,11 +205,10 @@ expected_count = 38939
 
 expected_cart_null_count = 19671
 
-assert email_carts_df.columns == expected_columns, "Columns do not match"
-
-assert email_carts_df.count() == expected_count, "Counts do not match"
-
-assert email_carts_df.filter(col("cart").isNull()).count() == expected_cart_null_count, "Cart null counts incorrect from join"
+DA.validate_dataframe(email_carts_df, "4.1: email_carts_df",
+                      columns=expected_columns,
+                      row_count=expected_count,
+                      null_counts={"cart": expected_cart_null_count})
 print("All test pass")
 
 # COMMAND ----------
@@ -247,9 +242,9 @@ expected_columns = ["user_id", "email", "user_first_touch_timestamp", "updated",
 
 expected_count = 10212
 
-assert abandoned_carts_df.columns == expected_columns, "Columns do not match"
-
-assert abandoned_carts_df.count() == expected_count, "Counts do not match"
+DA.validate_dataframe(abandoned_carts_df, "5.1: abandoned_carts_df",
+                      columns=expected_columns,
+                      row_count=expected_count)
 print("All test pass")
 
 # COMMAND ----------
@@ -280,9 +275,9 @@ expected_columns = ["items", "count"]
 
 expected_count = 12
 
-assert abandoned_items_df.count() == expected_count, "Counts do not match"
-
-assert abandoned_items_df.columns == expected_columns, "Columns do not match"
+DA.validate_dataframe(abandoned_items_df, "6.1: abandoned_items_df",
+                      columns=expected_columns,
+                      row_count=expected_count)
 print("All test pass")
 
 # COMMAND ----------
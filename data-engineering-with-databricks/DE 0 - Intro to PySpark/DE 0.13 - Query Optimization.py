@@ -104,6 +104,38 @@ stupid_df.explain(True)
 
 # COMMAND ----------
 
+# DBTITLE 0,--i18n-3f6b1a2e-8c4d-4e0b-9a57-2d1c6e8f4b90
+# MAGIC %md
+# MAGIC ### クエリープランの比較 (Comparing Query Plans)
+# MAGIC
+# MAGIC <strong>`explain(True)`</strong>の出力を目で比べる代わりに、<strong>`DA.inspect_query_plans`</strong>を使うと、分析済み・最適化済み・物理プランを取得し、冗長なフィルター、プッシュダウンされなかった述語、キャッシュによって失われたプッシュダウンを検出できます。
+# MAGIC
+# MAGIC 各クエリーは実際に実行され、スキャンしたバイト数とタスク時間も比較されます。
+
+# COMMAND ----------
+
+comparison = DA.inspect_query_plans(limit_events_df=limit_events_df, better_df=better_df, stupid_df=stupid_df)
+
+# COMMAND ----------
+
+# DBTITLE 0,--i18n-6d0e4c7a-1b25-4f93-b8e6-7a4c3d9f2e15
+# MAGIC %md
+# MAGIC 個々のプランの差分も確認できます。また、<strong>`get_baseline()`</strong>の結果を保存しておけば、<strong>`assert_no_regression`</strong>で本番のクエリーのプランや性能の劣化を検出できます。
+
+# COMMAND ----------
+
+stupid_inspector = comparison.inspectors["stupid_df"]
+print("\n".join(stupid_inspector.diff("analyzed", "optimized")))
+
+# stupid_df repeats a predicate that better_df does not, so it fails against better_df as a baseline
+baseline = comparison.inspectors["better_df"].get_baseline()
+try:
+    stupid_inspector.assert_no_regression(baseline)
+except AssertionError as e:
+    print(e)
+
+# COMMAND ----------
+
 # DBTITLE 0,--i18n-90d320e9-9295-4869-8042-217652fe355b
 # MAGIC %md
 # MAGIC ### キャッシング (Caching)
@@ -163,6 +195,19 @@ pp_df.explain(True)
 
 # COMMAND ----------
 
+# DBTITLE 0,--i18n-8e2f4c6a-3d19-4b7e-a5c0-1f6d9b2e7a34
+# MAGIC %md
+# MAGIC 上の例では<strong>`lowerBound`</strong>、<strong>`upperBound`</strong>、<strong>`numPartitions`</strong>を手で指定しています。<strong>`DA.read_jdbc`</strong>を使うと、これらの値をデータベースの統計情報から自動的に決めることができます。
+
+# COMMAND ----------
+
+auto_pp_df = (DA.read_jdbc(jdbc_url, "training.people_1m", "id", properties=conn_properties)
+              .filter(col("gender") == "M"))
+
+auto_pp_df.explain(True)
+
+# COMMAND ----------
+
 # DBTITLE 0,--i18n-b067b782-e86b-4284-80f4-4faedfb0953e
 # MAGIC %md
 # MAGIC **Filter**がないことと、**Scan**に**PushedFilters**があることに注目してください。フィルター操作がデータベースに送られ、マッチしたレコードがSparkに返されます。これによりSparkが取り込まなければならないデータ量が大幅に削減されます。
@@ -18,7 +18,7 @@ lesson_config = LessonConfig(name = None,
 
 DA = DBAcademyHelper(course_config=course_config, 
                      lesson_config=lesson_config)
-DA.reset_lesson()
+DA.reset_lesson_keeping_clones()
 DA.init()
 
 _setup_tables()
@@ -8,6 +8,10 @@
 
 # COMMAND ----------
 
+# MAGIC %run ../../Includes/_lab_assertions
+
+# COMMAND ----------
+
 lesson_config = LessonConfig(name = None,
                              create_schema = True,
                              create_catalog = False,
@@ -18,7 +22,7 @@ lesson_config = LessonConfig(name = None,
 
 DA = DBAcademyHelper(course_config=course_config, 
                      lesson_config=lesson_config)
-DA.reset_lesson()
+DA.reset_lesson_keeping_clones()
 DA.init()
 
 _setup_tables()
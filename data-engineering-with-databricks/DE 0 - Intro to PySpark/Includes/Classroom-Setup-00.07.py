@@ -4,6 +4,10 @@
 
 # COMMAND ----------
 
+# MAGIC %run ../../Includes/_schema_cache
+
+# COMMAND ----------
+
 lesson_config = LessonConfig(name = None,
                              create_schema = True,
                              create_catalog = False,
@@ -25,6 +29,9 @@ DA.paths.events_json = f"{DA.paths.datasets}/ecommerce/raw/events-500k-json"
 DA.paths.users_csv = f"{DA.paths.working_dir}/users-csv"
 dbutils.fs.cp(f"{DA.paths.datasets}/ecommerce/raw/users-500k-csv", DA.paths.users_csv, True)
 
+# The copy is refreshed by every setup; fingerprint the dataset instead, so that cached schemas survive it
+DA.get_schema_cache().register_copy(DA.paths.users_csv, f"{DA.paths.datasets}/ecommerce/raw/users-500k-csv")
+
 # COMMAND ----------
 
 DA.conclude_setup()                      # Conclude setup by advertising environmental changes
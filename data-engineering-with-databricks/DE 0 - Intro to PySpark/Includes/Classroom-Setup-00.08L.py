@@ -8,6 +8,14 @@
 
 # COMMAND ----------
 
+# MAGIC %run ../../Includes/_lab_assertions
+
+# COMMAND ----------
+
+# MAGIC %run ../../Includes/_schema_cache
+
+# COMMAND ----------
+
 lesson_config = LessonConfig(name = None,
                              create_schema = True,
                              create_catalog = False,
@@ -25,4 +33,7 @@ DA.init()
 DA.paths.products_csv = f"{DA.paths.working_dir}/products-csv"
 dbutils.fs.cp(f"{DA.paths.datasets}/ecommerce/raw/products-csv", DA.paths.products_csv, True)
 
+# The copy is refreshed by every setup; fingerprint the dataset instead, so that cached schemas survive it
+DA.get_schema_cache().register_copy(DA.paths.products_csv, f"{DA.paths.datasets}/ecommerce/raw/products-csv")
+
 DA.conclude_setup()                      # Conclude setup by advertising environmental changes
@@ -8,6 +8,14 @@
 
 # COMMAND ----------
 
+# MAGIC %run ../../Includes/_plan_inspector
+
+# COMMAND ----------
+
+# MAGIC %run ../../Includes/_jdbc_reader
+
+# COMMAND ----------
+
 lesson_config = LessonConfig(name = None,
                              create_schema = True,
                              create_catalog = False,
@@ -18,7 +26,7 @@ lesson_config = LessonConfig(name = None,
 
 DA = DBAcademyHelper(course_config=course_config,
                      lesson_config=lesson_config)
-DA.reset_lesson()
+DA.reset_lesson_keeping_clones()
 DA.init()
 
 _setup_tables()
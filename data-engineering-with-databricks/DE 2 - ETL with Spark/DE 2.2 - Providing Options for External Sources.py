@@ -293,6 +293,26 @@ print(f"Found {len(files)} files")
 
 # COMMAND ----------
 
+# DBTITLE 0,--i18n-0b7d5e2c-4a61-4f8e-9d3b-6c2a1f9e8d47
+# MAGIC %md
+# MAGIC ### 並列に JDBC ソースを読み込む (Reading a JDBC Source in Parallel)
+# MAGIC
+# MAGIC <strong>`spark.read.jdbc`</strong> は、パーティション列の <strong>`lowerBound`</strong>、<strong>`upperBound`</strong>、<strong>`numPartitions`</strong> を指定しない限り、1つの接続でテーブル全体を読み込みます。
+# MAGIC
+# MAGIC <strong>`DA.read_jdbc`</strong> は、データベースからパーティション列の最小値・最大値・行数（オプションで分位点）を取得し、パーティション数と偏りを考慮した述語を自動的に決定します。接続プロパティと、行の幅から決めた fetch size はソースごとに共有されます。
+
+# COMMAND ----------
+
+users_reader = PartitionedJdbcReader(f"jdbc:sqlite:{DA.paths.ecommerce_db}", "users", "user_first_touch_timestamp",
+                                     rows_per_partition=10000, histogram_buckets=64)
+print(users_reader.plan())
+
+users_df = DA.read_jdbc(f"jdbc:sqlite:{DA.paths.ecommerce_db}", "users", "user_first_touch_timestamp",
+                        rows_per_partition=10000, histogram_buckets=64)
+print(f"Read {users_df.count():,} records in {users_df.rdd.getNumPartitions()} partitions")
+
+# COMMAND ----------
+
 # DBTITLE 0,--i18n-1cb11f07-755c-4fb2-a122-1eb340033712
 # MAGIC %md
 # MAGIC データウェアハウスなど、一部のSQLシステムにはカスタムのドライバがあることにご注意ください。 Sparkがさまざまな外部のデータソースと相互作用する方法は異なりますが、2つの基本的な方法は次の通り要約できます：
@@ -185,6 +185,22 @@ spark.udf.register("sql_vectorized_udf", vectorized_udf)
 
 # COMMAND ----------
 
+# DBTITLE 0,--i18n-b7d2f0c1-6a3e-4e58-9c1d-2f8a7e4b5c63
+# MAGIC %md
+# MAGIC ### UDFの性能比較 (Comparing UDF Performance)
+# MAGIC
+# MAGIC **`UdfBenchmark`** は、同じ変換（メールアドレスの先頭文字）を Python UDF、Pandas UDF、**`mapInArrow`**、組み込みの **`substring`** で実行し、
+# MAGIC **`spark.sql.execution.arrow.maxRecordsPerBatch`** ごとに、1秒あたりの行数、シリアライズ時間、各タスクでのPythonワーカーのメモリ増加量を比較します。
+
+# COMMAND ----------
+
+udf_benchmark = UdfBenchmark(spark.table("sales"), column="email")
+udf_benchmark.run()
+udf_benchmark.display_report()
+udf_benchmark.cleanup()
+
+# COMMAND ----------
+
 # DBTITLE 0,--i18n-5e506b8d-a488-4373-af9a-9ebb14834b1b
 # MAGIC %md
 # MAGIC ### クリーンアップ
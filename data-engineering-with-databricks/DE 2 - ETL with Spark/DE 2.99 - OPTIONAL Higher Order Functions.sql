@@ -155,6 +155,19 @@ FROM sales
 
 -- COMMAND ----------
 
+-- DBTITLE 0,--i18n-5b1f8d26-e3a9-4c07-9f64-2a8e7c0d1b35
+-- MAGIC %md
+-- MAGIC ## 高階関数によるベンチマーク（Benchmarking Higher Order Functions）
+-- MAGIC
+-- MAGIC 次のセルでは、 **`items`** を **`explode`** してから **`GROUP BY`** で集約し直すクエリと、高階関数で配列の中だけで処理するクエリを比較します。 どちらも同じ結果を返すことを確認した後、実行時間とシャッフルされたバイト数を表示します。
+
+-- COMMAND ----------
+
+-- MAGIC %python
+-- MAGIC benchmark = DA.benchmark_array_transforms()
+
+-- COMMAND ----------
+
 -- DBTITLE 0,--i18n-ffcde68f-163a-4a25-85d1-c5027c664985
 -- MAGIC %md
 -- MAGIC 次のセルを実行して、このレッスンに関連付けられているテーブルとファイルを削除します。
@@ -257,6 +257,36 @@ FROM students VERSION AS OF 3
 
 -- COMMAND ----------
 
+-- DBTITLE 0,--i18n-e58c03a7-92b4-4d1f-86c5-7a0f3b9d2e14
+-- MAGIC %md
+-- MAGIC 同じ過去のバージョンを繰り返し照会する場合は、 **`DA.read_version()`** を使うことができます。 何度か読み込まれたバージョンはシャロークローンとして実体化され、以降の読み込みはトランザクションログを再生せずにクローンから提供されます。 クローンは、ストレージの予算を超えると最も長く使われていないものから削除されます。
+
+-- COMMAND ----------
+
+-- MAGIC %python
+-- MAGIC for i in range(3):
+-- MAGIC     DA.read_version("students", 3, view_name="students_v3")
+-- MAGIC
+-- MAGIC print(DA.get_snapshot_cache().stats)
+-- MAGIC display(DA.get_snapshot_cache().get_report())
+
+-- COMMAND ----------
+
+SELECT * FROM students_v3
+
+-- COMMAND ----------
+
+-- DBTITLE 0,--i18n-0c4f7d2b-6a19-4e85-b3d0-58e2f1a9c647
+-- MAGIC %md
+-- MAGIC シャロークローンは元のテーブルのデータファイルを共有しているため、このレッスンの後半で **`VACUUM`** を実行する前にキャッシュをクリアします。
+
+-- COMMAND ----------
+
+-- MAGIC %python
+-- MAGIC DA.get_snapshot_cache().clear()
+
+-- COMMAND ----------
+
 -- DBTITLE 0,--i18n-d1d03156-6d88-4d4c-ae8e-ddfe49d957d7
 -- MAGIC %md
 -- MAGIC タイムトラベルについて注意すべきなのは、現バージョンに対するトランザクションを取り消すことにより、以前の状態のテーブルを再作成しているわけではなく、指定されたバージョンの時点で有効と示されたすべてのデータファイルを照会しているだけだということです。
@@ -344,6 +374,20 @@ VACUUM students RETAIN 0 HOURS DRY RUN
 
 -- COMMAND ----------
 
+-- DBTITLE 0,--i18n-b83d6f1e-27c4-4a90-9e5b-6f0a2c8d41b7
+-- MAGIC %md
+-- MAGIC 大きなテーブルでは、 **`VACUUM`** によるディレクトリのリスト作成に時間がかかります。 **`DA.plan_vacuum()`** は、ディレクトリをリストする代わりにトランザクションログの **`remove`** アクションを読み、削除できるファイルと回収できるバイト数を見積もります。 保持期間内のファイルや、タイムトラベルで固定されたバージョンが参照するファイルは保持されます。
+-- MAGIC
+-- MAGIC **`dry_run=False`** を指定すると、レート制限付きの並列バッチでファイルを削除します。
+
+-- COMMAND ----------
+
+-- MAGIC %python
+-- MAGIC vacuum_plan = DA.plan_vacuum("students", retain_hours=0)
+-- MAGIC display(spark.createDataFrame([(f,) for f in vacuum_plan.get("files")], "path STRING"))
+
+-- COMMAND ----------
+
 -- DBTITLE 0,--i18n-7c825ee6-e584-48a1-8d75-f616d7ed53ac
 -- MAGIC %md
 -- MAGIC (DRY RUNの指定を外し) **`VACUUM`** を実行して上の10個のファイルを削除することで、これらのファイルの実体を必要とするバージョンのテーブルへのアクセスを永久に削除します。
@@ -369,6 +413,27 @@ DESC HISTORY students
 
 -- COMMAND ----------
 
+-- DBTITLE 0,--i18n-9a2f6e4d-1c83-4b57-a0d6-3e8b7c52f419
+-- MAGIC %md
+-- MAGIC ## ファイルレイアウトの自動メンテナンス（Automatic File-Layout Maintenance）
+-- MAGIC
+-- MAGIC 小さな書き込みを繰り返すと、テーブルには小さなファイルが蓄積されます。 **`DA.maintain_table_layout()`** は、 **`DESCRIBE DETAIL`** とデータファイルのサイズから小さなファイルの割合を求め、メンテナンスが必要なテーブルを選びます。
+-- MAGIC
+-- MAGIC 記録されたクエリのフィルタ条件から **`ZORDER BY`** の列を決め、 **`OPTIMIZE`** を同時に実行する数を制限しながら実行し、前後のファイル数とスキャン時間を記録します。
+
+-- COMMAND ----------
+
+INSERT INTO students VALUES (11, "Zhao", 4.1);
+INSERT INTO students VALUES (12, "Priya", 5.2);
+INSERT INTO students VALUES (13, "Lukas", 6.8)
+
+-- COMMAND ----------
+
+-- MAGIC %python
+-- MAGIC scheduler = DA.maintain_table_layout("students", queries=[spark.table("students").filter("id = 12")])
+
+-- COMMAND ----------
+
 -- DBTITLE 0,--i18n-3437d5f0-c0e2-4486-8142-413a1849bc40
 -- MAGIC %md
 -- MAGIC 次のセルを実行して、このレッスンに関連するテーブルとファイルを削除してください。
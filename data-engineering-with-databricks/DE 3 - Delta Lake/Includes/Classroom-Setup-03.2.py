@@ -4,6 +4,18 @@
 
 # COMMAND ----------
 
+# MAGIC %run ../../Includes/_layout_maintenance
+
+# COMMAND ----------
+
+# MAGIC %run ../../Includes/_snapshot_cache
+
+# COMMAND ----------
+
+# MAGIC %run ../../Includes/_vacuum_planner
+
+# COMMAND ----------
+
 lesson_config = LessonConfig(name = None,
                              create_schema = True,
                              create_catalog = False,
@@ -120,6 +120,24 @@ SELECT * FROM gold.heartrate_avgs
 
 -- COMMAND ----------
 
+-- DBTITLE 0,--i18n-5d0c3f7e-2a61-4b8e-9c47-e1f8a6b2d934
+-- MAGIC %md
+-- MAGIC ### 権限ポリシーとの差分を適用する（Reconciling Grants with a Policy）
+-- MAGIC
+-- MAGIC 上記の GRANT 文は、現在の権限に関係なく 1 文ずつ実行されます。 **`DA.reconcile_grants()`** は、 **SHOW GRANTS** で各セキュリティ保護可能なオブジェクトの現在の権限を並列に読み取り、目的のポリシーと比較して、必要最小限の GRANT と REVOKE だけを発行します。
+-- MAGIC
+-- MAGIC **`dry_run=True`** では、文を実行せずに一覧表示します。ポリシーがすでに満たされている場合、何も発行されません。
+
+-- COMMAND ----------
+
+-- MAGIC %python
+-- MAGIC # DA.reconcile_grants({f"CATALOG {DA.catalog_name}": {"account users": ["USAGE"]},
+-- MAGIC #                      "SCHEMA gold":                 {"account users": ["USAGE"]},
+-- MAGIC #                      "TABLES IN SCHEMA gold":       {"account users": ["SELECT"], ANALYSTS_ROLE_NAME: ["SELECT"]}},
+-- MAGIC #                     catalog=DA.catalog_name, dry_run=True)
+
+-- COMMAND ----------
+
 -- DBTITLE 0,--i18n-cfe19914-4f92-47da-a250-2d350a39736f
 -- MAGIC %md
 -- MAGIC ### ユーザーとしてビューをクエリする
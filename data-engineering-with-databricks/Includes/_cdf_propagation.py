@@ -0,0 +1,286 @@
+# Databricks notebook source
+class ChangeFeedPropagator:
+    """
+    Keeps a downstream table in sync with a Delta source by applying only the source's changes,
+    read from its Change Data Feed, instead of recomputing the table with CTAS or INSERT OVERWRITE.
+
+    The last source version applied is tracked per consumer in offsets_table, so several downstream
+    tables can consume the same source independently. On the first refresh, the target is created from
+    the source's current version; every later refresh reads the changes of the versions committed since,
+    keeps the last change of each key, and applies them with a single MERGE: deletes, updates and inserts.
+
+    The optional transform must be row-wise and keep the columns it does not use, e.g. withColumn or drop:
+    it is also applied to the changed rows, which carry their _change_type, and aggregates cannot be
+    maintained from the changed rows alone. Keys should be unique in the source for the target to match it exactly.
+
+    A source replaced since the last refresh, e.g. by a rerun of CREATE OR REPLACE TABLE events, or whose
+    feed was turned on or off since, has versions without changes to read: the target is then recreated.
+
+      Attributes:
+          source_table: the Delta table whose changes are read
+          target_table: the downstream Delta table
+          keys: columns identifying a row
+          consumer: name under which the last applied version is tracked, defaults to target_table
+          transform: function applied to the source rows and to the changed rows (optional)
+          offsets_table: Delta table of (consumer, source_table, version, updated_at)
+          log: list of dictionaries, one per refresh()
+
+      Methods:
+          enable_change_data_feed(): turns the Change Data Feed of the source on, if needed
+          get_offset(): the last source version applied, or None
+          requires_initialization(offset): whether the changes since the offset cannot be read
+          get_changes(start_version, end_version): the last change of each key between two versions
+          refresh(): applies the changes since the last refresh and returns its log entry
+    """
+
+    CDF_COLUMNS = ["_change_type", "_commit_version", "_commit_timestamp"]
+    CDF_PROPERTY = "delta.enableChangeDataFeed"
+
+    def __init__(self, source_table, target_table, keys, consumer=None, transform=None, offsets_table="cdf_consumer_offsets"):
+        self.source_table = source_table
+        self.target_table = target_table
+        self.keys = keys
+        self.consumer = consumer or target_table
+        self.transform = transform or (lambda df: df)
+        self.offsets_table = offsets_table
+        self.log = []
+
+
+    def enable_change_data_feed(self):
+        """
+        Changes are only recorded for versions committed after the feed was turned on.
+        """
+        properties = {r.key: r.value for r in spark.sql(f"SHOW TBLPROPERTIES {self.source_table}").collect()}
+        if properties.get("delta.enableChangeDataFeed") != "true":
+            print(f"Enabling the Change Data Feed of {self.source_table}")
+            spark.sql(f"ALTER TABLE {self.source_table} SET TBLPROPERTIES (delta.enableChangeDataFeed = true)")
+
+
+    def get_latest_version(self):
+        return spark.sql(f"DESCRIBE HISTORY {self.source_table} LIMIT 1").first()["version"]
+
+
+    def get_offset(self):
+        if not spark.catalog.tableExists(self.offsets_table): return None
+        offsets = spark.table(self.offsets_table).filter((F.col("consumer") == self.consumer) & (F.col("source_table") == self.source_table))
+        row = offsets.select("version").first()
+        return None if row is None else row["version"]
+
+
+    def set_offset(self, version):
+        from delta.tables import DeltaTable
+
+        offset = spark.createDataFrame([(self.consumer, self.source_table, version)], "consumer STRING, source_table STRING, version BIGINT")
+        offset = offset.withColumn("updated_at", F.current_timestamp())
+
+        if not spark.catalog.tableExists(self.offsets_table):
+            offset.write.format("delta").saveAsTable(self.offsets_table)
+            return
+
+        (DeltaTable.forName(spark, self.offsets_table).alias("o")
+                   .merge(offset.alias("n"), "o.consumer = n.consumer AND o.source_table = n.source_table")
+                   .whenMatchedUpdateAll()
+                   .whenNotMatchedInsertAll()
+                   .execute())
+
+
+    def requires_initialization(self, offset):
+        """
+        Looks for a version after the offset that replaced the source or changed its feed property; turning the
+        feed on after the offset means the versions before it were committed without it.
+        """
+        history = spark.sql(f"DESCRIBE HISTORY {self.source_table}").filter(F.col("version") > offset).collect()
+        for h in history:
+            if "REPLACE" in h.operation or h.operation.startswith("CREATE"): return True
+            properties = (h.operationParameters or dict()).get("properties") or (h.operationParameters or dict()).get("propertyKeys") or ""
+            if "TBLPROPERTIES" in h.operation and ChangeFeedPropagator.CDF_PROPERTY.lower() in properties.lower(): return True
+        return False
+
+
+    def get_changes(self, start_version, end_version):
+        """
+        Reads the changes between two versions, inclusive, dropping the pre-images of updates and keeping the last change of each key.
+        """
+        from pyspark.sql.window import Window
+
+        changes = (spark.read
+                        .option("readChangeFeed", True)
+                        .option("startingVersion", start_version)
+                        .option("endingVersion", end_version)
+                        .table(self.source_table)
+                        .filter("_change_type != 'update_preimage'"))
+
+        # Within a version, a key has either a delete, an insert or a post-image; across versions the latest wins
+        window = Window.partitionBy(*self.keys).orderBy(F.col("_commit_version").desc())
+        return changes.withColumn("__rank", F.row_number().over(window)).filter("__rank = 1").drop("__rank")
+
+
+    def initialize(self, version):
+        source_df = spark.read.option("versionAsOf", version).table(self.source_table)
+        self.transform(source_df).write.format("delta").mode("overwrite").option("overwriteSchema", True).saveAsTable(self.target_table)
+
+
+    def apply(self, changes):
+        from delta.tables import DeltaTable
+
+        changes = self.transform(changes.select(*[c for c in changes.columns if c not in ChangeFeedPropagator.CDF_COLUMNS[1:]]))
+        columns = [c for c in changes.columns if c != "_change_type"]
+        condition = " AND ".join(f"t.{k} = c.{k}" for k in self.keys)
+        values = {c: f"c.{c}" for c in columns}
+
+        (DeltaTable.forName(spark, self.target_table).alias("t")
+                   .merge(changes.alias("c"), condition)
+                   .whenMatchedDelete(condition="c._change_type = 'delete'")
+                   .whenMatchedUpdate(set=values)
+                   .whenNotMatchedInsert(condition="c._change_type != 'delete'", values=values)
+                   .execute())
+
+
+    def refresh(self):
+        """
+        Applies the source's changes since the last refresh, or creates the target on the first one.
+
+        :return: the log entry with the versions applied, the number of changes and the seconds spent
+        """
+        import time
+
+        start = time.time()
+        offset = self.get_offset()
+        latest = self.get_latest_version()
+        entry = {"consumer": self.consumer, "source_table": self.source_table, "target_table": self.target_table,
+                 "start_version": None if offset is None else offset + 1, "end_version": latest, "changes": 0}
+
+        if offset is None or not spark.catalog.tableExists(self.target_table) or (offset < latest and self.requires_initialization(offset)):
+            mode = "initial" if offset is None else "reinitialized"
+            self.enable_change_data_feed()
+            # Enabling the feed may have committed a new version; start from the latest one
+            latest = self.get_latest_version()
+            self.initialize(latest)
+            entry.update({"mode": mode, "start_version": None, "end_version": latest, "changes": spark.table(self.target_table).count()})
+
+        elif offset >= latest:
+            entry.update({"mode": "up_to_date", "start_version": None})
+
+        else:
+            changes = self.get_changes(offset + 1, latest).cache()
+            try:
+                entry.update({"mode": "incremental", "changes": changes.count()})
+                if entry.get("changes") > 0: self.apply(changes)
+            finally:
+                changes.unpersist()
+
+        self.set_offset(latest)
+        entry["seconds"] = time.time() - start
+        self.log.append(entry)
+        print(f"""Refreshed {self.target_table} from {self.source_table} ({entry.get("mode")}, {entry.get("changes"):,} changes) in {entry.get("seconds"):,.2f} seconds""")
+        return entry
+
+None
+
+# COMMAND ----------
+
+class ChangeFeedBenchmark:
+    """
+    Compares an incremental refresh of a ChangeFeedPropagator with the full recompute it replaces.
+
+      Methods:
+          run(): refreshes the target incrementally, recomputes it in full into {target_table}_full, and returns the report
+          verify(): asserts that both tables hold the same rows
+          display_report(): renders the report as HTML
+          cleanup(): drops the fully recomputed table
+    """
+
+    def __init__(self, propagator):
+        self.propagator = propagator
+        self.full_table = f"{propagator.target_table}_full"
+        self.report = []
+
+
+    def run(self):
+        import time
+
+        entry = self.propagator.refresh()
+
+        start = time.time()
+        source_df = spark.read.option("versionAsOf", entry.get("end_version")).table(self.propagator.source_table)
+        self.propagator.transform(source_df).write.format("delta").mode("overwrite").option("overwriteSchema", True).saveAsTable(self.full_table)
+        full_seconds = time.time() - start
+
+        self.report = [
+            {"refresh": f"""{entry.get("mode")} (CDF)""", "rows_processed": entry.get("changes"), "seconds": entry.get("seconds")},
+            {"refresh": "full recompute", "rows_processed": spark.table(self.full_table).count(), "seconds": full_seconds},
+        ]
+        return self.report
+
+
+    def verify(self):
+        expected, actual = spark.table(self.full_table), spark.table(self.propagator.target_table)
+        differences = expected.exceptAll(actual).count() + actual.exceptAll(expected).count()
+        assert differences == 0, f"Expected {self.propagator.target_table} to match the full recompute, found {differences} differences"
+
+
+    def display_report(self):
+        html = """<table style="width:100%"><tr>"""
+        for key in self.report[0].keys(): html += f"""<th style="text-align:left">{key}</th>"""
+        html += "</tr>"
+        for row in self.report:
+            html += "<tr>"
+            for value in row.values():
+                html += f"""<td>{value:,.2f}</td>""" if type(value) is float else f"""<td>{value}</td>"""
+            html += "</tr>"
+        html += "</table>"
+        displayHTML(html)
+
+
+    def cleanup(self):
+        spark.sql(f"DROP TABLE IF EXISTS {self.full_table}")
+
+None
+
+# COMMAND ----------
+
+@DBAcademyHelper.monkey_patch
+def get_change_propagator(self, source_table, target_table, keys, consumer=None, transform=None):
+    """
+    Returns the ChangeFeedPropagator of a consumer, creating it on first use.
+    """
+    if not hasattr(self, "change_propagators"): self.change_propagators = dict()
+
+    consumer = consumer or target_table
+    if consumer not in self.change_propagators:
+        self.change_propagators[consumer] = ChangeFeedPropagator(source_table, target_table, keys, consumer=consumer, transform=transform)
+    return self.change_propagators[consumer]
+
+
+@DBAcademyHelper.monkey_patch
+def propagate_changes(self, source_table, target_table, keys, consumer=None, transform=None):
+    """
+    Applies the changes of source_table since the consumer's last refresh to target_table.
+
+    Example:
+        DA.propagate_changes("events", "events_propagated", ["user_id", "event_timestamp"])
+
+    See also ChangeFeedPropagator
+
+    :return: the log entry of the refresh
+    """
+    return self.get_change_propagator(source_table, target_table, keys, consumer, transform).refresh()
+
+
+@DBAcademyHelper.monkey_patch
+def benchmark_change_propagation(self, source_table, target_table, keys, consumer=None, transform=None, verify=True):
+    """
+    Refreshes target_table incrementally and compares it with a full recompute of the same version.
+
+    :return: the ChangeFeedBenchmark
+    """
+    benchmark = ChangeFeedBenchmark(self.get_change_propagator(source_table, target_table, keys, consumer, transform))
+    try:
+        benchmark.run()
+        if verify: benchmark.verify()
+        benchmark.display_report()
+    finally:
+        benchmark.cleanup()
+    return benchmark
+
+None
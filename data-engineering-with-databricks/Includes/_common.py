@@ -89,23 +89,133 @@ lesson_config = LessonConfig(name = None,
                              enable_streaming_support = False,
                              enable_ml_support = False)
 
+CLONE_SOURCE_PATH_KEY = "dbacademy.clone.source.path"
+CLONE_SOURCE_VERSION_KEY = "dbacademy.clone.source.version"
+CLONE_OPTION_KEYS = ["delta.enableChangeDataFeed"]
+
+@DBAcademyHelper.monkey_patch
+def get_clone_status(self, table_name, properties):
+    """
+    Compares an existing clone with the expected TBLPROPERTIES, i.e. its source, source version and options.
+
+    :return: ("missing" | "stale" | "current" | "mutated", the version of the clone to RESTORE to if mutated)
+    """
+    if not spark.catalog.tableExists(table_name): return "missing", None
+
+    current = {r.key: r.value for r in spark.sql(f"SHOW TBLPROPERTIES {table_name}").collect()}
+    if any(current.get(key) != value for key, value in properties.items()):
+        return "stale", None
+
+    # Options the clones are made without, e.g. a change data feed enabled by a lesson
+    if any(key not in properties and current.get(key, "false").lower() == "true" for key in CLONE_OPTION_KEYS):
+        return "stale", None
+
+    history = spark.sql(f"DESCRIBE HISTORY {table_name}").select("version", "operation", "operationParameters").collect()
+    clones = [h for h in history if h.operation == "CLONE"]
+    if len(clones) == 0: return "stale", None
+
+    # Unchanged since the clone, or since the last RESTORE to it
+    clone_version = clones[0].version
+    latest = history[0]
+    if latest.version == clone_version: return "current", None
+    if latest.operation == "RESTORE" and (latest.operationParameters or dict()).get("version") == str(clone_version): return "current", None
+
+    return "mutated", clone_version
+
+
 @DBAcademyHelper.monkey_patch
 def clone_source_table(self, table_name, source_path=None, source_name=None):
+    """
+    Shallow clones a Delta table from the datasets, pinned to the source's current version.
+
+    The source's path and version are recorded in the clone's TBLPROPERTIES, so that a clone already in sync
+    is kept as is and a clone mutated by a lesson is brought back with a RESTORE instead of being cloned again.
+    """
     start = dbgems.clock_start()
 
     if source_path is None: source_path = self.paths.datasets
     if source_name is None: source_name = table_name
+    source = f"{source_path}/{source_name}"
+
+    try:
+        source_version = spark.sql(f"DESCRIBE HISTORY delta.`{source}` LIMIT 1").first()["version"]
+        properties = {CLONE_SOURCE_PATH_KEY: source, CLONE_SOURCE_VERSION_KEY: str(source_version)}
+        status, clone_version = self.get_clone_status(table_name, properties)
+    except Exception as e:
+        print(f"WARNING: Unable to read the version of \"{source}\", cloning it unconditionally: {e}")
+        source_version, status, clone_version = None, "missing", None
+
+    if status == "current":
+        print(f"Skipping the clone of the \"{table_name}\" table, already at version {source_version} of \"{source}\"", end="...")
+
+    elif status == "mutated":
+        print(f"Restoring the \"{table_name}\" table to its clone of version {source_version} of \"{source}\"", end="...")
+        spark.sql(f"RESTORE TABLE {table_name} TO VERSION AS OF {clone_version}")
+
+    elif source_version is None:
+        print(f"Cloning the \"{table_name}\" table from \"{source}\".", end="...")
+        spark.sql(f"""
+            CREATE OR REPLACE TABLE {table_name}
+            SHALLOW CLONE delta.`{source}`
+            """)
+
+    else:
+        print(f"Cloning the \"{table_name}\" table from \"{source}\".", end="...")
+        spark.sql(f"""
+            CREATE OR REPLACE TABLE {table_name}
+            SHALLOW CLONE delta.`{source}` VERSION AS OF {source_version}
+            TBLPROPERTIES ({", ".join(f"'{key}' = '{value}'" for key, value in properties.items())})
+            """)
 
-    print(f"Cloning the \"{table_name}\" table from \"{source_path}/{source_name}\".", end="...")
-    
-    spark.sql(f"""
-        CREATE OR REPLACE TABLE {table_name}
-        SHALLOW CLONE delta.`{source_path}/{source_name}`
-        """)
-    
     print(dbgems.clock_stopped(start))
     
 
+@DBAcademyHelper.monkey_patch
+def reset_lesson_keeping_clones(self):
+    """
+    Resets the lesson like reset_lesson(), but keeps the tables of clone_source_table() in the lesson's schema.
+
+    reset_lesson() drops the schema, so that every setup would clone its tables again. Here only the other
+    tables and views are dropped, and the working directory is cleared except for the schema's location,
+    which holds the clones; clone_source_table() then skips or restores them. Without clones, the lesson
+    is reset with reset_lesson().
+    """
+    schema = self.schema_name
+    if not spark.catalog.databaseExists(schema): return self.reset_lesson()
+
+    tables = [t for t in spark.catalog.listTables(schema) if not t.isTemporary]
+    clones = []
+    for t in tables:
+        if t.tableType == "VIEW": continue
+        properties = {r.key: r.value for r in spark.sql(f"SHOW TBLPROPERTIES {schema}.{t.name}").collect()}
+        if CLONE_SOURCE_PATH_KEY in properties: clones.append(t.name)
+
+    if len(clones) == 0: return self.reset_lesson()
+
+    start = dbgems.clock_start()
+    print(f"Resetting the lesson, keeping the {len(clones)} cloned table(s) of the schema \"{schema}\"", end="...")
+
+    for query in spark.streams.active: query.stop()
+
+    for t in tables:
+        if t.name in clones: continue
+        kind = "VIEW" if t.tableType == "VIEW" else "TABLE"
+        spark.sql(f"DROP {kind} IF EXISTS {schema}.{t.name}")
+
+    location = [r for r in spark.sql(f"DESCRIBE SCHEMA EXTENDED {schema}").collect() if r[0] == "Location"]
+    location = location[0][1].replace("dbfs:", "") if len(location) > 0 else None
+
+    working_dir = self.paths.working_dir.replace("dbfs:", "")
+    try: children = dbutils.fs.ls(working_dir)
+    except Exception: children = []
+    for f in children:
+        path = f.path.replace("dbfs:", "").rstrip("/")
+        if location is not None and (location == path or location.startswith(f"{path}/")): continue
+        dbutils.fs.rm(f.path, True)
+
+    print(dbgems.clock_stopped(start))
+
+
 @DBAcademyHelper.monkey_patch
 def display_config_values(self, config_values):
     """
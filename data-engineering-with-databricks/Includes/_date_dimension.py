@@ -0,0 +1,196 @@
+# Databricks notebook source
+# MAGIC %run ./_plan_inspector
+
+# COMMAND ----------
+
+class DateDimension:
+    """
+    Generates a date dimension (one row per day) and a time dimension (one row per second of the day)
+    holding the calendar attributes and formatted strings that DE 0.09 derives from every row.
+
+    Both tables are small enough to broadcast: a year of dates is 365 rows and the time dimension is
+    86,400 rows, so enriching a fact table becomes two broadcast hash joins on integer and date keys
+    instead of calling date_format, year, month, ... on every row.
+
+      Attributes:
+          start_date: first date, e.g. "2020-01-01"
+          end_date: last date, inclusive
+          date_format: pattern of the date_string column, as in DE 0.09
+
+      Methods:
+          get_dates(): the date dimension
+          get_times(): the time dimension
+          save(date_table, time_table): writes both dimensions as Delta tables
+    """
+
+    def __init__(self, start_date, end_date, date_format="MMMM dd, yyyy"):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.date_format = date_format
+
+
+    def get_dates(self):
+        dates = spark.sql(f"SELECT explode(sequence(to_date('{self.start_date}'), to_date('{self.end_date}'), interval 1 day)) AS date")
+        return dates.select("date",
+                            F.year("date").alias("year"),
+                            F.quarter("date").alias("quarter"),
+                            F.month("date").alias("month"),
+                            F.dayofmonth("date").alias("dayofmonth"),
+                            F.dayofweek("date").alias("dayofweek"),
+                            F.weekofyear("date").alias("weekofyear"),
+                            F.date_format("date", "MMMM").alias("month_name"),
+                            F.date_format("date", "EEEE").alias("day_name"),
+                            F.dayofweek("date").isin(1, 7).alias("is_weekend"),
+                            F.date_format("date", self.date_format).alias("date_string"))
+
+
+    def get_times(self):
+        """
+        The time_string column is HH:mm:ss; enrich_with_dimensions appends the microseconds of each row.
+        """
+        seconds = spark.range(24 * 60 * 60).select(F.col("id").cast("int").alias("second_of_day"))
+        times = seconds.select("second_of_day",
+                               (F.col("second_of_day") / 3600).cast("int").alias("hour"),
+                               ((F.col("second_of_day") % 3600) / 60).cast("int").alias("minute"),
+                               (F.col("second_of_day") % 60).alias("second"))
+        return times.withColumn("time_string", F.format_string("%02d:%02d:%02d", "hour", "minute", "second"))
+
+
+    def save(self, date_table, time_table):
+        self.get_dates().write.format("delta").mode("overwrite").saveAsTable(date_table)
+        self.get_times().write.format("delta").mode("overwrite").saveAsTable(time_table)
+
+None
+
+# COMMAND ----------
+
+def convert_timestamps(df, column="event_timestamp", timestamp_column="timestamp"):
+    """
+    Converts a microseconds-since-epoch column once, at ingest, to the columns the dimensions join on.
+
+    timestamp_micros is exact, whereas (column / 1e6).cast("timestamp") goes through a double.
+
+    :return: df with timestamp_column, date, second_of_day and micros (the microseconds within the second)
+    """
+    timestamp = F.col(timestamp_column)
+    return (df.withColumn(timestamp_column, F.expr(f"timestamp_micros({column})"))
+              .withColumn("date", F.to_date(timestamp))
+              .withColumn("second_of_day", (F.hour(timestamp) * 3600 + F.minute(timestamp) * 60 + F.second(timestamp)).cast("int"))
+              .withColumn("micros", (F.col(column) % 1000000).cast("int")))
+
+
+def enrich_with_dimensions(df, dates, times, date_columns=None, time_columns=None):
+    """
+    Adds calendar attributes with broadcast joins on the columns added by convert_timestamps.
+
+    :param dates: the date dimension, e.g. DateDimension(...).get_dates() or spark.table("dim_date")
+    :param times: the time dimension
+    :param date_columns: columns of the date dimension to add, all by default
+    :param time_columns: columns of the time dimension to add, all by default; time_string gets the microseconds appended
+    """
+    date_columns = date_columns or [c for c in dates.columns if c != "date"]
+    time_columns = time_columns or [c for c in times.columns if c != "second_of_day"]
+
+    enriched = (df.join(F.broadcast(dates.select("date", *date_columns)), "date", "left")
+                  .join(F.broadcast(times.select("second_of_day", *time_columns)), "second_of_day", "left"))
+
+    if "time_string" in time_columns:
+        enriched = enriched.withColumn("time_string", F.concat("time_string", F.lit("."), F.lpad(F.col("micros").cast("string"), 6, "0")))
+    return enriched
+
+None
+
+# COMMAND ----------
+
+class DateDimensionBenchmark:
+    """
+    Compares DE 0.09's per-row conversion and formatting with the dimension join on the events table.
+
+      Methods:
+          get_variants(): {"per_row": df, "dimension_join": df} selecting the same columns
+          verify(): asserts both variants return the same rows
+          run(): measures both variants with PlanComparison and returns the report
+    """
+
+    COLUMNS = ["user_id", "timestamp", "date_string", "time_string", "year", "month", "dayofweek", "minute", "second"]
+
+    def __init__(self, df, timestamped_df, dates, times):
+        self.df = df
+        self.timestamped_df = timestamped_df
+        self.dates = dates
+        self.times = times
+        self.comparison = None
+
+
+    def get_variants(self):
+        timestamp = (F.col("event_timestamp") / 1e6).cast("timestamp")
+        per_row = (self.df
+                   .withColumn("timestamp", timestamp)
+                   .withColumn("date_string", F.date_format("timestamp", "MMMM dd, yyyy"))
+                   .withColumn("time_string", F.date_format("timestamp", "HH:mm:ss.SSSSSS"))
+                   .withColumn("year", F.year("timestamp"))
+                   .withColumn("month", F.month("timestamp"))
+                   .withColumn("dayofweek", F.dayofweek("timestamp"))
+                   .withColumn("minute", F.minute("timestamp"))
+                   .withColumn("second", F.second("timestamp"))
+                   .select(*DateDimensionBenchmark.COLUMNS))
+
+        dimension_join = (enrich_with_dimensions(self.timestamped_df, self.dates, self.times,
+                                                 date_columns=["date_string", "year", "month", "dayofweek"],
+                                                 time_columns=["time_string", "minute", "second"])
+                          .select(*DateDimensionBenchmark.COLUMNS))
+
+        return {"per_row": per_row, "dimension_join": dimension_join}
+
+
+    def verify(self):
+        variants = self.get_variants()
+        # The double division of the per-row variant can be off by a microsecond, so compare to the second
+        columns = [c for c in DateDimensionBenchmark.COLUMNS if c not in ["timestamp", "time_string"]]
+        expected, actual = variants["per_row"].select(*columns), variants["dimension_join"].select(*columns)
+        differences = expected.exceptAll(actual).count() + actual.exceptAll(expected).count()
+        assert differences == 0, f"Expected the dimension join to return the same rows, found {differences} differences"
+
+
+    def run(self):
+        self.comparison = PlanComparison(self.get_variants())
+        self.comparison.run(measure=True)
+        self.comparison.display_report()
+        return self.comparison.get_report()
+
+None
+
+# COMMAND ----------
+
+@DBAcademyHelper.monkey_patch
+def create_date_dimensions(self, source_table="events", target_table="events_timestamped", date_table="dim_date", time_table="dim_time"):
+    """
+    Converts the source's event_timestamp once into target_table and writes date and time dimensions
+    covering every date of the source.
+
+    :return: the DateDimension
+    """
+    timestamped_df = convert_timestamps(spark.table(source_table))
+    timestamped_df.write.format("delta").mode("overwrite").saveAsTable(target_table)
+
+    bounds = spark.table(target_table).agg(F.min("date").alias("start"), F.max("date").alias("end")).first()
+    dimension = DateDimension(bounds["start"], bounds["end"])
+    dimension.save(date_table, time_table)
+    return dimension
+
+
+@DBAcademyHelper.monkey_patch
+def benchmark_date_dimensions(self, source_table="events", target_table="events_timestamped", date_table="dim_date", time_table="dim_time", verify=True):
+    """
+    Benchmarks per-row datetime formatting against the dimension joins, creating the tables if needed.
+
+    :return: the DateDimensionBenchmark
+    """
+    if not spark.catalog.tableExists(target_table): self.create_date_dimensions(source_table, target_table, date_table, time_table)
+
+    benchmark = DateDimensionBenchmark(spark.table(source_table), spark.table(target_table), spark.table(date_table), spark.table(time_table))
+    if verify: benchmark.verify()
+    benchmark.run()
+    return benchmark
+
+None
@@ -0,0 +1,244 @@
+# Databricks notebook source
+class GrantsReconciler:
+    """
+    Brings the grants of catalogs, schemas and tables in line with a declarative policy, issuing only the
+    GRANT and REVOKE statements needed instead of every statement of the policy.
+
+    The current grants are read with SHOW GRANTS, concurrently per securable, and diffed against the
+    policy per securable and principal: privileges missing are granted and privileges not in the policy
+    are revoked, each set with a single statement, e.g. GRANT SELECT, MODIFY ON TABLE t TO `analysts`.
+    The statements of different securables are independent and are issued concurrently, so a policy over
+    hundreds of tables costs a few rounds of statements; re-applying an unchanged policy only reads grants.
+
+    Only the principals named by the policy for a securable are managed, unless exclusive is set: then
+    the privileges of every other principal are revoked too, except ownership. A policy key can also be
+    "TABLES IN SCHEMA s", which applies the same grants to each table and view of the schema.
+
+    Example policy:
+        {"SCHEMA gold": {ANALYSTS_ROLE_NAME: ["USAGE"]},
+         "TABLES IN SCHEMA gold": {ANALYSTS_ROLE_NAME: ["SELECT"]},
+         "TABLE silver.heartrate_device": {ANALYSTS_ROLE_NAME: []}}
+
+      Attributes:
+          policy: {securable: {principal: privileges}}, where a securable is e.g. "TABLE silver.heartrate_device"
+          catalog: catalog qualifying the names of the policy that have none (optional)
+          exclusive: also revoke the privileges of the principals not in the policy
+          max_concurrency: maximum number of statements issued at once
+          report: list of dictionaries, one per statement, filled by apply()
+
+      Methods:
+          get_desired(): {(kind, name): {principal: privileges}} of the expanded policy
+          get_current(securables): {(kind, name): {principal: privileges}} read with SHOW GRANTS
+          diff(): the minimal GRANT and REVOKE statements, grouped per securable
+          apply(dry_run=False): issues the statements and returns the report
+          display_report(): renders the report as HTML
+    """
+
+    KIND_PARTS = {"CATALOG": 1, "SCHEMA": 2, "DATABASE": 2, "TABLE": 3, "VIEW": 3}
+    OBJECT_TYPES = {"CATALOG": "CATALOG", "SCHEMA": "SCHEMA", "DATABASE": "SCHEMA", "TABLE": "TABLE", "VIEW": "TABLE"}
+    OWNERSHIP_PRIVILEGES = ["OWN", "OWNERSHIP"]
+
+    def __init__(self, policy, catalog=None, exclusive=False, max_concurrency=16):
+        self.policy = policy
+        self.catalog = catalog
+        self.exclusive = exclusive
+        self.max_concurrency = max_concurrency
+        self.report = []
+
+
+    @staticmethod
+    def normalize_privilege(privilege):
+        return " ".join(privilege.upper().replace("_", " ").split())
+
+
+    @staticmethod
+    def normalize_name(name):
+        return name.replace("`", "").lower()
+
+
+    def qualify(self, name, parts):
+        if self.catalog is None or len(name.split(".")) >= parts: return name
+        return f"{self.catalog}.{name}"
+
+
+    def get_schema_tables(self, schema):
+        return [f"{schema}.{r.tableName}" for r in spark.sql(f"SHOW TABLES IN {schema}").collect() if not r.isTemporary]
+
+
+    def get_desired(self):
+        """
+        Expands "TABLES IN SCHEMA s" and qualifies the names; a securable given twice gets the union of its grants.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        entries = []
+        for securable, grants in self.policy.items():
+            if securable.upper().startswith("TABLES IN SCHEMA "):
+                entries.append(("TABLES", self.qualify(securable.split(" ", 3)[3], 2), grants))
+            else:
+                kind, name = securable.split(" ", 1)
+                kind = "SCHEMA" if kind.upper() == "DATABASE" else kind.upper()
+                assert kind in GrantsReconciler.KIND_PARTS, f"Expected a securable of the kinds {list(GrantsReconciler.KIND_PARTS)}, found \"{securable}\""
+                entries.append((kind, self.qualify(name, GrantsReconciler.KIND_PARTS[kind]), grants))
+
+        # Listing the tables of several schemas is independent too
+        schemas = sorted({name for (kind, name, grants) in entries if kind == "TABLES"})
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            tables = dict(zip(schemas, executor.map(self.get_schema_tables, schemas)))
+
+        desired = dict()
+        for kind, name, grants in entries:
+            securables = [("TABLE", t) for t in tables[name]] if kind == "TABLES" else [(kind, name)]
+            for securable in securables:
+                principals = desired.setdefault(securable, dict())
+                for principal, privileges in grants.items():
+                    principals.setdefault(principal, set()).update(GrantsReconciler.normalize_privilege(p) for p in privileges)
+        return desired
+
+
+    def get_grants(self, securable):
+        """
+        Reads the grants given on the securable itself, leaving out those inherited from its catalog or schema.
+        """
+        kind, name = securable
+        key = GrantsReconciler.normalize_name(name)
+
+        grants = dict()
+        for r in spark.sql(f"SHOW GRANTS ON {kind} {name}").collect():
+            # The column names differ between Unity Catalog and the Hive metastore, e.g. ActionType and action_type
+            row = {k.lower().replace("_", ""): v for k, v in r.asDict().items()}
+            object_type = GrantsReconciler.OBJECT_TYPES.get((row.get("objecttype") or kind).upper(), kind)
+            if object_type != GrantsReconciler.OBJECT_TYPES.get(kind, kind): continue
+            object_key = GrantsReconciler.normalize_name(row.get("objectkey") or name)
+            if object_key != key and not object_key.endswith(f".{key}"): continue
+
+            privilege = GrantsReconciler.normalize_privilege(row.get("actiontype"))
+            grants.setdefault(row.get("principal"), set()).add(privilege)
+        return grants
+
+
+    def get_current(self, securables):
+        from concurrent.futures import ThreadPoolExecutor
+
+        securables = list(securables)
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            return dict(zip(securables, executor.map(self.get_grants, securables)))
+
+
+    def diff(self, desired=None, current=None):
+        """
+        :return: {(kind, name): [(action, principal, privileges)]}, the REVOKEs of a securable before its GRANTs
+        """
+        desired = self.get_desired() if desired is None else desired
+        current = self.get_current(desired.keys()) if current is None else current
+
+        statements = dict()
+        for securable, principals in desired.items():
+            granted = current.get(securable, dict())
+            managed = set(granted.keys()) if self.exclusive else set()
+            managed.update(principals.keys())
+
+            revokes, grants = [], []
+            for principal in sorted(managed):
+                wanted = principals.get(principal, set())
+                have = {p for p in granted.get(principal, set()) if p not in GrantsReconciler.OWNERSHIP_PRIVILEGES}
+                if len(have - wanted) > 0: revokes.append(("REVOKE", principal, sorted(have - wanted)))
+                if len(wanted - have) > 0: grants.append(("GRANT", principal, sorted(wanted - have)))
+
+            if len(revokes) + len(grants) > 0: statements[securable] = revokes + grants
+        return statements
+
+
+    @staticmethod
+    def to_sql(securable, action, principal, privileges):
+        kind, name = securable
+        direction = "TO" if action == "GRANT" else "FROM"
+        return f"""{action} {", ".join(privileges)} ON {kind} {name} {direction} `{principal}`"""
+
+
+    def apply_securable(self, securable, statements, dry_run):
+        """
+        Issues the statements of one securable in order; a failure is reported instead of raised.
+        """
+        import time
+
+        results = []
+        for action, principal, privileges in statements:
+            statement = GrantsReconciler.to_sql(securable, action, principal, privileges)
+            start = time.time()
+            status, error = "planned", None
+            if not dry_run:
+                try:
+                    spark.sql(statement)
+                    status = "applied"
+                except Exception as e:
+                    status, error = "failed", str(e)[:1000]
+            results.append({"securable": f"{securable[0]} {securable[1]}", "principal": principal, "action": action,
+                            "privileges": ", ".join(privileges), "status": status, "error": error, "seconds": time.time() - start})
+        return results
+
+
+    def apply(self, dry_run=False):
+        """
+        Reads the current grants and issues the minimal GRANT and REVOKE statements, or only plans them if dry_run.
+
+        :return: the report, one dictionary per statement
+        """
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+
+        start = time.time()
+        desired = self.get_desired()
+        current = self.get_current(desired.keys())
+        read_seconds = time.time() - start
+
+        statements = self.diff(desired, current)
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            results = executor.map(lambda s: self.apply_securable(s, statements[s], dry_run), statements.keys())
+            self.report = [r for securable in results for r in securable]
+
+        failed = len([r for r in self.report if r.get("status") == "failed"])
+        verb = "planned" if dry_run else "issued"
+        print(f"Read the grants of {len(desired):,} securable(s) in {read_seconds:,.2f} seconds; {verb} {len(self.report):,} statement(s) on {len(statements):,} securable(s), {failed:,} failed, in {time.time() - start:,.2f} seconds")
+        return self.report
+
+
+    def display_report(self):
+        if len(self.report) == 0:
+            print("The grants already match the policy.")
+            return
+
+        html = """<table style="width:100%"><tr>"""
+        for key in self.report[0].keys(): html += f"""<th style="text-align:left">{key}</th>"""
+        html += "</tr>"
+        for row in self.report:
+            html += "<tr>"
+            for value in row.values():
+                html += f"""<td>{value:,.2f}</td>""" if type(value) is float else f"""<td>{value}</td>"""
+            html += "</tr>"
+        html += "</table>"
+        displayHTML(html)
+
+None
+
+# COMMAND ----------
+
+@DBAcademyHelper.monkey_patch
+def reconcile_grants(self, policy, catalog=None, exclusive=False, dry_run=False, max_concurrency=16):
+    """
+    Issues the GRANT and REVOKE statements needed for the grants of the securables to match the policy.
+
+    Example:
+        DA.reconcile_grants({"TABLES IN SCHEMA gold": {ANALYSTS_ROLE_NAME: ["SELECT"]}}, catalog=DA.catalog_name, dry_run=True)
+
+    See also GrantsReconciler
+
+    :param dry_run: only reports the statements, without issuing them
+    :return: the GrantsReconciler, whose report lists the statements
+    """
+    reconciler = GrantsReconciler(policy, catalog=catalog, exclusive=exclusive, max_concurrency=max_concurrency)
+    reconciler.apply(dry_run=dry_run)
+    reconciler.display_report()
+    return reconciler
+
+None
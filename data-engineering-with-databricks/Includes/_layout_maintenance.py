@@ -0,0 +1,316 @@
+# Databricks notebook source
+# MAGIC %run ./_plan_inspector
+
+# COMMAND ----------
+
+import re
+
+class TableLayout:
+    """
+    The file layout of one Delta table: the file count and size of DESCRIBE DETAIL plus the size of every data file.
+
+      Attributes:
+          table_name: the Delta table
+          small_file_bytes: files smaller than this count as small
+
+      Methods:
+          get_detail(): the single row of DESCRIBE DETAIL, as a dictionary
+          get_file_sizes(location): sizes in bytes of the data files of the current version, read from the Delta log
+          get_stats(): files, bytes, small files and small-file ratio
+    """
+
+    def __init__(self, table_name, small_file_bytes=32*1024*1024):
+        self.table_name = table_name
+        self.small_file_bytes = small_file_bytes
+
+
+    def get_detail(self):
+        return spark.sql(f"DESCRIBE DETAIL {self.table_name}").first().asDict()
+
+
+    def get_file_sizes(self, location):
+        """
+        Reads the add and remove actions of the last checkpoint and of the commits since, instead of the table's rows:
+        a file is part of the current version if its latest action is an add. Within a commit, e.g. one updating a
+        deletion vector, the add of a path follows its remove.
+        """
+        log_dir = f"{location}/_delta_log"
+        log_files = dbutils.fs.ls(log_dir)
+
+        checkpoints = [int(f.name.split(".")[0]) for f in log_files if ".checkpoint." in f.name and f.name.endswith(".parquet")]
+        checkpoint_version = max(checkpoints) if len(checkpoints) > 0 else -1
+        commits = [f.path for f in log_files if re.fullmatch(r"\d{20}\.json", f.name) and int(f.name[:20]) > checkpoint_version]
+
+        logs = []
+        if checkpoint_version >= 0:
+            logs.append(spark.read.parquet(f"{log_dir}/{checkpoint_version:020d}.checkpoint*.parquet").withColumn("version", F.lit(checkpoint_version).cast("long")))
+        if len(commits) > 0:
+            logs.append(spark.read.json(commits).withColumn("version", F.regexp_extract(F.input_file_name(), r"(\d{20})\.json", 1).cast("long")))
+
+        # Without any add or remove action, the inferred schema of the commits has no such column
+        actions = [log.where(f"{kind} IS NOT NULL").select(F.col(f"{kind}.path").alias("path"), F.col(f"{kind}.size").alias("size"),
+                                                           "version", F.lit(kind == "add").alias("is_add"))
+                   for log in logs for kind in ["add", "remove"] if kind in log.columns]
+        if len(actions) == 0: return []
+
+        union = actions[0]
+        for a in actions[1:]: union = union.unionByName(a)
+
+        latest = union.groupBy("path").agg(F.max(F.struct("version", "is_add", "size")).alias("latest"))
+        return [r.size for r in latest.where("latest.is_add").select("latest.size").collect()]
+
+
+    def get_stats(self):
+        detail = self.get_detail()
+        files = detail.get("numFiles") or 0
+        size = detail.get("sizeInBytes") or 0
+
+        sizes = self.get_file_sizes(detail.get("location")) if files > 0 else []
+        small_files = len([s for s in sizes if s < self.small_file_bytes])
+
+        return {
+            "table": self.table_name,
+            "files": files,
+            "bytes": size,
+            "avg_file_bytes": size / files if files > 0 else 0.0,
+            "small_files": small_files,
+            "small_file_ratio": small_files / files if files > 0 else 0.0,
+            "partition_columns": list(detail.get("partitionColumns") or []),
+        }
+
+None
+
+# COMMAND ----------
+
+class LayoutMaintenanceScheduler:
+    """
+    Picks the Delta tables whose layout needs maintenance and runs OPTIMIZE, with ZORDER BY the columns
+    their queries filter on, a few tables at a time.
+
+    Candidates are the tables with at least min_files files of which at least min_small_file_ratio are small.
+    The ZORDER columns are the non-partition columns found most often in the data filters of the queries
+    recorded with record_query(); they also rank the candidates, so that the tables that are queried are optimized first.
+
+    The scan time is measured before and after, sequentially, on the recorded queries of each table, or on
+    a full scan if there are none; only the OPTIMIZE statements run concurrently, up to max_concurrency at once.
+
+      Attributes:
+          tables: names of the tables to maintain
+          small_file_bytes: files smaller than this count as small
+          min_files: tables with fewer files are never candidates
+          min_small_file_ratio: fraction of small files that makes a table a candidate
+          max_zorder_columns: maximum number of ZORDER BY columns
+          max_concurrency: maximum number of concurrent OPTIMIZE statements
+          log: list of dictionaries, one per table optimized by run()
+
+      Methods:
+          add_table(table_name): adds a table to maintain
+          record_query(df): records the filter columns of a query against the maintained tables
+          get_zorder_columns(table_name): the columns to ZORDER the table by
+          get_candidates(): the statistics of the tables to optimize, in order
+          run(dry_run=False): optimizes the candidates and returns the new log entries
+          save_log(table_name): appends the log to a Delta table
+          display_report(): renders the log as HTML
+    """
+
+    IDENTIFIER_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+    def __init__(self, tables=None, small_file_bytes=32*1024*1024, min_files=2, min_small_file_ratio=0.5, max_zorder_columns=2, max_concurrency=2):
+        self.tables = []
+        self.small_file_bytes = small_file_bytes
+        self.min_files = min_files
+        self.min_small_file_ratio = min_small_file_ratio
+        self.max_zorder_columns = max_zorder_columns
+        self.max_concurrency = max_concurrency
+        self.predicates = dict()
+        self.queries = dict()
+        self.log = []
+
+        for table_name in tables or []: self.add_table(table_name)
+
+
+    def add_table(self, table_name):
+        if table_name not in self.tables:
+            self.tables.append(table_name)
+            self.predicates[table_name] = dict()
+            self.queries[table_name] = []
+
+
+    def get_scanned_table(self, scan):
+        """
+        Returns the maintained table read by a scan node, e.g. "FileScan parquet spark_catalog.db.students[id,name] ...", or None.
+        """
+        for token in scan.details.split(" ")[:3]:
+            name = token.split("[")[0].strip("`").lower()
+            for table_name in self.tables:
+                if name == table_name.lower() or name.endswith(f".{table_name.lower()}"): return table_name
+        return None
+
+
+    def record_query(self, df, name=None):
+        """
+        Counts the columns of every maintained table that the query's scans filter on.
+
+        :return: {table_name: [columns]} found in this query
+        """
+        found = dict()
+        for scan in PlanInspector(df, name).get_scans():
+            table_name = self.get_scanned_table(scan)
+            if table_name is None: continue
+
+            columns = {c.lower(): c for c in spark.table(table_name).columns}
+            filters = " ".join(scan.get_list("DataFilters") or []) + " " + " ".join(scan.get_list("PartitionFilters") or [])
+            filtered = sorted({columns[i.lower()] for i in LayoutMaintenanceScheduler.IDENTIFIER_PATTERN.findall(filters) if i.lower() in columns})
+
+            for column in filtered:
+                self.predicates[table_name][column] = self.predicates[table_name].get(column, 0) + 1
+            self.queries[table_name].append(df)
+            found[table_name] = filtered
+
+        return found
+
+
+    def get_zorder_columns(self, table_name, partition_columns=None):
+        # Data is already clustered by the partition columns, and OPTIMIZE does not allow to ZORDER by them
+        partition_columns = [c.lower() for c in partition_columns or []]
+        counts = [(count, column) for column, count in self.predicates[table_name].items() if column.lower() not in partition_columns]
+        return [column for count, column in sorted(counts, key=lambda c: (-c[0], c[1]))][:self.max_zorder_columns]
+
+
+    def get_candidates(self):
+        candidates = []
+        for table_name in self.tables:
+            stats = TableLayout(table_name, self.small_file_bytes).get_stats()
+            stats["queries"] = sum(self.predicates[table_name].values())
+            stats["zorder_by"] = self.get_zorder_columns(table_name, stats.get("partition_columns"))
+
+            if stats.get("files") >= self.min_files and stats.get("small_file_ratio") >= self.min_small_file_ratio:
+                candidates.append(stats)
+
+        return sorted(candidates, key=lambda s: (-s.get("queries"), -s.get("small_files")))
+
+
+    def measure_scan(self, table_name):
+        """
+        :return: the total seconds of running the recorded queries of the table, or of a full scan of it
+        """
+        queries = self.queries[table_name] or [spark.table(table_name)]
+        return sum(PlanInspector(df, table_name).measure().get("seconds") for df in queries)
+
+
+    @staticmethod
+    def optimize(table_name, zorder_by):
+        import time
+
+        statement = f"OPTIMIZE {table_name}"
+        if len(zorder_by) > 0: statement += f""" ZORDER BY ({", ".join(zorder_by)})"""
+
+        start = time.time()
+        metrics = spark.sql(statement).first()["metrics"]
+        return statement, time.time() - start, metrics
+
+
+    def run(self, dry_run=False):
+        """
+        Optimizes every candidate and logs its files, small-file ratio and scan time before and after.
+
+        :param dry_run: if True, only returns the candidates and the statements that would run
+        :return: the log entries of this run
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        candidates = self.get_candidates()
+        if dry_run:
+            for stats in candidates:
+                print(f"""Would run OPTIMIZE {stats.get("table")} ZORDER BY {stats.get("zorder_by")} ({stats.get("small_files")} of {stats.get("files")} files are small)""")
+            return candidates
+
+        scan_seconds_before = {s.get("table"): self.measure_scan(s.get("table")) for s in candidates}
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            results = list(executor.map(lambda s: LayoutMaintenanceScheduler.optimize(s.get("table"), s.get("zorder_by")), candidates))
+
+        entries = []
+        for stats, (statement, seconds, metrics) in zip(candidates, results):
+            table_name = stats.get("table")
+            after = TableLayout(table_name, self.small_file_bytes).get_stats()
+            scan_seconds_after = self.measure_scan(table_name)
+
+            entries.append({
+                "table": table_name,
+                "statement": statement,
+                "files_before": stats.get("files"),
+                "files_after": after.get("files"),
+                "small_file_ratio_before": stats.get("small_file_ratio"),
+                "small_file_ratio_after": after.get("small_file_ratio"),
+                "files_removed": metrics["numFilesRemoved"] if metrics is not None else None,
+                "files_added": metrics["numFilesAdded"] if metrics is not None else None,
+                "optimize_seconds": seconds,
+                "scan_seconds_before": scan_seconds_before.get(table_name),
+                "scan_seconds_after": scan_seconds_after,
+                "scan_improvement": 1 - scan_seconds_after / scan_seconds_before.get(table_name) if scan_seconds_before.get(table_name) else None,
+            })
+
+        self.log.extend(entries)
+        print(f"Optimized {len(entries)} of {len(self.tables)} table(s)")
+        return entries
+
+
+    def save_log(self, table_name):
+        import time
+
+        if len(self.log) == 0: return
+        rows = [dict(e, logged_at=int(time.time())) for e in self.log]
+        spark.createDataFrame(rows).write.format("delta").mode("append").option("mergeSchema", True).saveAsTable(table_name)
+
+
+    def display_report(self):
+        if len(self.log) == 0:
+            print("No tables were optimized; call run() first.")
+            return
+        displayHTML(PlanComparison.to_html(self.log))
+
+None
+
+# COMMAND ----------
+
+@DBAcademyHelper.monkey_patch
+def get_layout_scheduler(self, **options):
+    """
+    Returns the LayoutMaintenanceScheduler of this lesson, creating it on first use.
+
+    :param options: constructor arguments of LayoutMaintenanceScheduler, applied on creation only
+    """
+    if not hasattr(self, "layout_scheduler"): self.layout_scheduler = LayoutMaintenanceScheduler(**options)
+    return self.layout_scheduler
+
+
+@DBAcademyHelper.monkey_patch
+def maintain_table_layout(self, *table_names, queries=None, dry_run=False, log_table=None):
+    """
+    Optimizes the tables that accumulated small files, e.g. those written by a StreamFactory or cloned with clone_source_table.
+
+    Example:
+        DA.maintain_table_layout("students", queries=[spark.table("students").filter("id = 7")])
+
+    See also LayoutMaintenanceScheduler
+
+    :param table_names: the tables to maintain, added to those of get_layout_scheduler()
+    :param queries: DataFrames whose filter columns select the ZORDER BY columns (optional)
+    :param dry_run: if True, only prints the statements that would run
+    :param log_table: Delta table the log is appended to (optional)
+    :return: the LayoutMaintenanceScheduler
+    """
+    scheduler = self.get_layout_scheduler()
+    for table_name in table_names: scheduler.add_table(table_name)
+    assert len(scheduler.tables) > 0, "Expected at least one table to maintain"
+
+    for df in queries or []: scheduler.record_query(df)
+
+    scheduler.run(dry_run=dry_run)
+    if not dry_run:
+        if log_table is not None: scheduler.save_log(log_table)
+        scheduler.display_report()
+    return scheduler
+
+None
@@ -0,0 +1,241 @@
+# Databricks notebook source
+class SchemaCache:
+    """
+    Persists inferred schemas as DDL so that only the first read of a dataset pays for schema inference.
+
+    Reading CSV with inferSchema, or JSON without a schema, makes Spark scan the data once just to infer
+    the schema before the query itself reads it again. Entries are keyed by format, path and options, and
+    store a fingerprint of the file listing (names, sizes and modification times); when any file changes,
+    the schema is inferred again.
+
+    Lesson setups copy some datasets into the working directory on every run, which gives the copies
+    new modification times; register_copy() makes the fingerprint of such a copy that of its source.
+
+      Attributes:
+          cache_dir: directory holding one JSON file per entry, kept across sessions
+          entries: in-memory copy of the entries read or written by this session
+          sources: {path: source_path} of the registered copies
+          reads: list of dictionaries, one per read(), reported by get_report()
+
+      Methods:
+          register_copy(path, source_path): fingerprints path by the listing of source_path
+          read(format, path, **options): returns a DataFrame read with the cached (or newly inferred) schema
+          get_schema(format, path, **options): returns the DDL schema
+          get_report(): hits, misses and time saved per read
+          display_report(): renders get_report() as HTML
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.entries = dict()
+        self.sources = dict()
+        self.reads = []
+
+
+    @staticmethod
+    def list_files(path):
+        """
+        Lists the data files under path recursively, skipping the hidden files Spark ignores too, e.g. _SUCCESS.
+        """
+        files = []
+        for f in dbutils.fs.ls(path):
+            if f.name.startswith("_") or f.name.startswith("."): continue
+            if f.isDir(): files.extend(SchemaCache.list_files(f.path))
+            else: files.append(f)
+        return files
+
+
+    @staticmethod
+    def get_fingerprint(path):
+        import hashlib
+
+        # Paths relative to the listed directory, so that the fingerprint does not depend on where it is
+        root = path.replace("dbfs:", "").rstrip("/")
+        relative = lambda f: f.path.replace("dbfs:", "").split(f"{root}/", 1)[-1]
+        listing = sorted(f"{relative(f)}|{f.size}|{getattr(f, 'modificationTime', 0)}" for f in SchemaCache.list_files(path))
+        return hashlib.md5("\n".join(listing).encode("utf-8")).hexdigest()
+
+
+    def register_copy(self, path, source_path):
+        """
+        Declares path a copy of source_path, e.g. a dataset copied into the working directory by a lesson setup.
+        """
+        self.sources[path] = source_path
+
+
+    @staticmethod
+    def normalize_options(options):
+        # inferSchema only controls how the schema is obtained; it does not change the schema's key
+        return {k: str(v).lower() if type(v) is bool else str(v) for k, v in sorted(options.items()) if k != "inferSchema"}
+
+
+    @staticmethod
+    def get_key(format, path, options):
+        import hashlib, json
+        text = json.dumps({"format": format, "path": path, "options": options}, sort_keys=True)
+        return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+    def load_entry(self, key):
+        import json
+
+        if key not in self.entries:
+            try:
+                self.entries[key] = json.loads(dbutils.fs.head(f"{self.cache_dir}/{key}.json", 1024*1024))
+            except Exception:
+                return None  # Not cached yet
+        return self.entries[key]
+
+
+    def save_entry(self, key, entry):
+        import json
+
+        self.entries[key] = entry
+        dbutils.fs.put(f"{self.cache_dir}/{key}.json", json.dumps(entry), True)
+
+
+    def infer(self, format, path, options):
+        """
+        Infers the schema with a full pass over the data.
+
+        :return: (DDL schema, seconds spent inferring)
+        """
+        import time
+
+        start = time.time()
+        df = spark.read.format(format).options(**options).option("inferSchema", True).load(path)
+        return df._jdf.schema().toDDL(), time.time() - start
+
+
+    def get_schema(self, format, path, **options):
+        """
+        Returns the cached DDL schema if the file listing is unchanged, otherwise infers and persists it.
+
+        :return: (DDL schema, the cache entry, True if it was a cache hit)
+        """
+        import time
+
+        options = SchemaCache.normalize_options(options)
+        key = SchemaCache.get_key(format, path, options)
+        fingerprint = SchemaCache.get_fingerprint(self.sources.get(path, path))
+        entry = self.load_entry(key)
+
+        if entry is not None and entry.get("fingerprint") == fingerprint:
+            return entry.get("ddl"), entry, True
+
+        ddl, seconds = self.infer(format, path, options)
+        entry = {
+            "format": format,
+            "path": path,
+            "options": options,
+            "fingerprint": fingerprint,
+            "ddl": ddl,
+            "inference_seconds": seconds,
+            "inferred_at": int(time.time()),
+        }
+        self.save_entry(key, entry)
+        return ddl, entry, False
+
+
+    def read(self, format, path, **options):
+        """
+        Reads path with the cached schema, e.g. read("csv", DA.paths.users_csv, sep="\\t", header=True).
+
+        On a hit, the time saved is the recorded inference time minus the time to resolve the read with the schema.
+        """
+        import time
+
+        start = time.time()
+        ddl, entry, hit = self.get_schema(format, path, **options)
+
+        options = SchemaCache.normalize_options(options)
+        df = spark.read.format(format).options(**options).schema(ddl).load(path)
+        elapsed = time.time() - start
+
+        self.reads.append({
+            "format": format,
+            "path": path,
+            "hit": hit,
+            "seconds": elapsed,
+            "inference_seconds": entry.get("inference_seconds"),
+            "saved_seconds": max(0.0, entry.get("inference_seconds") - elapsed) if hit else 0.0,
+        })
+        return df
+
+
+    def get_report(self):
+        """
+        :return: list of dictionaries with the reads, hits and total seconds saved per path
+        """
+        paths = dict()
+        for r in self.reads:
+            paths.setdefault((r.get("format"), r.get("path")), []).append(r)
+
+        report = []
+        for (format, path), reads in paths.items():
+            report.append({
+                "format": format,
+                "path": path,
+                "reads": len(reads),
+                "hits": len([r for r in reads if r.get("hit")]),
+                "inference_seconds": reads[-1].get("inference_seconds"),
+                "saved_seconds": sum(r.get("saved_seconds") for r in reads),
+            })
+        return report
+
+
+    def display_report(self):
+        report = self.get_report()
+        if len(report) == 0:
+            print("No reads to report; call read() first.")
+            return
+
+        html = """<table style="width:100%"><tr>"""
+        for key in report[0].keys(): html += f"""<th style="text-align:left">{key}</th>"""
+        html += "</tr>"
+        for row in report:
+            html += "<tr>"
+            for value in row.values():
+                html += f"""<td>{value:,.2f}</td>""" if type(value) is float else f"""<td>{value}</td>"""
+            html += "</tr>"
+        html += "</table>"
+        displayHTML(html)
+
+None
+
+# COMMAND ----------
+
+@DBAcademyHelper.monkey_patch
+def get_schema_cache(self, cache_dir=None):
+    """
+    Returns the SchemaCache, creating it on first use.
+
+    The default cache_dir is next to the lesson's working directory rather than in it, as reset_lesson()
+    deletes the working directory and with it every schema inferred by earlier sessions.
+
+    :param cache_dir: overrides the schema_cache directory of the user's course directory (optional)
+    """
+    if cache_dir is None:
+        working_dir = self.paths.working_dir.rstrip("/")
+        root = getattr(self.paths, "working_dir_root", None) or working_dir.rsplit("/", 1)[0]
+        if root.rstrip("/") == working_dir: root = working_dir.rsplit("/", 1)[0]
+        cache_dir = f"{root.rstrip('/')}/schema_cache"
+
+    if not hasattr(self, "schema_caches"): self.schema_caches = dict()
+    if cache_dir not in self.schema_caches: self.schema_caches[cache_dir] = SchemaCache(cache_dir)
+    return self.schema_caches[cache_dir]
+
+
+@DBAcademyHelper.monkey_patch
+def read_with_cached_schema(self, format, path, **options):
+    """
+    Reads path with a schema inferred only once per file listing.
+
+    Example:
+        users_df = DA.read_with_cached_schema("csv", DA.paths.users_csv, sep="\\t", header=True)
+
+    See also SchemaCache.read
+    """
+    return self.get_schema_cache().read(format, path, **options)
+
+None
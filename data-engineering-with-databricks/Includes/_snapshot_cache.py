@@ -0,0 +1,144 @@
+# Databricks notebook source
+from collections import OrderedDict
+
+class SnapshotCache:
+    """
+    Serves VERSION AS OF reads of frequently queried versions from shallow clones of those versions.
+
+    A time-travel query has to rebuild the snapshot of the requested version from the Delta log, starting at
+    the nearest checkpoint. Once a version has been read min_reads times, it is materialized as a shallow
+    clone: the clone's own log holds that version as a single commit and it shares the data files of the source.
+
+    Clones are evicted least recently used first when the data they reference exceeds storage_budget_bytes
+    or when there are more than max_entries of them. A version's data never changes, so clones need no
+    invalidation, but a VACUUM of the source deletes the files they share: clear() the cache before vacuuming.
+
+      Attributes:
+          storage_budget_bytes: maximum total sizeInBytes of the clones
+          max_entries: maximum number of clones
+          min_reads: number of reads of a version before it is materialized
+          entries: OrderedDict of {(table_name, version): {"clone": name, "bytes": size}}, least recently used first
+          stats: hits, misses, materializations and evictions
+
+      Methods:
+          resolve_version(table_name, version=None, timestamp=None): the version read by a time-travel query
+          read(table_name, version=None, timestamp=None): returns the DataFrame of that version
+          clear(): drops every clone
+          get_report(): one row per cached version
+    """
+
+    def __init__(self, storage_budget_bytes=1024*1024*1024, max_entries=10, min_reads=2):
+        self.storage_budget_bytes = storage_budget_bytes
+        self.max_entries = max_entries
+        self.min_reads = min_reads
+        self.entries = OrderedDict()
+        self.reads = dict()
+        self.stats = {"hits": 0, "misses": 0, "materializations": 0, "evictions": 0}
+
+
+    @staticmethod
+    def resolve_version(table_name, version=None, timestamp=None):
+        """
+        Returns the version as is, the version current at the timestamp, or the latest version if neither is given.
+        """
+        if version is not None: return int(version)
+
+        history = spark.sql(f"DESCRIBE HISTORY {table_name}")
+        if timestamp is not None: history = history.filter(F.col("timestamp") <= F.lit(timestamp).cast("timestamp"))
+        latest = history.agg(F.max("version").alias("version")).first()["version"]
+        assert latest is not None, f"The table {table_name} has no version at or before {timestamp}"
+        return latest
+
+
+    @staticmethod
+    def get_clone_name(table_name, version):
+        return f"""{table_name.replace(".", "_")}_snapshot_v{version}"""
+
+
+    def get_total_bytes(self):
+        return sum(e.get("bytes") for e in self.entries.values())
+
+
+    def materialize(self, table_name, version):
+        clone_name = SnapshotCache.get_clone_name(table_name, version)
+        spark.sql(f"CREATE OR REPLACE TABLE {clone_name} SHALLOW CLONE {table_name} VERSION AS OF {version}")
+        size = spark.sql(f"DESCRIBE DETAIL {clone_name}").first()["sizeInBytes"] or 0
+
+        self.entries[(table_name, version)] = {"clone": clone_name, "bytes": size}
+        self.stats["materializations"] += 1
+        self.evict()
+
+
+    def evict(self):
+        # The entry just materialized is the most recently used and is kept even if it alone exceeds the budget
+        while len(self.entries) > 1 and (len(self.entries) > self.max_entries or self.get_total_bytes() > self.storage_budget_bytes):
+            (table_name, version), entry = self.entries.popitem(last=False)
+            spark.sql(f"""DROP TABLE IF EXISTS {entry.get("clone")}""")
+            self.stats["evictions"] += 1
+
+
+    def read(self, table_name, version=None, timestamp=None):
+        """
+        Returns the DataFrame of the table at a version or timestamp, from its clone if materialized.
+        """
+        version = SnapshotCache.resolve_version(table_name, version, timestamp)
+        key = (table_name, version)
+
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return spark.table(self.entries[key].get("clone"))
+
+        self.stats["misses"] += 1
+        self.reads[key] = self.reads.get(key, 0) + 1
+        if self.reads[key] < self.min_reads:
+            return spark.read.option("versionAsOf", version).table(table_name)
+
+        self.materialize(table_name, version)
+        return spark.table(self.entries[key].get("clone"))
+
+
+    def clear(self):
+        for entry in self.entries.values():
+            spark.sql(f"""DROP TABLE IF EXISTS {entry.get("clone")}""")
+        self.entries.clear()
+        self.reads.clear()
+
+
+    def get_report(self):
+        return [{"table": table_name, "version": version, "clone": entry.get("clone"), "bytes": entry.get("bytes")}
+                for (table_name, version), entry in self.entries.items()]
+
+None
+
+# COMMAND ----------
+
+@DBAcademyHelper.monkey_patch
+def get_snapshot_cache(self, **options):
+    """
+    Returns the SnapshotCache of this lesson, creating it on first use.
+
+    :param options: constructor arguments of SnapshotCache, applied on creation only
+    """
+    if not hasattr(self, "snapshot_cache"): self.snapshot_cache = SnapshotCache(**options)
+    return self.snapshot_cache
+
+
+@DBAcademyHelper.monkey_patch
+def read_version(self, table_name, version=None, timestamp=None, view_name=None):
+    """
+    Reads a table as of a version or timestamp through the snapshot cache.
+
+    Example:
+        DA.read_version("students", 3, view_name="students_v3")
+
+    followed, in SQL, by SELECT * FROM students_v3
+
+    :param view_name: also registers the DataFrame as this temporary view (optional)
+    :return: the DataFrame
+    """
+    df = self.get_snapshot_cache().read(table_name, version, timestamp)
+    if view_name is not None: df.createOrReplaceTempView(view_name)
+    return df
+
+None
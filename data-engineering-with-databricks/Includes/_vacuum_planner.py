@@ -0,0 +1,235 @@
+# Databricks notebook source
+import threading
+
+class RateLimiter:
+    """
+    Allows at most rate calls of acquire() per second, shared by every thread.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+
+    def acquire(self):
+        import time
+
+        with self.lock:
+            now = time.time()
+            wait = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait > 0: time.sleep(wait)
+
+None
+
+# COMMAND ----------
+
+class VacuumPlanner:
+    """
+    Plans and runs a VACUUM from the Delta log instead of listing the table's directory.
+
+    VACUUM lists every file under the table's location to find those the current version no longer
+    references. The files removed from a table are already recorded in its log as "remove" actions, with
+    their size and the time of their removal, so the planner reads those instead: it estimates the bytes
+    reclaimable before deleting anything, and deletes in parallel batches at a limited rate.
+
+    A removed file is deleted only if it was removed longer ago than the retention period, is not referenced
+    by the current version again, is not referenced by one of the pinned versions still read by time travel,
+    and is inside the table's directory (shallow clones record the absolute paths of their source's files).
+    Files that were written but never committed are not in the log; an occasional VACUUM still removes those.
+
+      Attributes:
+          table_name: the Delta table
+          retain_hours: defaults to the table's delta.deletedFileRetentionDuration, or 7 days
+          pinned_versions: versions whose files are kept regardless of the retention
+          max_concurrency: number of threads deleting files
+          max_deletes_per_second: rate limit shared by the threads, None for no limit
+
+      Methods:
+          get_removed_files(): DataFrame of the files removed from the table, according to its log
+          plan(): the files to delete, the bytes reclaimable and the files kept, without deleting anything
+          execute(plan=None): deletes the planned files and returns the counts and bytes deleted
+    """
+
+    DEFAULT_RETENTION_HOURS = 7 * 24
+
+    def __init__(self, table_name, retain_hours=None, pinned_versions=None, max_concurrency=8, batch_size=100, max_deletes_per_second=None):
+        self.table_name = table_name
+        self.pinned_versions = sorted(set(pinned_versions or []))
+        self.max_concurrency = max_concurrency
+        self.batch_size = batch_size
+        self.max_deletes_per_second = max_deletes_per_second
+
+        detail = spark.sql(f"DESCRIBE DETAIL {table_name}").first()
+        self.location = detail["location"].rstrip("/")
+        self.retain_hours = retain_hours if retain_hours is not None else VacuumPlanner.get_retention_hours(detail["properties"] or dict())
+        self.check_retention(detail["properties"] or dict())
+
+
+    @staticmethod
+    def get_retention_hours(properties):
+        """
+        Parses delta.deletedFileRetentionDuration, e.g. "interval 7 days" or "interval 12 hours".
+        """
+        import re
+
+        duration = properties.get("delta.deletedFileRetentionDuration")
+        if duration is None: return VacuumPlanner.DEFAULT_RETENTION_HOURS
+
+        hours_per_unit = {"week": 168, "day": 24, "hour": 1, "minute": 1/60, "second": 1/3600}
+        hours = 0.0
+        for amount, unit in re.findall(r"(\d+)\s*(week|day|hour|minute|second)s?", duration.lower()):
+            hours += int(amount) * hours_per_unit[unit]
+        return hours
+
+
+    def check_retention(self, properties):
+        # The same safety check as VACUUM, disabled with the same configuration as in DE 3.2
+        configured = VacuumPlanner.get_retention_hours(properties)
+        check = spark.conf.get("spark.databricks.delta.retentionDurationCheck.enabled", "true").lower() == "true"
+        assert not check or self.retain_hours >= configured, f"Expected a retention of at least {configured} hours for {self.table_name}, found {self.retain_hours}; set spark.databricks.delta.retentionDurationCheck.enabled to false to override."
+
+
+    def get_removed_files(self):
+        """
+        Reads the remove actions of the commits and of the checkpoints, keeping the latest removal of each path.
+        """
+        log_dir = f"{self.location}/_delta_log"
+        actions = [spark.read.json(f"{log_dir}/*.json")]
+        if any(".checkpoint." in f.name for f in dbutils.fs.ls(log_dir)):
+            actions.append(spark.read.parquet(f"{log_dir}/*.checkpoint*.parquet"))
+
+        # Without any remove action, the inferred schema of the commits has no remove column
+        removes = [a.where("remove IS NOT NULL").select("remove.path", "remove.size", "remove.deletionTimestamp") for a in actions if "remove" in a.columns]
+        if len(removes) == 0: return spark.createDataFrame([], "path STRING, size BIGINT, deletion_timestamp BIGINT")
+
+        removed = removes[0] if len(removes) == 1 else removes[0].unionByName(removes[1])
+        return removed.groupBy("path").agg(F.max("size").alias("size"), F.max("deletionTimestamp").alias("deletion_timestamp"))
+
+
+    def get_path(self, path):
+        """
+        Resolves a path of the log, relative and URL-encoded, to an absolute path; None if outside the table's directory.
+        """
+        from urllib.parse import unquote
+
+        if ":" in path.split("/")[0] or path.startswith("/"):
+            path = unquote(path)
+            # Compare without the scheme, e.g. dbfs:/user/... and /user/...
+            location = self.location.split(":", 1)[-1]
+            return path if path.split(":", 1)[-1].startswith(f"{location}/") else None
+        return f"{self.location}/{unquote(path)}"
+
+
+    def get_referenced_files(self):
+        """
+        The files of the current version and of the pinned versions, as absolute paths without the scheme.
+        """
+        from urllib.parse import unquote
+
+        files = set(spark.table(self.table_name).inputFiles())
+        for version in self.pinned_versions:
+            files.update(spark.read.option("versionAsOf", version).table(self.table_name).inputFiles())
+        return {unquote(f).split(":", 1)[-1] for f in files}
+
+
+    def plan(self):
+        """
+        :return: dictionary with the files to delete and the counts of the files kept, with the reason
+        """
+        import time
+
+        cutoff = int((time.time() - self.retain_hours * 3600) * 1000)
+        referenced = self.get_referenced_files()
+
+        plan = {"table": self.table_name, "retain_hours": self.retain_hours, "pinned_versions": self.pinned_versions,
+                "files": [], "bytes": 0, "unknown_size_files": 0, "kept_recent": 0, "kept_referenced": 0, "kept_outside_table": 0}
+
+        for r in self.get_removed_files().collect():
+            path = self.get_path(r.path)
+            if path is None:
+                plan["kept_outside_table"] += 1
+            elif path.split(":", 1)[-1] in referenced:
+                plan["kept_referenced"] += 1
+            elif r.deletion_timestamp is not None and r.deletion_timestamp > cutoff:
+                plan["kept_recent"] += 1
+            else:
+                plan["files"].append(path)
+                if r.size is None: plan["unknown_size_files"] += 1
+                else: plan["bytes"] += r.size
+
+        return plan
+
+
+    def delete_batch(self, paths, limiter):
+        deleted, missing, failed = 0, 0, 0
+        for path in paths:
+            limiter.acquire()
+            try:
+                if dbutils.fs.rm(path): deleted += 1
+                else: missing += 1  # Already deleted, e.g. by an earlier run or a VACUUM
+            except Exception:
+                failed += 1
+        return deleted, missing, failed
+
+
+    def execute(self, plan=None):
+        """
+        Deletes the planned files, max_concurrency batches at a time.
+
+        :return: dictionary with the files deleted, already missing and failed, and the bytes planned
+        """
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+
+        plan = plan or self.plan()
+        files = plan.get("files")
+        batches = [files[i:i + self.batch_size] for i in range(0, len(files), self.batch_size)]
+        limiter = RateLimiter(self.max_deletes_per_second)
+
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            results = list(executor.map(lambda b: self.delete_batch(b, limiter), batches))
+
+        result = {
+            "table": self.table_name,
+            "deleted": sum(r[0] for r in results),
+            "missing": sum(r[1] for r in results),
+            "failed": sum(r[2] for r in results),
+            "bytes": plan.get("bytes"),
+            "seconds": time.time() - start,
+        }
+        print(f"""Deleted {result.get("deleted"):,} file(s) ({result.get("bytes"):,} bytes) from {self.table_name} in {result.get("seconds"):,.2f} seconds""")
+        return result
+
+None
+
+# COMMAND ----------
+
+@DBAcademyHelper.monkey_patch
+def plan_vacuum(self, table_name, retain_hours=None, pinned_versions=None, dry_run=True, **options):
+    """
+    Estimates, and unless dry_run deletes, the files a VACUUM of the table would remove.
+
+    The versions cached by get_snapshot_cache(), if any, are pinned in addition to pinned_versions.
+
+    Example:
+        DA.plan_vacuum("students", retain_hours=0)
+
+    See also VacuumPlanner
+
+    :return: the plan if dry_run, otherwise the result of the deletes
+    """
+    pinned_versions = list(pinned_versions or [])
+    if hasattr(self, "snapshot_cache"):
+        pinned_versions += [version for (cached_table, version) in self.snapshot_cache.entries.keys() if cached_table == table_name]
+
+    planner = VacuumPlanner(table_name, retain_hours=retain_hours, pinned_versions=pinned_versions, **options)
+    plan = planner.plan()
+    print(f"""{len(plan.get("files")):,} file(s) and {plan.get("bytes"):,} bytes reclaimable from {table_name}; kept {plan.get("kept_recent"):,} recent, {plan.get("kept_referenced"):,} referenced and {plan.get("kept_outside_table"):,} outside of the table""")
+
+    if dry_run: return plan
+    return planner.execute(plan)
+
+None
@@ -254,6 +254,27 @@ display(events_df)
 
 # COMMAND ----------
 
+# DBTITLE 0,--i18n-4c8a2e71-96b3-4d0f-8e25-b7f1c3a9d602
+# MAGIC %md
+# MAGIC ### スキーマのキャッシュ (Caching Inferred Schemas)
+# MAGIC
+# MAGIC 上のトリックを自動化したものが **`DA.read_with_cached_schema`** です。最初の読み込みでだけスキーマを推論してDDLとして保存し、以降の読み込みでは自動的に **`.schema(ddl)`** を使います。
+# MAGIC
+# MAGIC キャッシュはパスとファイル一覧（名前、サイズ、更新日時）のフィンガープリントをキーにしているため、ファイルが変わるとスキーマは再び推論されます。
+# MAGIC
+# MAGIC キャッシュはレッスンの作業ディレクトリの外に保存されるため、レッスンをリセットしても残り、次のセッションの最初の読み込みからスキーマ推論を省略できます。
+
+# COMMAND ----------
+
+for i in range(2):
+    users_df = DA.read_with_cached_schema("csv", DA.paths.users_csv, sep="\t", header=True)
+    events_df = DA.read_with_cached_schema("json", DA.paths.events_json)
+
+users_df.printSchema()
+DA.get_schema_cache().display_report()
+
+# COMMAND ----------
+
 # DBTITLE 0,--i18n-f57b5940-857f-4e37-a2e4-030b27b3795a
 # MAGIC %md
 # MAGIC ## DataFrameWriter
@@ -129,6 +129,25 @@ display(size_df)
 
 # COMMAND ----------
 
+# DBTITLE 0,--i18n-a7c3e915-2f4b-4d86-b0e2-9d5c1a8f3e64
+# MAGIC %md
+# MAGIC **`explode`** してから **`groupBy`** で集約し直すと、行数が配列の要素数倍に増え、そのすべての行がシャッフルされます。
+# MAGIC
+# MAGIC **`ArrayTransforms`** は、 **`filter`** 、 **`transform`** 、 **`exists`** 、 **`aggregate`** などの高階関数を使い、配列の中で同じ処理を行います。 **`find_explode_regroups`** は、このような書き換えの候補をクエリープランから検出します。
+
+# COMMAND ----------
+
+print(find_explode_regroups(size_df, "size_df"))
+
+array_size_df = (df
+                 .withColumn("sizes", ArrayTransforms.distinct_values(get_size, predicate=is_mattress))
+                 .filter(ArrayTransforms.any_item(is_mattress))
+                 .groupBy("email")
+                 .agg(ArrayTransforms.merge_distinct("sizes").alias("size options")))
+display(array_size_df)
+
+# COMMAND ----------
+
 # DBTITLE 0,--i18n-7304a528-9b97-4806-954f-56cbf7bed6dc
 # MAGIC %md
 # MAGIC ##　UnionとunionByName (Union and unionByName)
@@ -3,6 +3,10 @@
 
 # COMMAND ----------
 
+# MAGIC %run ../../Includes/_kafka_decoder
+
+# COMMAND ----------
+
 lesson_config = LessonConfig(name = None,
                              create_schema = True,
                              create_catalog = False,
@@ -157,6 +157,23 @@ FROM parquet.`${da.paths.datasets}/ecommerce/raw/users-30m`
 
 -- COMMAND ----------
 
+-- DBTITLE 0,--i18n-6b1d84f2-07c9-4e3a-b5f8-2d94c1a7e360
+-- MAGIC %md
+-- MAGIC ## 枝刈りによるアップサート（Upserts with Pruning）
+-- MAGIC
+-- MAGIC キーだけを比較する **`MERGE`** は、一致する可能性のあるターゲットのすべてのファイルを読み込みます。 **`DA.merge_upsert()`** は、まずバッチをキーで重複排除し、バッチのキーの範囲（およびパーティションの集合）を求め、それらをマージ条件に述語として追加することで、Deltaがファイルの統計情報を使ってファイルをスキップできるようにします。
+-- MAGIC
+-- MAGIC 次のセルでは、後述の **`MERGE`** を適用する前の **`users`** のクローンに対して、通常の **`MERGE`** と枝刈りした **`MERGE`** を比較し、読み込んだファイル数と書き直したファイル数を報告します。 **`users`** テーブル自体は変更されません。
+
+-- COMMAND ----------
+
+-- MAGIC %python
+-- MAGIC merge_benchmark = DA.benchmark_merge_upsert("users", "users_update", keys=["user_id"],
+-- MAGIC                                             matched_condition="t.email IS NULL AND s.email IS NOT NULL",
+-- MAGIC                                             set={"email": "s.email", "updated": "s.updated"})
+
+-- COMMAND ----------
+
 -- DBTITLE 0,--i18n-4732ea19-2857-45fe-9ca2-c2475015ef47
 -- MAGIC %md
 -- MAGIC **`MERGE`** の主な利点は：
@@ -184,6 +201,21 @@ WHEN NOT MATCHED THEN INSERT *
 
 -- COMMAND ----------
 
+-- DBTITLE 0,--i18n-2f7a9c31-5d8e-4b06-a1c4-93e6b0d5f782
+-- MAGIC %md
+-- MAGIC ## 変更データフィードによる増分伝播（Incremental Propagation with Change Data Feed）
+-- MAGIC
+-- MAGIC ダウンストリームのテーブルをCTASや **`INSERT OVERWRITE`** で毎回作り直す代わりに、ソーステーブルの変更データフィード（CDF）から変更だけを適用できます。
+-- MAGIC
+-- MAGIC 次のセルでは **`events`** のCDFを有効にし、ダウンストリームのテーブル **`events_propagated`** を作成します。 最後に処理したバージョンはコンシューマーごとに記録されます。
+
+-- COMMAND ----------
+
+-- MAGIC %python
+-- MAGIC DA.propagate_changes("events", "events_propagated", keys=["user_id", "event_timestamp"])
+
+-- COMMAND ----------
+
 -- DBTITLE 0,--i18n-d7d2c7fd-2c83-4ed2-aa78-c37992751881
 -- MAGIC %md
 -- MAGIC ## 重複排除のためのInsert-Onlyマージ（Insert-Only Merge for Deduplication）
@@ -206,6 +238,17 @@ WHEN NOT MATCHED AND b.traffic_source = 'email' THEN
 
 -- COMMAND ----------
 
+-- DBTITLE 0,--i18n-8c3e51d6-4a2b-47f9-9e0d-1b7f26a4c5e8
+-- MAGIC %md
+-- MAGIC 上のマージで追加されたレコードだけを **`events_propagated`** に適用し、全体を再計算した場合と比較します。
+
+-- COMMAND ----------
+
+-- MAGIC %python
+-- MAGIC cdf_benchmark = DA.benchmark_change_propagation("events", "events_propagated", keys=["user_id", "event_timestamp"])
+
+-- COMMAND ----------
+
 -- DBTITLE 0,--i18n-75891a95-c6f2-4f00-b30e-3df2df858c7c
 -- MAGIC %md
 -- MAGIC ## インクリメンタルな読み込み（Load Incrementally）
@@ -228,6 +271,48 @@ FILEFORMAT = PARQUET
 
 -- COMMAND ----------
 
+-- DBTITLE 0,--i18n-a47d2e80-3c5b-4f19-b6e2-0d8f91c37a54
+-- MAGIC %md
+-- MAGIC ## ファイル台帳によるべき等な取り込み（Idempotent Ingestion with a File Ledger）
+-- MAGIC
+-- MAGIC ジョブから繰り返し実行する場合、 **`DA.ingest_new_files()`** は、ソースディレクトリのファイルを台帳テーブル（ **`ingest_ledger`** ）と照合して新しいファイルだけを選びます。 新しいファイルはサイズが均等なバッチに分けられ、 **`COPY INTO`** で同時に読み込まれます。 ファイルごとのバイト数とレイテンシーは台帳に記録されます。
+-- MAGIC
+-- MAGIC 2回目の実行では、新しいファイルがないため何も読み込まれません。
+
+-- COMMAND ----------
+
+-- MAGIC %python
+-- MAGIC DA.ingest_new_files("sales_ingested", f"{DA.paths.datasets}/ecommerce/raw/sales-30m", "PARQUET")
+-- MAGIC DA.ingest_new_files("sales_ingested", f"{DA.paths.datasets}/ecommerce/raw/sales-30m", "PARQUET")
+
+-- COMMAND ----------
+
+SELECT target_table, status, count(*) AS files, sum(size) AS bytes, max(seconds) AS max_seconds
+FROM ingest_ledger
+GROUP BY target_table, status
+
+-- COMMAND ----------
+
+-- DBTITLE 0,--i18n-71c9e3b5-d20a-4f86-8b4e-e5a06f2c9d13
+-- MAGIC %md
+-- MAGIC ## クエリの述語に基づくレイアウトの提案（Layout Advice from Query Predicates）
+-- MAGIC
+-- MAGIC クローンしたテーブルは、ソースのレイアウトをそのまま引き継ぎます。 **`DA.advise_layout()`** は、実行されたクエリのプランからプッシュダウンされた述語を集め、ファイルごとの最小値・最大値を使ってデータスキッピングをシミュレーションします。 現在のレイアウト、各列によるクラスタリング、各列によるパーティション分割を比較し、スキャンするバイト数が最も少ないレイアウトを推奨します。
+
+-- COMMAND ----------
+
+SELECT count(*) FROM events WHERE event_name = 'finalize';
+SELECT count(*) FROM events WHERE geo.state = 'CA';
+SELECT count(*) FROM users WHERE user_id = 'UA000000107379500'
+
+-- COMMAND ----------
+
+-- MAGIC %python
+-- MAGIC recommendations = DA.advise_layout("events", "users",
+-- MAGIC                                    queries=[spark.table("events").filter("event_timestamp > 1593878900000000")])
+
+-- COMMAND ----------
+
 -- DBTITLE 0,--i18n-fd65fe71-cdaf-47a8-85ec-fa9769c11708
 -- MAGIC %md
 -- MAGIC 次のセルを実行して、このレッスンに関連するテーブルとファイルを削除してください。
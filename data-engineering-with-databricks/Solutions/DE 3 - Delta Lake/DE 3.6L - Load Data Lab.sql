@@ -176,6 +176,42 @@ AS SELECT * FROM parquet.`${da.paths.datasets}/ecommerce/raw/item-lookup`
 
 -- COMMAND ----------
 
+-- DBTITLE 0,--i18n-2e9c7f41-5b08-4d63-a1f7-8c3e0d6b9a52
+-- MAGIC %md
+-- MAGIC ## ボーナス：Kafkaのイベントをデコードする（Bonus: Decoding the Kafka Events）
+-- MAGIC
+-- MAGIC **`events_raw`** の **`value`** はバイナリのJSONなので、クエリのたびに **`from_json`** で解析し直すことになります。
+-- MAGIC
+-- MAGIC **`DA.decode_kafka_events`** は、ペイロードのスキーマを一度だけ推論して固定し、1つの射影で **`value`** を解析して、Kafkaのパーティションでパーティション分割されたDeltaのブロンズテーブルに書き込みます。もう一度実行すると、パーティションごとに取り込み済みのオフセットより新しいレコードだけが追加されます。
+
+-- COMMAND ----------
+
+-- MAGIC %python
+-- MAGIC decoder = DA.decode_kafka_events("events_bronze")
+-- MAGIC print(decoder.get_schema())
+-- MAGIC
+-- MAGIC DA.decode_kafka_events("events_bronze")  # Appends 0 records; every offset has already been ingested
+
+-- COMMAND ----------
+
+SELECT partition, count(*) AS records, max(offset) AS max_offset
+FROM events_bronze
+GROUP BY partition
+
+-- COMMAND ----------
+
+-- DBTITLE 0,--i18n-5e0b9f27-84c1-4d6a-9a3e-c72f1d8b6e05
+-- MAGIC %md
+-- MAGIC ジョブからこのラボの取り込みを繰り返す場合は、 **`DA.ingest_new_files()`** を使うと、台帳に記録されていない新しいファイルだけが **`COPY INTO`** で読み込まれます。
+
+-- COMMAND ----------
+
+-- MAGIC %python
+-- MAGIC DA.ingest_new_files("events_kafka_raw", DA.paths.kafka_events, "JSON")
+-- MAGIC DA.ingest_new_files("events_kafka_raw", DA.paths.kafka_events, "JSON")  # Loads nothing; every file is in the ledger
+
+-- COMMAND ----------
+
 -- DBTITLE 0,--i18n-4db73493-3920-44e2-a19b-f335aa650f76
 -- MAGIC %md
 -- MAGIC 次のセルを実行して、このレッスンに関連するテーブルとファイルを削除してください。
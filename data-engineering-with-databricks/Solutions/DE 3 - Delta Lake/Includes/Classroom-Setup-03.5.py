@@ -3,6 +3,22 @@
 
 # COMMAND ----------
 
+# MAGIC %run ../../Includes/_merge_upsert
+
+# COMMAND ----------
+
+# MAGIC %run ../../Includes/_cdf_propagation
+
+# COMMAND ----------
+
+# MAGIC %run ../../Includes/_ingest_ledger
+
+# COMMAND ----------
+
+# MAGIC %run ../../Includes/_layout_advisor
+
+# COMMAND ----------
+
 lesson_config = LessonConfig(name = None,
                              create_schema = True,
                              create_catalog = False,
@@ -13,7 +29,7 @@ lesson_config = LessonConfig(name = None,
 
 DA = DBAcademyHelper(course_config=course_config,
                      lesson_config=lesson_config)
-DA.reset_lesson()
+DA.reset_lesson_keeping_clones()
 DA.init()
 
 print()
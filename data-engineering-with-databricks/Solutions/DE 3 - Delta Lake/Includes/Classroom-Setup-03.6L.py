@@ -3,6 +3,14 @@
 
 # COMMAND ----------
 
+# MAGIC %run ../../Includes/_kafka_decoder
+
+# COMMAND ----------
+
+# MAGIC %run ../../Includes/_ingest_ledger
+
+# COMMAND ----------
+
 lesson_config = LessonConfig(name = None,
                              create_schema = True,
                              create_catalog = False,
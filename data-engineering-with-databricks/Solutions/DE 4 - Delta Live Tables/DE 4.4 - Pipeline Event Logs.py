@@ -125,6 +125,23 @@ spark.conf.set('latest_update.id', latest_update_id)
 
 # COMMAND ----------
 
+# DBTITLE 0,--i18n-3c0d6a4e-8f1b-4b7e-9a52-6d1e2f7c4b90
+# MAGIC %md
+# MAGIC ## アップデートのメトリクスを参照する(Look Up Update Metrics)
+# MAGIC
+# MAGIC 上記のクエリは、実行するたびにイベントログ全体を読み直します。
+# MAGIC
+# MAGIC **`DA.pipeline_metrics()`** は、前回以降に追加されたイベントだけをファクトテーブルに取り込み、フローの進捗、テーブルごとの行数、エクスペクテーションの合格率、フェーズごとの所要時間を返します。
+
+# COMMAND ----------
+
+metrics = DA.pipeline_metrics(latest_update_id)
+
+for table in metrics["tables"]:
+    print(table)
+
+# COMMAND ----------
+
 # MAGIC %md-sandbox
 # MAGIC &copy; 2023 Databricks, Inc. All rights reserved.<br/>
 # MAGIC Apache, Apache Spark, Spark and the Spark logo are trademarks of the <a href="https://www.apache.org/">Apache Software Foundation</a>.<br/>
@@ -0,0 +1,206 @@
+# Databricks notebook source
+# MAGIC %run ./_plan_inspector
+
+# COMMAND ----------
+
+class ArrayTransforms:
+    """
+    Array-native building blocks for the items column of sales, replacing explode followed by a groupBy.
+
+    Exploding multiplies the rows by the number of items, and regrouping them shuffles every exploded row.
+    The higher-order functions below (filter, transform, exists and aggregate, as in DE 2.99) work within
+    each row's array instead, so the rows are neither multiplied nor shuffled.
+
+      Methods:
+          get_field(field, items="items"): array of one field of every item
+          filter_items(predicate, items="items"): the items matching a predicate
+          any_item(predicate, items="items"): true if any item matches
+          sum_items(field, items="items", predicate=None): sum of a numeric field of the (matching) items
+          distinct_values(value, items="items", predicate=None): sorted distinct values computed from the (matching) items
+          merge_distinct(column): aggregate merging the per-row arrays of distinct_values across a group
+
+    Predicates and values are functions of an item Column, e.g. lambda i: i.item_name.endswith("Mattress")
+    """
+
+    @staticmethod
+    def get_field(field, items="items"):
+        return F.transform(items, lambda i: i[field])
+
+
+    @staticmethod
+    def filter_items(predicate, items="items"):
+        return F.filter(items, predicate)
+
+
+    @staticmethod
+    def any_item(predicate, items="items"):
+        return F.exists(items, predicate)
+
+
+    @staticmethod
+    def sum_items(field, items="items", predicate=None):
+        if predicate is not None: items = F.filter(items, predicate)
+        return F.aggregate(items, F.lit(0.0), lambda total, i: total + F.coalesce(i[field].cast("double"), F.lit(0.0)))
+
+
+    @staticmethod
+    def distinct_values(value, items="items", predicate=None):
+        if predicate is not None: items = F.filter(items, predicate)
+        # Like collect_set, ignore null values
+        return F.array_sort(F.array_distinct(F.filter(F.transform(items, value), lambda v: v.isNotNull())))
+
+
+    @staticmethod
+    def merge_distinct(column):
+        """
+        Aggregate function equivalent to collect_set over the exploded values, applied to per-row arrays.
+        """
+        return F.array_sort(F.array_distinct(F.flatten(F.collect_list(column))))
+
+None
+
+# COMMAND ----------
+
+def is_mattress(item):
+    return F.array_contains(F.split(item.item_name, " "), "Mattress")
+
+def get_size(item):
+    return F.element_at(F.split(item.item_name, " "), 2)
+
+# Each rewrite pairs the explode/groupBy pattern of DE 0.10 with its array-native equivalent; both return the same rows.
+# The per-order rewrites need no groupBy at all because order_id is unique in sales; revenues are rounded to the cent
+# so that the different order of the floating point additions does not make them differ.
+ARRAY_REWRITES = {
+    "mattress_sizes": (
+        # DE 0.10: explode the items, keep the mattresses, then collect_set of the sizes per email
+        lambda df: (df.withColumn("item", F.explode("items"))
+                      .filter(is_mattress(F.col("item")))
+                      .groupBy("email")
+                      .agg(F.array_sort(F.collect_set(get_size(F.col("item")))).alias("sizes"))),
+        lambda df: (df.withColumn("sizes", ArrayTransforms.distinct_values(get_size, predicate=is_mattress))
+                      .filter(ArrayTransforms.any_item(is_mattress))
+                      .groupBy("email")
+                      .agg(ArrayTransforms.merge_distinct("sizes").alias("sizes"))),
+    ),
+    "revenue_per_order": (
+        lambda df: (df.withColumn("item", F.explode("items"))
+                      .groupBy("order_id")
+                      .agg(F.round(F.sum(F.coalesce(F.col("item.item_revenue_in_usd").cast("double"), F.lit(0.0))), 2).alias("revenue"))),
+        lambda df: (df.filter(F.size("items") > 0)
+                      .select("order_id", F.round(ArrayTransforms.sum_items("item_revenue_in_usd"), 2).alias("revenue"))),
+    ),
+    "product_flags": (
+        lambda df: (df.withColumn("item", F.explode("items"))
+                      .groupBy("order_id")
+                      .agg(F.max(F.col("item.item_name").like("%Mattress")).alias("mattress"),
+                           F.max(F.col("item.item_name").like("%Pillow")).alias("pillow"))),
+        lambda df: (df.filter(F.size("items") > 0)
+                      .select("order_id",
+                              ArrayTransforms.any_item(lambda i: i.item_name.like("%Mattress")).alias("mattress"),
+                              ArrayTransforms.any_item(lambda i: i.item_name.like("%Pillow")).alias("pillow"))),
+    ),
+}
+
+None
+
+# COMMAND ----------
+
+def find_explode_regroups(df, name="df"):
+    """
+    Flags aggregates computed over exploded arrays, i.e. candidates for an ArrayTransforms rewrite.
+
+    :return: list of issues in the format of PlanInspector.find_issues
+    """
+    inspector = PlanInspector(df, name)
+    issues = []
+    for node in inspector.get_operators("optimized", "Aggregate"):
+        generators = [d for d in node.get_descendants() if d.operator == "Generate" and "explode" in d.details]
+        for generator in generators:
+            issues.append(inspector.issue("warning", "explode_regroup", f"Aggregate {node.details} regroups the rows of Generate {generator.details}; consider filter/transform/aggregate on the array instead"))
+    return issues
+
+
+class ArrayTransformBenchmark:
+    """
+    Runs both sides of each rewrite in ARRAY_REWRITES and compares their shuffle bytes and runtime.
+
+      Attributes:
+          df: source DataFrame with an items column, e.g. spark.table("sales")
+          rewrites: {name: (exploded, array_native)}, defaults to ARRAY_REWRITES
+          comparison: the PlanComparison of every variant, set by run()
+
+      Methods:
+          verify(): asserts that both sides of every rewrite return the same rows
+          run(): measures every variant and returns the report
+          get_savings(): shuffle bytes and seconds avoided per rewrite
+          display_report(): renders the comparison and the savings as HTML
+    """
+
+    def __init__(self, df, rewrites=None):
+        self.df = df
+        self.rewrites = rewrites or ARRAY_REWRITES
+        self.comparison = None
+
+
+    def get_variants(self):
+        variants = dict()
+        for name, (exploded, array_native) in self.rewrites.items():
+            variants[f"{name}_exploded"] = exploded(self.df)
+            variants[f"{name}_array_native"] = array_native(self.df)
+        return variants
+
+
+    def verify(self):
+        for name, (exploded, array_native) in self.rewrites.items():
+            expected, actual = exploded(self.df), array_native(self.df)
+            differences = expected.exceptAll(actual).count() + actual.exceptAll(expected).count()
+            assert differences == 0, f"Expected the rewrite \"{name}\" to return the same rows, found {differences} differences"
+
+
+    def run(self):
+        self.comparison = PlanComparison(self.get_variants())
+        self.comparison.run(measure=True)
+        return self.comparison.get_report()
+
+
+    def get_savings(self):
+        assert self.comparison is not None, "No results to report; call run() first."
+
+        report = {r["variant"]: r for r in self.comparison.get_report()}
+        savings = []
+        for name in self.rewrites.keys():
+            exploded, array_native = report[f"{name}_exploded"], report[f"{name}_array_native"]
+            saving = {"rewrite": name}
+            for key in ["shuffle_bytes", "seconds", "task_seconds"]:
+                if exploded.get(key) is None or array_native.get(key) is None: saving[f"{key}_avoided"] = None
+                else: saving[f"{key}_avoided"] = exploded.get(key) - array_native.get(key)
+            savings.append(saving)
+        return savings
+
+
+    def display_report(self):
+        html = PlanComparison.to_html(self.comparison.get_report())
+        html += "<br/>" + PlanComparison.to_html(self.get_savings())
+        displayHTML(html)
+
+None
+
+# COMMAND ----------
+
+@DBAcademyHelper.monkey_patch
+def benchmark_array_transforms(self, df=None, verify=True):
+    """
+    Benchmarks the explode/groupBy patterns against their array-native rewrites on sales.
+
+    :param df: overrides spark.table("sales") (optional)
+    :param verify: if True (default), first asserts that both sides of each rewrite return the same rows
+    :return: the ArrayTransformBenchmark
+    """
+    benchmark = ArrayTransformBenchmark(df if df is not None else spark.table("sales"))
+    if verify: benchmark.verify()
+
+    benchmark.run()
+    benchmark.display_report()
+    return benchmark
+
+None
@@ -0,0 +1,232 @@
+# Databricks notebook source
+# MAGIC %run ./_plan_inspector
+
+# COMMAND ----------
+
+import builtins  # Lessons shadow max and sum with pyspark.sql.functions, e.g. section2-spark-ELT-C
+
+class LatestRecordDeduplicator:
+    """
+    Keeps the latest record of each key, e.g. of each email of users_dirty, with a single aggregation.
+
+    ROW_NUMBER over a window shuffles and sorts every row of the table; a GROUP BY of the latest
+    timestamp joined back to the table shuffles it twice and returns every row tied with the latest.
+    Here each key is reduced with max_by, ordered by a struct of the order_by columns followed by the
+    other columns of the table, so the aggregation combines rows before the shuffle, sorts nothing,
+    and breaks ties deterministically: the same rows win in a full and in an incremental run.
+
+    An existing deduplicated Delta target is maintained incrementally: the rows appended to the source
+    since the last run are read with a Delta stream, deduplicated, and merged into the target, replacing
+    a row only if the new one orders after it. The source is expected to be append-only.
+
+      Attributes:
+          keys: columns identifying a record
+          order_by: column, or list of columns, deciding which record is the latest
+          log: list of dictionaries, one per deduplicate_into()
+
+      Methods:
+          get_ordering(df): the columns compared to find the latest record, most significant first
+          deduplicate(df): DataFrame with the latest record of each key
+          deduplicate_into(source_table, target_table, checkpoint_dir): applies the new source rows to the target
+    """
+
+    def __init__(self, keys, order_by):
+        self.keys = list(keys)
+        self.order_by = [order_by] if isinstance(order_by, str) else list(order_by)
+        self.log = []
+
+
+    def get_ordering(self, df):
+        """
+        The order_by columns, then the other orderable columns as tie-breakers; maps cannot be compared.
+        """
+        tie_breakers = [f.name for f in df.schema.fields
+                        if f.name not in self.keys + self.order_by and "map<" not in f.dataType.simpleString()]
+        return self.order_by + tie_breakers
+
+
+    def deduplicate(self, df):
+        values = [c for c in df.columns if c not in self.keys]
+        ordering = self.get_ordering(df)
+
+        latest = F.max_by(F.struct(*values), F.struct(*ordering)).alias("__latest")
+        return df.groupBy(*self.keys).agg(latest).select(*self.keys, *[F.col(f"__latest.{c}").alias(c) for c in values]).select(*df.columns)
+
+
+    def merge(self, batch_df, target_table):
+        from delta.tables import DeltaTable
+
+        deduped_df = self.deduplicate(batch_df)
+        if not spark.catalog.tableExists(target_table):
+            deduped_df.write.format("delta").saveAsTable(target_table)
+            return
+
+        # Null-safe, as GROUP BY keeps a record for the null key too
+        condition = " AND ".join(f"t.{k} <=> s.{k}" for k in self.keys)
+        ordering = self.get_ordering(batch_df)
+        newer = f"""struct({", ".join(f"s.{c}" for c in ordering)}) > struct({", ".join(f"t.{c}" for c in ordering)})"""
+
+        (DeltaTable.forName(spark, target_table).alias("t")
+                   .merge(deduped_df.alias("s"), condition)
+                   .whenMatchedUpdateAll(condition=newer)
+                   .whenNotMatchedInsertAll()
+                   .execute())
+
+
+    def deduplicate_into(self, source_table, target_table, checkpoint_dir):
+        """
+        Merges the rows appended to source_table since the last run into target_table, creating it on the first run.
+
+        :param checkpoint_dir: streaming checkpoint recording the last source version applied
+        :return: the log entry with the rows read and the seconds spent
+        """
+        import time
+
+        start = time.time()
+        print(f"Deduplicating the new rows of {source_table} into {target_table}", end="...")
+
+        query = (spark.readStream
+                      .table(source_table)
+                      .writeStream
+                      .foreachBatch(lambda batch_df, batch_id: self.merge(batch_df, target_table))
+                      .option("checkpointLocation", checkpoint_dir)
+                      .trigger(availableNow=True)
+                      .start())
+        query.awaitTermination()
+
+        entry = {"source_table": source_table, "target_table": target_table,
+                 "rows_read": builtins.sum(p["numInputRows"] for p in query.recentProgress),
+                 "rows": spark.table(target_table).count() if spark.catalog.tableExists(target_table) else 0,
+                 "seconds": time.time() - start}
+        self.log.append(entry)
+        print(f"""{entry.get("rows_read"):,} new rows, {entry.get("rows"):,} records, {entry.get("seconds"):,.2f} seconds""")
+        return entry
+
+None
+
+# COMMAND ----------
+
+class DeduplicationBenchmark:
+    """
+    Compares the ROW_NUMBER window and the GROUP BY joined back of section2-spark-ELT-C with the single max_by aggregation.
+
+      Attributes:
+          join_keys: grouping columns of the GROUP BY joined back, defaults to keys; the lesson groups by user_id and email
+
+      Methods:
+          get_variants(): {"row_number": df, "aggregate_join": df, "max_by": df}
+          verify(): asserts the window and max_by variants keep one record of the same keys
+          run(): measures every variant with PlanComparison and returns the report
+    """
+
+    def __init__(self, df, keys, order_by, join_keys=None):
+        self.df = df
+        self.deduplicator = LatestRecordDeduplicator(keys, order_by)
+        self.join_keys = list(join_keys or keys)
+        self.comparison = None
+        self.report = []
+
+
+    def get_variants(self):
+        from pyspark.sql.window import Window
+
+        keys, order_by = self.deduplicator.keys, self.deduplicator.order_by
+
+        window = Window.partitionBy(*keys).orderBy(*[F.col(c).desc() for c in order_by])
+        row_number = self.df.withColumn("__rank", F.row_number().over(window)).filter("__rank = 1").drop("__rank")
+
+        # Ties with the latest timestamp are all kept, and the inner join drops null keys; aliases keep the self-join unambiguous
+        latest = self.df.groupBy(*self.join_keys).agg(*[F.max(c).alias(f"__latest_{c}") for c in order_by]).alias("l")
+        condition = [F.col(f"d.{c}") == F.col(f"l.{c}") for c in self.join_keys] + [F.col(f"d.{c}") == F.col(f"l.__latest_{c}") for c in order_by]
+        aggregate_join = self.df.alias("d").join(latest, condition).select("d.*")
+
+        return {"row_number": row_number, "aggregate_join": aggregate_join, "max_by": self.deduplicator.deduplicate(self.df)}
+
+
+    def verify(self):
+        variants = self.get_variants()
+        keys = self.deduplicator.keys
+
+        counts = variants["max_by"].agg(F.count("*").alias("rows"), F.count_distinct(F.struct(*keys)).alias("keys")).first()
+        assert counts["rows"] == counts["keys"], f"Expected one record per key, found {counts['rows']:,} records for {counts['keys']:,} keys"
+
+        # Tied records may differ, as ROW_NUMBER picks any of them; the keys kept must not
+        expected, actual = variants["row_number"].select(*keys), variants["max_by"].select(*keys)
+        differences = expected.exceptAll(actual).count() + actual.exceptAll(expected).count()
+        assert differences == 0, f"Expected the max_by aggregation to keep the same keys as ROW_NUMBER, found {differences} differences"
+
+
+    def get_shuffles(self, inspector):
+        return len([n for n in inspector.plans["physical"] if n.operator in ["Exchange", "ShuffleExchange"] or "ShuffleExchangeSink" in n.operator])
+
+
+    def run(self):
+        self.comparison = PlanComparison(self.get_variants())
+        self.comparison.run(measure=True)
+
+        self.report = []
+        for row in self.comparison.get_report():
+            inspector = self.comparison.inspectors[row.get("variant")]
+            self.report.append({"variant": row.get("variant"),
+                                "rows": inspector.df.count(),
+                                "shuffles": self.get_shuffles(inspector),
+                                "seconds": row.get("seconds"),
+                                "shuffle_bytes": row.get("shuffle_bytes"),
+                                "task_seconds": row.get("task_seconds")})
+        return self.report
+
+
+    def display_report(self):
+        displayHTML(PlanComparison.to_html(self.report))
+
+None
+
+# COMMAND ----------
+
+@DBAcademyHelper.monkey_patch
+def deduplicate_latest(self, source, keys, order_by):
+    """
+    Returns the latest record of each key of a table or DataFrame, with a single aggregation.
+
+    Example:
+        DA.deduplicate_latest("users_dirty", ["email"], "updated")
+
+    See also LatestRecordDeduplicator
+    """
+    df = spark.table(source) if isinstance(source, str) else source
+    return LatestRecordDeduplicator(keys, order_by).deduplicate(df)
+
+
+@DBAcademyHelper.monkey_patch
+def deduplicate_into(self, source_table, target_table, keys, order_by, checkpoint_dir=None):
+    """
+    Merges the latest record of each key appended to source_table since the last call into target_table.
+
+    :param checkpoint_dir: defaults to a directory of the target under the working directory
+    :return: the log entry of the run
+    """
+    checkpoint_dir = checkpoint_dir or f"{self.paths.working_dir}/deduplication/{target_table}/checkpoint"
+    return LatestRecordDeduplicator(keys, order_by).deduplicate_into(source_table, target_table, checkpoint_dir)
+
+
+@DBAcademyHelper.monkey_patch
+def benchmark_deduplication(self, source, keys, order_by, join_keys=None, verify=True):
+    """
+    Measures ROW_NUMBER, GROUP BY joined back, and max_by on a table or DataFrame.
+
+    Example:
+        DA.benchmark_deduplication("users_dirty", keys=["email"], order_by="updated", join_keys=["user_id", "email"])
+
+    :param join_keys: grouping columns of the GROUP BY joined back, defaults to keys
+
+    :return: the DeduplicationBenchmark
+    """
+    df = spark.table(source) if isinstance(source, str) else source
+
+    benchmark = DeduplicationBenchmark(df, keys, order_by, join_keys=join_keys)
+    if verify: benchmark.verify()
+    benchmark.run()
+    benchmark.display_report()
+    return benchmark
+
+None
@@ -0,0 +1,261 @@
+# Databricks notebook source
+class FileIngestLedger:
+    """
+    Loads the files of a source directory into a Delta table exactly once, recording every file in a ledger table.
+
+    Each run lists the source, skips the files already in the ledger with the same size and modification
+    time, and splits the new ones into batches of similar total size: the largest files first, each to the
+    batch with the fewest bytes so far. Batches are loaded concurrently, with COPY INTO ... FILES = (...)
+    or with a DataFrame append, and each batch records its files in the ledger once committed, so a re-run
+    only lists the source and loads what is new. Failed batches are recorded too, and retried by the next run;
+    if the first batch of an empty target fails, the other batches are left to the next run too.
+
+      Attributes:
+          target_table: the Delta table to load
+          source_path: directory of the files
+          file_format: e.g. "PARQUET", "JSON" or "CSV"
+          ledger_table: Delta table of every file loaded, or failed to load, per target
+          mode: "copy_into" (default) or "append"
+          format_options: options of the reader, e.g. {"header": "true"} for CSV
+          batch_bytes: target size of a batch
+          max_files_per_batch: COPY INTO accepts at most 1000 files
+          max_concurrency: maximum number of batches loaded at once
+
+      Methods:
+          list_files(): the data files under source_path
+          get_new_files(): the files not loaded yet
+          get_batches(files): files split into size-balanced batches
+          ingest(): loads the new files and returns the ledger rows of this run
+          get_report(): files, bytes and seconds per batch of the last run
+    """
+
+    LEDGER_SCHEMA = "target_table STRING, path STRING, size BIGINT, modification_time BIGINT, batch_id STRING, status STRING, error STRING, seconds DOUBLE, ingested_at TIMESTAMP"
+
+    def __init__(self, target_table, source_path, file_format, ledger_table="ingest_ledger", mode="copy_into", format_options=None,
+                 batch_bytes=128*1024*1024, max_files_per_batch=1000, max_concurrency=4):
+        assert mode in ["copy_into", "append"], f"Expected the mode \"copy_into\" or \"append\", found \"{mode}\""
+
+        self.target_table = target_table
+        self.source_path = source_path.rstrip("/")
+        self.file_format = file_format.upper()
+        self.ledger_table = ledger_table
+        self.mode = mode
+        self.format_options = format_options or dict()
+        self.batch_bytes = batch_bytes
+        self.max_files_per_batch = min(max_files_per_batch, 1000)
+        self.max_concurrency = max_concurrency
+        self.results = []
+
+
+    def list_files(self, path=None):
+        """
+        Lists the data files recursively, skipping the hidden files readers ignore too, e.g. _SUCCESS.
+        """
+        files = []
+        for f in dbutils.fs.ls(path or self.source_path):
+            if f.name.startswith("_") or f.name.startswith("."): continue
+            if f.isDir(): files.extend(self.list_files(f.path))
+            else: files.append({"path": f.path, "size": f.size, "modification_time": getattr(f, "modificationTime", 0)})
+        return files
+
+
+    def get_loaded_files(self):
+        if not spark.catalog.tableExists(self.ledger_table): return set()
+
+        loaded = (spark.table(self.ledger_table)
+                       .filter((F.col("target_table") == self.target_table) & (F.col("status") == "ingested"))
+                       .select("path", "size", "modification_time"))
+        return {(r.path, r.size, r.modification_time) for r in loaded.collect()}
+
+
+    def get_new_files(self):
+        loaded = self.get_loaded_files()
+        return [f for f in self.list_files() if (f.get("path"), f.get("size"), f.get("modification_time")) not in loaded]
+
+
+    def get_batches(self, files):
+        """
+        Greedy size balancing: the number of batches follows from batch_bytes and max_files_per_batch.
+        """
+        import math
+
+        if len(files) == 0: return []
+
+        total = sum(f.get("size") for f in files)
+        count = max(math.ceil(total / self.batch_bytes), math.ceil(len(files) / self.max_files_per_batch), 1)
+        count = min(count, len(files))
+
+        batches = [{"files": [], "bytes": 0} for i in range(count)]
+        for f in sorted(files, key=lambda f: -f.get("size")):
+            open_batches = [b for b in batches if len(b.get("files")) < self.max_files_per_batch]
+            batch = min(open_batches, key=lambda b: b.get("bytes"))
+            batch["files"].append(f)
+            batch["bytes"] += f.get("size")
+
+        return [b.get("files") for b in batches if len(b.get("files")) > 0]
+
+
+    def get_relative_path(self, path):
+        # dbutils.fs.ls returns dbfs:/ paths whereas source_path may be given without the scheme
+        source = self.source_path.replace("dbfs:", "")
+        return path.replace("dbfs:", "").split(f"{source}/", 1)[-1]
+
+
+    def load_batch(self, files):
+        if self.mode == "append":
+            (spark.read
+                  .format(self.file_format.lower())
+                  .options(**self.format_options)
+                  .load([f.get("path") for f in files])
+                  .write
+                  .format("delta")
+                  .mode("append")
+                  .option("mergeSchema", True)
+                  .saveAsTable(self.target_table))
+            return
+
+        file_names = ", ".join(f"""'{self.get_relative_path(f.get("path"))}'""" for f in files)
+        format_options = ", ".join(f"'{k}' = '{v}'" for k, v in self.format_options.items())
+        spark.sql(f"""
+            COPY INTO {self.target_table}
+            FROM '{self.source_path}'
+            FILEFORMAT = {self.file_format}
+            FILES = ({file_names})
+            {f"FORMAT_OPTIONS ({format_options})" if len(format_options) > 0 else ""}
+            COPY_OPTIONS ('mergeSchema' = 'true')
+            """)
+
+
+    def run_batch(self, files):
+        """
+        Loads one batch and records its ledger rows as soon as it commits; a failure is recorded instead of raised.
+
+        :return: the ledger rows of the batch
+        """
+        import time, uuid, datetime
+
+        batch_id = uuid.uuid4().hex
+        start = time.time()
+        try:
+            self.load_batch(files)
+            status, error = "ingested", None
+        except Exception as e:
+            status, error = "failed", str(e)[:1000]
+        seconds = time.time() - start
+
+        # Every file of a batch commits together, so its latency is that of the batch
+        ingested_at = datetime.datetime.now()
+        rows = [(self.target_table, f.get("path"), f.get("size"), f.get("modification_time"), batch_id, status, error, seconds, ingested_at) for f in files]
+
+        # Recorded per batch, so that an interrupted run does not load the committed batches again
+        self.record(rows)
+        return rows
+
+
+    def create_ledger(self):
+        # Created once before the batches, whose concurrent appends to an existing table do not conflict
+        spark.sql(f"CREATE TABLE IF NOT EXISTS {self.ledger_table} ({FileIngestLedger.LEDGER_SCHEMA}) USING DELTA")
+
+
+    def record(self, rows):
+        spark.createDataFrame(rows, FileIngestLedger.LEDGER_SCHEMA).write.format("delta").mode("append").saveAsTable(self.ledger_table)
+
+
+    def ingest(self):
+        """
+        Loads the files not in the ledger yet.
+
+        :return: the ledger rows of this run, as dictionaries
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.results = []
+        batches = self.get_batches(self.get_new_files())
+        if len(batches) == 0:
+            print(f"No new files to load into {self.target_table}")
+            return self.results
+
+        print(f"""Loading {sum(len(b) for b in batches):,} new file(s) into {self.target_table} in {len(batches)} batch(es)""", end="...")
+
+        self.create_ledger()
+
+        # With COPY INTO, the first batch sets the schema of an empty table; concurrent schema changes would conflict
+        if self.mode == "copy_into":
+            spark.sql(f"CREATE TABLE IF NOT EXISTS {self.target_table}")
+            creates_target = len(spark.table(self.target_table).columns) == 0
+        else:
+            creates_target = not spark.catalog.tableExists(self.target_table)
+
+        if creates_target:
+            self.results.append(self.run_batch(batches.pop(0)))
+
+        # Without the schema of the first batch, the other batches would race to set it; the next run retries them all
+        if creates_target and self.results[0][0][5] == "failed":
+            print(f"""the first batch failed, skipping the other {len(batches)} batch(es): {self.results[0][0][6]}""")
+            batches = []
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            self.results.extend(executor.map(self.run_batch, batches))
+
+        rows = [row for batch in self.results for row in batch]
+
+        failed = len([r for r in rows if r[5] == "failed"])
+        print(f"""{len(rows) - failed:,} loaded, {failed:,} failed""")
+
+        columns = [c.strip().split(" ")[0] for c in FileIngestLedger.LEDGER_SCHEMA.split(",")]
+        return [dict(zip(columns, r)) for r in rows]
+
+
+    def get_report(self):
+        report = []
+        for batch in self.results:
+            report.append({
+                "batch_id": batch[0][4],
+                "status": batch[0][5],
+                "files": len(batch),
+                "bytes": sum(r[2] for r in batch),
+                "seconds": batch[0][7],
+            })
+        return report
+
+
+    def display_report(self):
+        report = self.get_report()
+        if len(report) == 0:
+            print("No batches to report; call ingest() first.")
+            return
+
+        html = """<table style="width:100%"><tr>"""
+        for key in report[0].keys(): html += f"""<th style="text-align:left">{key}</th>"""
+        html += "</tr>"
+        for row in report:
+            html += "<tr>"
+            for value in row.values():
+                html += f"""<td>{value:,.2f}</td>""" if type(value) is float else f"""<td>{value}</td>"""
+            html += "</tr>"
+        html += "</table>"
+        displayHTML(html)
+
+None
+
+# COMMAND ----------
+
+@DBAcademyHelper.monkey_patch
+def ingest_new_files(self, target_table, source_path, file_format, mode="copy_into", **options):
+    """
+    Loads the files of source_path not loaded into target_table yet, recording each file in the ledger.
+
+    Example:
+        DA.ingest_new_files("sales_ingested", f"{DA.paths.datasets}/ecommerce/raw/sales-30m", "PARQUET")
+
+    See also FileIngestLedger
+
+    :param options: other constructor arguments of FileIngestLedger, e.g. format_options or max_concurrency
+    :return: the FileIngestLedger
+    """
+    ledger = FileIngestLedger(target_table, source_path, file_format, mode=mode, **options)
+    ledger.ingest()
+    ledger.display_report()
+    return ledger
+
+None
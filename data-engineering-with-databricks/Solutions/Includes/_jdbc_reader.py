@@ -0,0 +1,213 @@
+# Databricks notebook source
+import math
+
+class JdbcSourcePool:
+    """
+    Shares the connection properties, the tuned fetch size and the column statistics of each JDBC source,
+    so that every read of the same source reuses them instead of re-querying the database.
+
+      Attributes:
+          sources: {url: connection properties}
+          fetch_sizes: {(url, table): tuned fetch size}
+          statistics: {(url, table, column, buckets): statistics}
+
+      Methods:
+          register(url, **properties): declares the connection properties of a source, e.g. user and password
+          get_properties(url, fetch_size=None): returns a copy of the properties, with the fetch size if provided
+          tune_fetch_size(url, table): derives a fetch size from the width of the table's rows
+    """
+
+    # Most drivers' defaults are far too small for bulk reads, e.g. Oracle fetches 10 rows per round trip
+    MIN_FETCH_SIZE = 100
+    MAX_FETCH_SIZE = 100000
+    FETCH_BYTES = 8 * 1024 * 1024
+
+    def __init__(self):
+        self.sources = dict()
+        self.fetch_sizes = dict()
+        self.statistics = dict()
+
+
+    def register(self, url, **properties):
+        properties = {k: str(v) for k, v in properties.items()}
+        if self.sources.get(url) == properties: return
+
+        self.sources[url] = properties
+        # Cached values may have been computed with different credentials
+        self.fetch_sizes = {k: v for k, v in self.fetch_sizes.items() if k[0] != url}
+        self.statistics = {k: v for k, v in self.statistics.items() if k[0] != url}
+
+
+    def get_properties(self, url, fetch_size=None):
+        properties = dict(self.sources.get(url, dict()))
+        if fetch_size is not None: properties["fetchsize"] = str(fetch_size)
+        return properties
+
+
+    def tune_fetch_size(self, url, table):
+        """
+        Returns the number of rows that fit in FETCH_BYTES, based on the default size of each column's type.
+
+        Only the schema is resolved, which issues a "WHERE 1=0" query rather than reading any rows.
+        """
+        key = (url, table)
+        if key not in self.fetch_sizes:
+            schema = spark.read.jdbc(url, table, properties=self.get_properties(url)).schema
+            row_bytes = max(1, sum(f.dataType.defaultSize() for f in schema.fields))
+            self.fetch_sizes[key] = max(JdbcSourcePool.MIN_FETCH_SIZE, min(JdbcSourcePool.MAX_FETCH_SIZE, JdbcSourcePool.FETCH_BYTES // row_bytes))
+        return self.fetch_sizes[key]
+
+jdbc_source_pool = JdbcSourcePool()
+
+None
+
+# COMMAND ----------
+
+class PartitionedJdbcReader:
+    """
+    Reads a JDBC table in parallel without hand-picked lowerBound, upperBound and numPartitions.
+
+    The bounds and row count of the partition column are queried from the database, and the number of
+    partitions is derived from the row count. With histogram_buckets, the column's quantiles are queried
+    too (NTILE over the column), and the table is read with one predicate per range of equal row counts,
+    which keeps skewed columns from producing a few oversized partitions.
+
+    Planning is separated from reading: plan(statistics) only needs the statistics dictionary, so it can be
+    checked against a local SQLite database, or no database at all.
+
+      Attributes:
+          url: JDBC URL, e.g. f"jdbc:sqlite:{DA.paths.ecommerce_db}"
+          table: table to read
+          column: numeric partition column
+          rows_per_partition: target number of rows per partition
+          max_partitions: upper bound on the number of partitions, i.e. on concurrent connections
+          histogram_buckets: number of quantiles to query for skew-aware predicates, 0 to use Spark's even strides
+          pool: JdbcSourcePool providing the connection properties, fetch size and cached statistics
+
+      Methods:
+          get_statistics(): queries (or returns the cached) min, max, row count and quantiles of the column
+          plan(statistics=None): returns the partitioning as keyword arguments of spark.read.jdbc
+          read(): returns the DataFrame
+    """
+
+    def __init__(self, url, table, column, rows_per_partition=250000, max_partitions=None, histogram_buckets=0, fetch_size=None, pool=None):
+        self.url = url
+        self.table = table
+        self.column = column
+        self.rows_per_partition = rows_per_partition
+        self.max_partitions = max_partitions or spark.sparkContext.defaultParallelism * 2
+        self.histogram_buckets = histogram_buckets
+        self.fetch_size = fetch_size
+        self.pool = pool or jdbc_source_pool
+
+
+    def query(self, sql):
+        return (spark.read
+                     .format("jdbc")
+                     .option("url", self.url)
+                     .option("query", sql)
+                     .options(**self.pool.get_properties(self.url))
+                     .load()
+                     .collect())
+
+
+    def get_statistics(self):
+        """
+        :return: {"lower": min, "upper": max, "row_count": count, "quantiles": upper bounds of each NTILE bucket}
+        """
+        key = (self.url, self.table, self.column, self.histogram_buckets)
+        if key in self.pool.statistics: return self.pool.statistics[key]
+
+        row = self.query(f"SELECT MIN({self.column}) AS lower, MAX({self.column}) AS upper, COUNT(*) AS row_count FROM {self.table}")[0]
+        statistics = {"lower": row["lower"], "upper": row["upper"], "row_count": row["row_count"], "quantiles": []}
+
+        if self.histogram_buckets > 1 and statistics["row_count"] > 0:
+            rows = self.query(f"""SELECT bucket, MAX({self.column}) AS upper
+                                  FROM (SELECT {self.column}, NTILE({self.histogram_buckets}) OVER (ORDER BY {self.column}) AS bucket
+                                        FROM {self.table}
+                                        WHERE {self.column} IS NOT NULL) buckets
+                                  GROUP BY bucket""")
+            statistics["quantiles"] = [r["upper"] for r in sorted(rows, key=lambda r: r["bucket"])]
+
+        self.pool.statistics[key] = statistics
+        return statistics
+
+
+    def get_partition_count(self, row_count):
+        return max(1, min(self.max_partitions, math.ceil(row_count / self.rows_per_partition)))
+
+
+    def plan(self, statistics=None):
+        """
+        Returns either {"column", "lowerBound", "upperBound", "numPartitions"} for Spark's even strides,
+        or {"predicates"} with one range of roughly equal row counts per partition.
+        """
+        statistics = statistics or self.get_statistics()
+        partitions = self.get_partition_count(statistics["row_count"] or 0)
+
+        if statistics["lower"] is None or partitions == 1:
+            return {"predicates": ["1=1"]}
+
+        quantiles = statistics.get("quantiles") or []
+        if len(quantiles) == 0:
+            return {"column": self.column, "lowerBound": statistics["lower"], "upperBound": statistics["upper"], "numPartitions": partitions}
+
+        # Merge the quantiles into the wanted number of partitions, dropping duplicate boundaries of skewed values
+        step = len(quantiles) / partitions
+        boundaries = sorted(set(quantiles[max(0, min(len(quantiles), round(step * i)) - 1)] for i in range(1, partitions)))
+        boundaries = [b for b in boundaries if b != statistics["upper"]]
+
+        # Every quantile is the maximum: a single value holds most of the rows, which no range can split
+        if len(boundaries) == 0:
+            return {"predicates": ["1=1"]}
+
+        predicates = []
+        lower = None
+        for upper in boundaries + [None]:
+            conditions = []
+            if lower is not None: conditions.append(f"{self.column} > {PartitionedJdbcReader.to_literal(lower)}")
+            if upper is not None: conditions.append(f"{self.column} <= {PartitionedJdbcReader.to_literal(upper)}")
+            predicate = " AND ".join(conditions)
+            if lower is None: predicate = f"({predicate} OR {self.column} IS NULL)"
+            predicates.append(predicate)
+            lower = upper
+
+        return {"predicates": predicates}
+
+
+    @staticmethod
+    def to_literal(value):
+        import decimal
+        if type(value) in [int, float, decimal.Decimal]: return str(value)
+        return "'" + str(value).replace("'", "''") + "'"
+
+
+    def read(self):
+        fetch_size = self.fetch_size or self.pool.tune_fetch_size(self.url, self.table)
+        properties = self.pool.get_properties(self.url, fetch_size)
+        return spark.read.jdbc(self.url, self.table, properties=properties, **self.plan())
+
+None
+
+# COMMAND ----------
+
+@DBAcademyHelper.monkey_patch
+def read_jdbc(self, url, table, column, properties=None, rows_per_partition=250000, max_partitions=None, histogram_buckets=0, fetch_size=None):
+    """
+    Reads a JDBC table partitioned on column, with bounds, partition count and fetch size derived from the source.
+
+    Example:
+        users_df = DA.read_jdbc(f"jdbc:sqlite:{DA.paths.ecommerce_db}", "users", "user_first_touch_timestamp", histogram_buckets=64)
+
+    See also PartitionedJdbcReader
+
+    :param properties: connection properties, e.g. {"user": ..., "password": ...}; registered with the shared pool
+    :return: the DataFrame
+    """
+    if properties is not None: jdbc_source_pool.register(url, **properties)
+
+    reader = PartitionedJdbcReader(url, table, column, rows_per_partition=rows_per_partition, max_partitions=max_partitions,
+                                   histogram_buckets=histogram_buckets, fetch_size=fetch_size)
+    return reader.read()
+
+None
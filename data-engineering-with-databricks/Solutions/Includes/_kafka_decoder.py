@@ -0,0 +1,127 @@
+# Databricks notebook source
+class KafkaEventDecoder:
+    """
+    Decodes the Kafka records of events-kafka into a partitioned Delta bronze table, once.
+
+    The payload schema is inferred from a sample of the value column the first time and pinned as DDL,
+    so later runs parse value with a known schema instead of inferring it. Each run parses only the records
+    whose offset is beyond the highest offset already ingested for their Kafka partition, and appends them
+    in a single projection: metadata columns plus the payload's fields.
+
+      Attributes:
+          source_path: directory of the raw Kafka records, e.g. DA.paths.kafka_events
+          table_name: the bronze table, partitioned by the Kafka partition
+          schema_path: file holding the pinned payload schema
+          sample_rows: number of values sampled to infer the payload schema
+
+      Methods:
+          get_schema(): returns the pinned DDL of the payload, inferring and persisting it on first use
+          decode(raw_df): parses a DataFrame of raw records into bronze rows
+          ingest(): appends the records not yet in the bronze table and returns their count
+    """
+
+    RAW_SCHEMA = "key BINARY, offset BIGINT, partition INT, timestamp BIGINT, topic STRING, value BINARY"
+    METADATA_COLUMNS = ["key", "offset", "partition", "timestamp", "topic"]
+
+    def __init__(self, source_path, table_name, schema_path, sample_rows=10000):
+        self.source_path = source_path
+        self.table_name = table_name
+        self.schema_path = schema_path
+        self.sample_rows = sample_rows
+        self.ddl = None
+
+
+    def read_raw(self):
+        return spark.read.schema(KafkaEventDecoder.RAW_SCHEMA).json(self.source_path)
+
+
+    def get_schema(self):
+        """
+        Returns the payload DDL, reading it from schema_path or, on first use, inferring it from a sample of values.
+        """
+        if self.ddl is not None: return self.ddl
+
+        try:
+            self.ddl = dbutils.fs.head(self.schema_path, 1024*1024)
+        except Exception:
+            values = self.read_raw().select(F.col("value").cast("string").alias("value")).limit(self.sample_rows)
+            self.ddl = spark.read.json(values.rdd.map(lambda r: r.value))._jdf.schema().toDDL()
+            dbutils.fs.put(self.schema_path, self.ddl, True)
+
+        return self.ddl
+
+
+    def decode(self, raw_df):
+        """
+        Parses value with the pinned schema; the key is decoded to a string and the payload's fields become columns.
+        """
+        payload = F.from_json(F.col("value").cast("string"), self.get_schema())
+        decoded = raw_df.select(F.col("key").cast("string").alias("key"),
+                                *KafkaEventDecoder.METADATA_COLUMNS[1:],
+                                payload.alias("payload"))
+        return decoded.select(*KafkaEventDecoder.METADATA_COLUMNS, "payload.*")
+
+
+    def get_watermarks(self):
+        """
+        Returns a DataFrame of the highest ingested offset per Kafka partition, empty before the first run.
+        """
+        if not spark.catalog.tableExists(self.table_name):
+            return spark.createDataFrame([], "partition INT, max_offset BIGINT")
+        return spark.table(self.table_name).groupBy("partition").agg(F.max("offset").alias("max_offset"))
+
+
+    def ingest(self):
+        """
+        Appends the records beyond each partition's watermark to the bronze table.
+
+        :return: the number of records appended
+        """
+        watermarks = self.get_watermarks()
+        new_records = (self.read_raw()
+                           .join(F.broadcast(watermarks), "partition", "left")
+                           .filter(F.col("max_offset").isNull() | (F.col("offset") > F.col("max_offset")))
+                           .drop("max_offset"))
+
+        bronze_df = self.decode(new_records).cache()
+        try:
+            count = bronze_df.count()
+            if count > 0 or not spark.catalog.tableExists(self.table_name):
+                (bronze_df.write
+                          .format("delta")
+                          .mode("append")
+                          .partitionBy("partition")
+                          .saveAsTable(self.table_name))
+        finally:
+            bronze_df.unpersist()
+
+        print(f"Appended {count:,} records to {self.table_name}")
+        return count
+
+None
+
+# COMMAND ----------
+
+@DBAcademyHelper.monkey_patch
+def decode_kafka_events(self, table_name="events_bronze", source_path=None):
+    """
+    Incrementally decodes the Kafka records into a partitioned Delta bronze table.
+
+    Example:
+        DA.decode_kafka_events("events_bronze")
+
+    See also KafkaEventDecoder
+
+    :param table_name: the bronze table to append to
+    :param source_path: overrides self.paths.kafka_events (optional)
+    :return: the KafkaEventDecoder, whose pinned schema can be reused, e.g. by from_json in SQL
+    """
+    if source_path is None: source_path = self.paths.kafka_events
+
+    decoder = KafkaEventDecoder(source_path=source_path,
+                                table_name=table_name,
+                                schema_path=f"{self.paths.working_dir}/kafka_schema/{table_name}.ddl")
+    decoder.ingest()
+    return decoder
+
+None
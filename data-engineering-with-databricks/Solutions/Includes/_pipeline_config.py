@@ -1,14 +1,81 @@
 # Databricks notebook source
+# MAGIC %run ./_pipeline_regression
+
+# COMMAND ----------
+
 from dbacademy import dbgems
 
+class ClusterProfile:
+    """
+    Sizing of one pipeline cluster, identified by its label.
+
+      Attributes:
+          label: "default" for update clusters, "maintenance" for the maintenance cluster
+          num_workers: fixed number of workers, used when max_workers is not set; 0 is single-node
+          min_workers, max_workers: autoscaling range; setting max_workers enables autoscaling
+          autoscale_mode: "ENHANCED" (default) or "LEGACY"
+
+      Methods:
+          is_single_node(): True if the cluster has no workers and does not autoscale
+          get_cluster_settings(policy=None): returns the cluster definition for the pipeline settings
+    """
+
+    AUTOSCALE_MODES = ["ENHANCED", "LEGACY"]
+
+    def __init__(self, label="default", num_workers=0, min_workers=None, max_workers=None, autoscale_mode="ENHANCED"):
+        if max_workers is None:
+            assert min_workers is None, f"min_workers requires max_workers for the \"{label}\" cluster"
+            assert num_workers >= 0, f"Expected num_workers >= 0 for the \"{label}\" cluster, found {num_workers}"
+        else:
+            if min_workers is None: min_workers = 1
+            assert 0 < min_workers <= max_workers, f"Expected 0 < min_workers <= max_workers for the \"{label}\" cluster, found {min_workers} and {max_workers}"
+            assert autoscale_mode in ClusterProfile.AUTOSCALE_MODES, f"Expected autoscale_mode to be one of {ClusterProfile.AUTOSCALE_MODES}, found {autoscale_mode}"
+
+        self.label = label
+        self.num_workers = num_workers
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.autoscale_mode = autoscale_mode
+
+
+    def is_autoscaling(self):
+        return self.max_workers is not None
+
+
+    def is_single_node(self):
+        return not self.is_autoscaling() and self.num_workers == 0
+
+
+    def get_cluster_settings(self, policy=None):
+        """
+        Returns the cluster definition, with either num_workers or autoscale, and the policy if provided.
+        """
+        cluster = {"label": self.label}
+        if self.is_autoscaling():
+            cluster["autoscale"] = {"min_workers": self.min_workers, "max_workers": self.max_workers, "mode": self.autoscale_mode}
+        else:
+            cluster["num_workers"] = self.num_workers
+        if policy: cluster["policy_id"] = policy.get("policy_id")
+        return cluster
+
+
+    def describe(self):
+        if self.is_autoscaling():
+            return f"{self.min_workers} to {self.max_workers} workers ({self.autoscale_mode.lower()} autoscaling)"
+        return f"{self.num_workers} workers"
+
+None
+
+# COMMAND ----------
+
 class PipelineConfig:
     """
     Represents pipeline settings with option to provide as JSON definition.
 
       Attributes:
-          Configurable: name, storage, target, configuration, notebooks, policy
-          Auto-generated: libraries (from notebooks), clusters (from policy)
-          Non-configurable: continuous (False), development (True), photon (False)
+          Configurable: name, storage, target, configuration, notebooks, policy,
+                        continuous (default False), development (default True), photon (default False)
+          Auto-generated: libraries (from notebooks), clusters (from cluster_profiles and policy)
 
       Methods:
           get_pipeline_settings(convert_to_json=False): 
@@ -19,19 +86,19 @@ class PipelineConfig:
 
     """
 
-    def __init__(self, name, notebooks, configuration, storage, target, policy=None, photon=False):
+    def __init__(self, name, notebooks, configuration, storage, target, policy=None, photon=False, continuous=False, development=True, cluster_profiles=None):
         """
         Defines PipelineConfig attributes.    
 
             Use input values to set attributes: name, storage, target
 
             Modify input values to set attributes:
-                configuration: add "spark.master": "local[*]" to configuration
+                configuration: add "spark.master": "local[*]" to configuration when every cluster is single-node
                 notebooks: convert to list of notebook paths
                 libraries: create list of dictionaries from notebook paths
-                clusters: create based on policy
+                clusters: create from cluster_profiles (default: one single-node ClusterProfile) and policy
             
-            Use default values to set attributes:
+            Use input values, or their defaults, to set attributes:
                 continuous: False
                 development: True
                 photon: False
@@ -39,7 +106,15 @@ class PipelineConfig:
         self.name = name
         self.storage = storage
         self.target = target
-        self.configuration = {**configuration, "spark.master": "local[*]"}
+        self.cluster_profiles = cluster_profiles or [ClusterProfile()]
+
+        labels = [p.label for p in self.cluster_profiles]
+        assert len(labels) == len(set(labels)), f"Expected unique cluster labels, found {labels}"
+
+        if self.is_single_node():
+            self.configuration = {**configuration, "spark.master": "local[*]"}
+        else:
+            self.configuration = dict(configuration)
 
         basepath = dbgems.get_notebook_dir()
 
@@ -47,17 +122,20 @@ class PipelineConfig:
         self.libraries = [{"notebook": {"path": n}} for n in self.notebooks]
         self.policy = policy
     
-        if policy:
-            clusters = [{"num_workers": 0, "policy_id": policy.get("policy_id")}]
-        else:
-            clusters = [{"num_workers": 0}]
-        self.clusters = clusters
+        self.clusters = [p.get_cluster_settings(policy) for p in self.cluster_profiles]
             
-        self.continuous = False
-        self.development = True
+        self.continuous = continuous
+        self.development = development
         self.photon = photon
 
 
+    def is_single_node(self):
+        """
+        Returns True if every cluster profile is single-node, in which case "spark.master" is set to "local[*]".
+        """
+        return all(p.is_single_node() for p in self.cluster_profiles)
+
+
     def get_pipeline_settings(self, convert_to_json=False):
         """
         Returns pipeline settings as dictonary or JSON string.
@@ -101,6 +179,9 @@ class PipelineConfig:
                 Notebook #1 Path: <path>
                 Notebook #2 Path: <path>
 
+            Cluster sizing, unless the pipeline runs on the default single-node cluster:
+                Cluster "<label>": <sizing>
+
         See also DBAcademyHelper.display_config_values
         """
 
@@ -115,6 +196,10 @@ class PipelineConfig:
             
         for i, path in enumerate(self.notebooks):
             config_values.append((f"Notebook #{i+1} Path", path))
+
+        if not self.is_single_node() or len(self.cluster_profiles) > 1:
+            for profile in self.cluster_profiles:
+                config_values.append((f"Cluster \"{profile.label}\"", profile.describe()))
             
         return config_values
 
@@ -125,7 +210,7 @@ None
 # Define helper functions to configure, create, and trigger pipelines with DBAcademyHelper
 
 @DBAcademyHelper.monkey_patch
-def configure_pipeline(self, notebooks, name=None, source=None, configuration=None, photon=False):
+def configure_pipeline(self, notebooks, name=None, source=None, configuration=None, photon=False, cluster_profiles=None):
     """
     Creates PipelineConfig object for provided notebooks and optional settings.
     Defines parameter values using DBAcademyHelper:
@@ -140,6 +225,7 @@ def configure_pipeline(self, notebooks, name=None, source=None, configuration=No
     :param source (str): value for "source" configuration property
     :param configuration (dict): overrides source to include more than one "source" configuration property (optional)
     :param name (str): overrides self.pipeline_name to create pipeline name
+    :param cluster_profiles (list): ClusterProfile per cluster label, defaults to one single-node cluster (optional)
     """
     
     notebooks = [f"Pipeline/{f}" for f in notebooks]
@@ -162,7 +248,8 @@ def configure_pipeline(self, notebooks, name=None, source=None, configuration=No
         storage=self.paths.storage_location,
         target=self.schema_name,
         policy=self.get_dlt_policy(),
-        photon=photon
+        photon=photon,
+        cluster_profiles=cluster_profiles
     )
 
 @DBAcademyHelper.monkey_patch
@@ -245,10 +332,13 @@ def create_pipeline_from_settings(self, settings):
 
 
 @DBAcademyHelper.monkey_patch
-def start_pipeline(self, pipeline_id=None, blocking=True):
+def start_pipeline(self, pipeline_id=None, blocking=True, regression_threshold=None):
     """
     Starts the pipeline and then blocks until it has completed, failed or was canceled
     :param pipeline_id: overrides self.pipeline_id to identify pipeline (optional)
+    :param regression_threshold: if provided, assert that no flow's runtime or rows-per-second regressed
+                                 beyond this fraction of its rolling baseline (requires blocking)
+    See also DBAcademyHelper.assert_no_pipeline_regressions
     """
     import time
     from dbacademy.dbrest import DBAcademyRestClient
@@ -275,6 +365,9 @@ def start_pipeline(self, pipeline_id=None, blocking=True):
 
       assert state == "COMPLETED", f"Expected the state to be COMPLETED, found {state}"
 
+      if regression_threshold is not None:
+          self.assert_no_pipeline_regressions(update_id, threshold=regression_threshold)
+
     else:
       print(f"The current state is {state}.")
       
@@ -289,8 +382,8 @@ def validate_pipeline_config(self, config, display=True):
     - validate pipeline with name exists
     - validate settings for storage, target
     - validate libraries has correct count, includes each notebook
-    - validate configuration parameters for source, spark.master
-    - validate cluster settings: cluster count, autoscaling disabled, cluster policy, worker count
+    - validate configuration parameters for source, spark.master (set only for single-node pipelines)
+    - validate cluster settings per ClusterProfile: cluster count, label, autoscaling range and mode or worker count, cluster policy
     - validate settings for development mode, current channel, pipeline triggered mode
 
     :param config: PipelineConfig to identify and validate pipeline
@@ -330,47 +423,78 @@ def validate_pipeline_config(self, config, display=True):
     hint += "</ul>"
     suite.test(test_function=test_notebooks, actual_value=libraries, description="Configure the Notebook library.", hint=hint)
 
-    # validate configuration parameters: source, spark.master
+    # validate configuration parameters: source, spark.master (single-node pipelines only)
     suite.test_equals(lambda: spec.get("configuration", {}).get("source"), config.configuration.get("source"), 
                       description=f"Set the \"<b>source</b>\" configuration parameter to \"<b>{config.configuration.get('source')}</b>\".", 
                       hint=f"Found \"<b>[[ACTUAL_VALUE]]</b>\".")
-    suite.test_equals(lambda: spec.get("configuration", {}).get("spark.master"), "local[*]", 
-                      description=f"Set the \"<b>spark.master</b>\" configuration parameter to \"<b>local[*]</b>\".", 
-                      hint=f"Found \"<b>[[ACTUAL_VALUE]]</b>\".")
+    if config.is_single_node():
+        suite.test_equals(lambda: spec.get("configuration", {}).get("spark.master"), "local[*]", 
+                          description=f"Set the \"<b>spark.master</b>\" configuration parameter to \"<b>local[*]</b>\".", 
+                          hint=f"Found \"<b>[[ACTUAL_VALUE]]</b>\".")
+    else:
+        suite.test_is_none(lambda: spec.get("configuration", {}).get("spark.master"), 
+                           description=f"Remove the \"<b>spark.master</b>\" configuration parameter from multi-node pipelines.")
     # suite.test_length(lambda: spec.get("configuration", {}), 2, description=f"Set the two configuration parameters.", hint=f"Found [[LEN_ACTUAL_VALUE]] configuration parameter(s).")                      
 
-    # validate cluster settings: cluster count, autoscaling disabled, cluster policy, worker count
-    suite.test_length(lambda: spec.get("clusters"), expected_length=1, 
-                      description=f"Expected one and only one cluster definition.", 
-                      hint="Edit the config via the JSON interface to remove the second+ cluster definitions")
-    suite.test_is_none(lambda: spec.get("clusters")[0].get("autoscale"), description=f"Autoscaling should be disabled.")
+    # validate cluster settings per profile: cluster count, label, autoscaling or worker count, cluster policy
+    clusters = {c.get("label", "default"): c for c in spec.get("clusters", [])}
+    suite.test_length(lambda: spec.get("clusters"), expected_length=len(config.cluster_profiles), 
+                      description=f"Expected {len(config.cluster_profiles)} cluster definition(s).", 
+                      hint=f"Found [[LEN_ACTUAL_VALUE]]; edit the config via the JSON interface to match the cluster labels {[p.label for p in config.cluster_profiles]}")
 
-    def test_cluster_policy():
-        cluster = spec.get("clusters")[0]
+    def test_cluster_policy(label):
+        cluster = clusters.get(label, {})
         policy_id = cluster.get("policy_id")
         if policy_id is None: common.print_warning("WARNING: Policy Not Set", 
-                                                   f"Expected the policy to be set to \"{ClustersHelper.POLICY_DLT_ONLY}\".")
+                                                   f"Expected the policy of the \"{label}\" cluster to be set to \"{ClustersHelper.POLICY_DLT_ONLY}\".")
         else:
             policy_name = self.client.cluster_policies.get_by_id(policy_id).get("name")
             if policy_id != self.get_dlt_policy().get("policy_id"):
                 common.print_warning("WARNING: Incorrect Policy", 
-                                     f"Expected the policy to be set to \"{ClustersHelper.POLICY_DLT_ONLY}\", found \"{policy_name}\".")
+                                     f"Expected the policy of the \"{label}\" cluster to be set to \"{ClustersHelper.POLICY_DLT_ONLY}\", found \"{policy_name}\".")
         return True
 
-    suite.test(test_function=test_cluster_policy, actual_value=None, 
-               description=f"The cluster policy should be <b>\"{ClustersHelper.POLICY_DLT_ONLY}\"</b>.")
-    suite.test_equals(lambda: spec.get("clusters")[0].get("num_workers"), 0, 
-                      description=f"The number of spark workers should be <b>0</b>.", hint=f"Found [[ACTUAL_VALUE]] workers.")
+    for profile in config.cluster_profiles:
+        cluster = clusters.get(profile.label, {})
+        suite.test_true(lambda label=profile.label: label in clusters, 
+                        description=f"Define the cluster labeled \"<b>{profile.label}</b>\".")
+
+        if profile.is_autoscaling():
+            autoscale = cluster.get("autoscale") or {}
+            suite.test_equals(lambda autoscale=autoscale: autoscale.get("min_workers"), profile.min_workers, 
+                              description=f"The minimum number of workers of the \"<b>{profile.label}</b>\" cluster should be <b>{profile.min_workers}</b>.", 
+                              hint=f"Found [[ACTUAL_VALUE]] workers.")
+            suite.test_equals(lambda autoscale=autoscale: autoscale.get("max_workers"), profile.max_workers, 
+                              description=f"The maximum number of workers of the \"<b>{profile.label}</b>\" cluster should be <b>{profile.max_workers}</b>.", 
+                              hint=f"Found [[ACTUAL_VALUE]] workers.")
+            suite.test_equals(lambda autoscale=autoscale: (autoscale.get("mode") or "LEGACY").upper(), profile.autoscale_mode, 
+                              description=f"The autoscaling mode of the \"<b>{profile.label}</b>\" cluster should be \"<b>{profile.autoscale_mode.title()}</b>\".", 
+                              hint=f"Found \"<b>[[ACTUAL_VALUE]]</b>\".")
+        else:
+            suite.test_is_none(lambda cluster=cluster: cluster.get("autoscale"), 
+                               description=f"Autoscaling of the \"<b>{profile.label}</b>\" cluster should be disabled.")
+            suite.test_equals(lambda cluster=cluster: cluster.get("num_workers"), profile.num_workers, 
+                              description=f"The number of spark workers of the \"<b>{profile.label}</b>\" cluster should be <b>{profile.num_workers}</b>.", 
+                              hint=f"Found [[ACTUAL_VALUE]] workers.")
+
+        suite.test(test_function=lambda label=profile.label: test_cluster_policy(label), actual_value=None, 
+                   description=f"The cluster policy of the \"<b>{profile.label}</b>\" cluster should be <b>\"{ClustersHelper.POLICY_DLT_ONLY}\"</b>.")
 
     # validate pipeline development mode, current channel, pipeline triggered mode
-    suite.test_true(lambda: spec.get("development") != self.is_smoke_test(), 
-                    description=f"The pipeline mode should be set to \"<b>Development</b>\".")
+    # Smoke tests run the pipeline in production mode
+    expected_development = config.development and not self.is_smoke_test()
+    expected_mode = "Development" if expected_development else "Production"
+    smoke_test = " for smoke tests" if self.is_smoke_test() else ""
+    suite.test_equals(lambda: bool(spec.get("development")), expected_development, 
+                      description=f"The pipeline mode should be set to \"<b>{expected_mode}</b>\"{smoke_test}.", 
+                      hint=f"Found development set to \"<b>[[ACTUAL_VALUE]]</b>\".")
     suite.test(test_function=lambda: {spec.get("channel") is None or spec.get("channel").upper() == "CURRENT"}, 
                actual_value=spec.get("channel"), 
                description=f"The channel should be set to \"<b>Current</b>\".", hint=f"Found \"<b>[[ACTUAL_VALUE]]</b>\"")
-    suite.test_false(lambda: spec.get("continuous"), 
-                     description=f"Expected the Pipeline mode to be \"<b>Triggered</b>\".", 
-                     hint=f"Found \"<b>Continuous</b>\".")
+    pipeline_mode, other_mode = ("Continuous", "Triggered") if config.continuous else ("Triggered", "Continuous")
+    suite.test_equals(lambda: bool(spec.get("continuous")), config.continuous, 
+                      description=f"Expected the Pipeline mode to be \"<b>{pipeline_mode}</b>\".", 
+                      hint=f"Found \"<b>{other_mode}</b>\".")
 
     # validate photon enabled
     # suite.test_true(lambda: spec.get("photon"), description=f"Photon should be enabled.")                     
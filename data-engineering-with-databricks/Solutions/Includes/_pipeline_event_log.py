@@ -0,0 +1,290 @@
+# Databricks notebook source
+from dbacademy import dbgems
+
+class PipelineEventLog:
+    """
+    Incrementally ingests a DLT event log into compact fact tables.
+
+      Attributes:
+          event_log_path: path to the pipeline's event log, usually {storage_location}/system/events
+          checkpoint_dir: streaming checkpoint used to track the last Delta version ingested
+          table_prefix: prefix of the materialized fact tables
+
+      Fact tables (all keyed by update_id):
+          {table_prefix}_flow_progress: one row per flow_progress event
+          {table_prefix}_table_throughput: rows written per dataset, partial sums per ingested batch
+          {table_prefix}_expectations: passed and failed records per expectation, partial sums per ingested batch
+          {table_prefix}_update_progress: one row per update_progress state transition
+
+      Methods:
+          refresh(): ingests the events appended since the last checkpointed version
+          get_metrics(update_id): returns flow, table, expectation and phase metrics for one update
+          get_flow_history(): returns per-flow duration and row counts for every ingested update
+
+    """
+
+    TERMINAL_STATES = ["COMPLETED", "FAILED", "CANCELED"]
+
+    def __init__(self, event_log_path, checkpoint_dir, table_prefix="event_log"):
+        """
+        Defines PipelineEventLog attributes.
+
+            The fact tables are created in the current schema on the first call to refresh().
+            Metrics of updates that reached a terminal state never change and are memoized in self.metrics_cache.
+        """
+        self.event_log_path = event_log_path
+        self.checkpoint_dir = checkpoint_dir
+        self.table_prefix = table_prefix
+        self.metrics_cache = dict()
+
+        self.flow_progress_table = f"{table_prefix}_flow_progress"
+        self.table_throughput_table = f"{table_prefix}_table_throughput"
+        self.expectations_table = f"{table_prefix}_expectations"
+        self.update_progress_table = f"{table_prefix}_update_progress"
+
+
+    def create_tables(self):
+        """
+        Creates the fact tables if they do not already exist.
+        """
+        spark.sql(f"""
+            CREATE TABLE IF NOT EXISTS {self.flow_progress_table}
+            (update_id STRING, flow_name STRING, status STRING, timestamp TIMESTAMP,
+             num_output_rows BIGINT, dropped_records BIGINT, backlog_bytes DOUBLE)""")
+        spark.sql(f"""
+            CREATE TABLE IF NOT EXISTS {self.table_throughput_table}
+            (update_id STRING, dataset STRING, num_output_rows BIGINT, first_timestamp TIMESTAMP, last_timestamp TIMESTAMP)""")
+        spark.sql(f"""
+            CREATE TABLE IF NOT EXISTS {self.expectations_table}
+            (update_id STRING, dataset STRING, expectation STRING, passed_records BIGINT, failed_records BIGINT)""")
+        spark.sql(f"""
+            CREATE TABLE IF NOT EXISTS {self.update_progress_table}
+            (update_id STRING, state STRING, timestamp TIMESTAMP)""")
+
+
+    def refresh(self):
+        """
+        Ingests only the event log versions committed since the last refresh.
+
+        The Delta streaming source records the last processed version in checkpoint_dir,
+        so each call reads the new commits instead of rereading the whole event log.
+        Writes use txnAppId/txnVersion so a retried micro-batch is not appended twice.
+
+        :return: the number of events ingested
+        """
+        start = dbgems.clock_start()
+        print(f"Ingesting new events from \"{self.event_log_path}\"", end="...")
+
+        self.create_tables()
+        self.events_ingested = 0
+
+        query = (spark.readStream
+                 .format("delta")
+                 .load(self.event_log_path)
+                 .writeStream
+                 .foreachBatch(self.ingest_batch)
+                 .option("checkpointLocation", self.checkpoint_dir)
+                 .trigger(availableNow=True)
+                 .start())
+        query.awaitTermination()
+
+        print(f"{self.events_ingested:,} events", end="...")
+        print(dbgems.clock_stopped(start))
+        return self.events_ingested
+
+
+    def ingest_batch(self, batch_df, batch_id):
+        """
+        Splits one micro-batch of raw events into the fact tables.
+
+        :param batch_df: raw event log rows
+        :param batch_id: micro-batch id, used as the idempotent transaction version
+        """
+        events_df = (batch_df
+                     .filter(F.col("event_type").isin("flow_progress", "update_progress"))
+                     .select("event_type", "timestamp", "origin.update_id", "origin.flow_name", "details")
+                     .cache())
+
+        flow_df = (events_df
+                   .filter(F.col("event_type") == "flow_progress")
+                   .selectExpr("update_id",
+                               "flow_name",
+                               "details:flow_progress.status::string AS status",
+                               "timestamp",
+                               "details:flow_progress.metrics.num_output_rows::bigint AS num_output_rows",
+                               "details:flow_progress.data_quality.dropped_records::bigint AS dropped_records",
+                               "details:flow_progress.metrics.backlog_bytes::double AS backlog_bytes",
+                               """from_json(details:flow_progress.data_quality.expectations,
+                                            'array<struct<name: string, dataset: string, passed_records: bigint, failed_records: bigint>>') AS expectations"""))
+
+        throughput_df = (flow_df
+                         .filter(F.col("num_output_rows").isNotNull())
+                         .groupBy("update_id", F.col("flow_name").alias("dataset"))
+                         .agg(F.sum("num_output_rows").alias("num_output_rows"),
+                              F.min("timestamp").alias("first_timestamp"),
+                              F.max("timestamp").alias("last_timestamp")))
+
+        expectations_df = (flow_df
+                           .select("update_id", F.explode("expectations").alias("e"))
+                           .groupBy("update_id", F.col("e.dataset").alias("dataset"), F.col("e.name").alias("expectation"))
+                           .agg(F.sum("e.passed_records").alias("passed_records"),
+                                F.sum("e.failed_records").alias("failed_records")))
+
+        update_df = (events_df
+                     .filter(F.col("event_type") == "update_progress")
+                     .selectExpr("update_id",
+                                 "details:update_progress.state::string AS state",
+                                 "timestamp"))
+
+        self.append(flow_df.drop("expectations"), self.flow_progress_table, batch_id)
+        self.append(throughput_df, self.table_throughput_table, batch_id)
+        self.append(expectations_df, self.expectations_table, batch_id)
+        self.append(update_df, self.update_progress_table, batch_id)
+
+        self.events_ingested += events_df.count()
+        events_df.unpersist()
+
+
+    def append(self, df, table_name, batch_id):
+        (df.write
+           .format("delta")
+           .mode("append")
+           .option("txnAppId", f"{self.checkpoint_dir}/{table_name}")
+           .option("txnVersion", batch_id)
+           .saveAsTable(table_name))
+
+
+    def get_metrics(self, update_id):
+        """
+        Returns the metrics of one update from the fact tables.
+
+        :param update_id: the DLT update to look up
+        :return: dictionary with the keys "state", "flows", "tables", "expectations" and "phases",
+                 each of the latter four holding a list of dictionaries
+        """
+        if update_id in self.metrics_cache:
+            return self.metrics_cache[update_id]
+
+        flows = spark.sql(f"""
+            SELECT flow_name,
+                   max_by(status, timestamp) AS status,
+                   min(timestamp) AS start_time,
+                   max(timestamp) AS end_time,
+                   unix_timestamp(max(timestamp)) - unix_timestamp(min(timestamp)) AS duration_seconds,
+                   sum(num_output_rows) AS num_output_rows,
+                   sum(dropped_records) AS dropped_records
+            FROM {self.flow_progress_table}
+            WHERE update_id = '{update_id}'
+            GROUP BY flow_name""")
+
+        tables = spark.sql(f"""
+            SELECT dataset,
+                   num_output_rows,
+                   duration_seconds,
+                   num_output_rows / nullif(duration_seconds, 0) AS rows_per_second
+            FROM (SELECT dataset,
+                         sum(num_output_rows) AS num_output_rows,
+                         unix_timestamp(max(last_timestamp)) - unix_timestamp(min(first_timestamp)) AS duration_seconds
+                  FROM {self.table_throughput_table}
+                  WHERE update_id = '{update_id}'
+                  GROUP BY dataset)""")
+
+        expectations = spark.sql(f"""
+            SELECT dataset, expectation, passed_records, failed_records,
+                   passed_records / nullif(passed_records + failed_records, 0) AS pass_rate
+            FROM (SELECT dataset, expectation,
+                         sum(passed_records) AS passed_records,
+                         sum(failed_records) AS failed_records
+                  FROM {self.expectations_table}
+                  WHERE update_id = '{update_id}'
+                  GROUP BY dataset, expectation)""")
+
+        phases = spark.sql(f"""
+            SELECT state AS phase,
+                   timestamp AS start_time,
+                   unix_timestamp(lead(timestamp) OVER (ORDER BY timestamp)) - unix_timestamp(timestamp) AS duration_seconds
+            FROM {self.update_progress_table}
+            WHERE update_id = '{update_id}'""")
+
+        phase_rows = [r.asDict() for r in phases.orderBy("start_time").collect()]
+        state = phase_rows[-1].get("phase") if phase_rows else None
+
+        metrics = {
+            "update_id": update_id,
+            "state": state,
+            "flows": [r.asDict() for r in flows.collect()],
+            "tables": [r.asDict() for r in tables.collect()],
+            "expectations": [r.asDict() for r in expectations.collect()],
+            "phases": phase_rows,
+        }
+
+        if state in PipelineEventLog.TERMINAL_STATES:
+            self.metrics_cache[update_id] = metrics
+
+        return metrics
+
+
+    def get_flow_history(self):
+        """
+        Returns one row per update and flow, ordered by the time each flow started.
+
+        :return: list of dictionaries with update_id, flow_name, start_time, duration_seconds and num_output_rows
+        """
+        history = spark.sql(f"""
+            SELECT update_id,
+                   flow_name,
+                   min(timestamp) AS start_time,
+                   unix_timestamp(max(timestamp)) - unix_timestamp(min(timestamp)) AS duration_seconds,
+                   sum(num_output_rows) AS num_output_rows
+            FROM {self.flow_progress_table}
+            GROUP BY update_id, flow_name
+            ORDER BY start_time""")
+        return [r.asDict() for r in history.collect()]
+
+None
+
+# COMMAND ----------
+
+@DBAcademyHelper.monkey_patch
+def get_pipeline_event_log(self, storage_location=None):
+    """
+    Returns the PipelineEventLog for the pipeline's storage location, creating it on first use.
+
+    :param storage_location: overrides self.paths.storage_location (optional)
+    :return: PipelineEventLog bound to {storage_location}/system/events
+    """
+    if storage_location is None: storage_location = self.paths.storage_location
+
+    import hashlib
+
+    if not hasattr(self, "pipeline_event_logs"): self.pipeline_event_logs = dict()
+
+    if storage_location not in self.pipeline_event_logs:
+        # One checkpoint per event log; the Delta source cannot share a checkpoint across paths
+        location_hash = hashlib.md5(storage_location.encode("utf-8")).hexdigest()[:8]
+        self.pipeline_event_logs[storage_location] = PipelineEventLog(event_log_path=f"{storage_location}/system/events",
+                                                                      checkpoint_dir=f"{self.paths.working_dir}/event_log_checkpoint/{location_hash}")
+    return self.pipeline_event_logs[storage_location]
+
+
+@DBAcademyHelper.monkey_patch
+def pipeline_metrics(self, update_id, refresh=True, storage_location=None):
+    """
+    Returns flow progress, per-table throughput, expectation pass rates and phase durations for one update.
+
+    Completed updates are answered from memory; otherwise the event log is refreshed incrementally first.
+    See also PipelineEventLog.get_metrics
+
+    :param update_id: the DLT update to look up, e.g. the value returned by start_pipeline
+    :param refresh: if True (default), ingest new events before looking up an update not yet cached
+    :param storage_location: overrides self.paths.storage_location (optional)
+    :return: dictionary of metrics for the update
+    """
+    event_log = self.get_pipeline_event_log(storage_location)
+
+    if refresh and update_id not in event_log.metrics_cache:
+        event_log.refresh()
+
+    return event_log.get_metrics(update_id)
+
+None
@@ -0,0 +1,457 @@
+# Databricks notebook source
+import builtins  # Lessons shadow max and sum with pyspark.sql.functions, e.g. section2-spark-ELT-C
+import re
+
+class PlanNode:
+    """
+    One operator of a query plan, parsed from the plan's tree string.
+
+      Attributes:
+          depth: nesting level, 0 for the root
+          operator: operator name, e.g. "Filter", "FileScan" or "InMemoryTableScan"
+          details: the rest of the line, with expression IDs and file locations removed
+          children: child PlanNodes
+    """
+
+    PREFIX_PATTERN = re.compile(r"^([\s:|+\-]*)(?:\*\(\d+\)\s+)?(.*)$")
+    NORMALIZE_PATTERNS = [
+        (re.compile(r"#\d+L?"), ""),                      # Expression IDs change on every run
+        (re.compile(r"Location: [^\[]*\[[^\]]*\]"), "Location: ..."),
+        (re.compile(r"plan_id=\d+"), "plan_id=..."),
+    ]
+
+    def __init__(self, depth, operator, details):
+        self.depth = depth
+        self.operator = operator
+        self.details = details
+        self.children = []
+
+
+    @staticmethod
+    def normalize(text):
+        for pattern, replacement in PlanNode.NORMALIZE_PATTERNS:
+            text = pattern.sub(replacement, text)
+        return text.strip()
+
+
+    @staticmethod
+    def parse(tree_string):
+        """
+        Parses the output of treeString() into a list of PlanNodes in pre-order, linked to their children.
+        """
+        nodes = []
+        stack = []
+
+        for line in tree_string.splitlines():
+            if line.strip() == "": continue
+            prefix, text = PlanNode.PREFIX_PATTERN.match(line).groups()
+            if text == "" or text.startswith("("): continue  # Continuation lines of formatted plans
+
+            depth = len(prefix) // 3
+            operator, _, details = text.partition(" ")
+            node = PlanNode(depth, operator, PlanNode.normalize(details))
+
+            while len(stack) > 0 and stack[-1].depth >= depth: stack.pop()
+            if len(stack) > 0: stack[-1].children.append(node)
+            stack.append(node)
+            nodes.append(node)
+
+        return nodes
+
+
+    def get_descendants(self):
+        for child in self.children:
+            yield child
+            yield from child.get_descendants()
+
+
+    def get_list(self, name):
+        """
+        Returns the elements of a "Name: [a, b]" attribute of a scan, e.g. PushedFilters, or None if absent.
+        """
+        marker = f"{name}: ["
+        start = self.details.find(marker)
+        if start < 0: return None
+
+        start += len(marker)
+        depth, end = 1, start
+        while end < len(self.details) and depth > 0:
+            if self.details[end] in "[(": depth += 1
+            elif self.details[end] in "])": depth -= 1
+            end += 1
+
+        return [e.strip("* ") for e in split_top_level(self.details[start:end-1], ",") if e.strip() != ""]
+
+
+    def __str__(self):
+        return f"""{"  " * self.depth}{self.operator} {self.details}""".rstrip()
+
+
+def split_top_level(text, separator):
+    """
+    Splits text on separator, ignoring separators nested in parentheses or brackets.
+    """
+    parts, depth, current = [], 0, ""
+    i = 0
+    while i < len(text):
+        if text[i] in "[(": depth += 1
+        elif text[i] in "])": depth -= 1
+
+        if depth == 0 and text.startswith(separator, i):
+            parts.append(current)
+            current = ""
+            i += len(separator)
+            continue
+
+        current += text[i]
+        i += 1
+
+    parts.append(current)
+    return [p.strip() for p in parts]
+
+
+def split_conjuncts(condition):
+    """
+    Flattens a condition such as "((a AND b) AND c)" into its conjuncts ["a", "b", "c"].
+    """
+    condition = condition.strip()
+    while condition.startswith("(") and condition.endswith(")") and is_balanced(condition[1:-1]):
+        condition = condition[1:-1].strip()
+
+    parts = split_top_level(condition, " AND ")
+    if len(parts) == 1: return parts
+    return [c for p in parts for c in split_conjuncts(p)]
+
+
+def is_balanced(text):
+    depth = 0
+    for c in text:
+        if c in "[(": depth += 1
+        elif c in "])": depth -= 1
+        if depth < 0: return False
+    return depth == 0
+
+None
+
+# COMMAND ----------
+
+class PlanInspector:
+    """
+    Captures the analyzed, optimized and physical plans of a DataFrame, flags common optimization
+    problems and, optionally, measures the scan bytes and task time of actually running it.
+
+    This turns the "compare the explain(True) output" exercises of DE 0.13 into checks that can be
+    asserted, e.g. against a baseline recorded from an earlier version of a production query.
+
+      Attributes:
+          name: label used in reports
+          df: the DataFrame being inspected
+          plans: {"analyzed": [PlanNode], "optimized": [PlanNode], "physical": [PlanNode]}
+          metrics: dictionary filled by measure()
+
+      Methods:
+          diff(source="analyzed", target="optimized"): unified diff between two of the plans
+          find_issues(): missed pushdowns, redundant filters and predicates that did not reach the source
+          measure(): runs the query and records its duration, input bytes and task time
+          get_baseline(): JSON-serializable summary to compare later runs against
+          assert_no_regression(baseline, tolerance=0.25): fails if the plan or its cost got worse
+    """
+
+    STAGES = ["analyzed", "optimized", "physical"]
+    SCAN_OPERATORS = ["FileScan", "Scan", "BatchScan", "PhotonScan"]
+
+    def __init__(self, df, name=None):
+        query_execution = df._jdf.queryExecution()
+
+        self.name = name or "df"
+        self.df = df
+        self.plans = {
+            "analyzed": PlanNode.parse(query_execution.analyzed().treeString()),
+            "optimized": PlanNode.parse(query_execution.optimizedPlan().treeString()),
+            "physical": PlanNode.parse(query_execution.executedPlan().treeString()),
+        }
+        self.metrics = dict()
+
+
+    def get_operators(self, stage, operator):
+        return [n for n in self.plans[stage] if n.operator == operator]
+
+
+    def get_scans(self):
+        return [n for n in self.plans["physical"] if n.operator in PlanInspector.SCAN_OPERATORS]
+
+
+    def diff(self, source="analyzed", target="optimized"):
+        """
+        Returns the unified diff of two plans, one line per operator, with expression IDs removed.
+        """
+        import difflib
+
+        assert source in PlanInspector.STAGES and target in PlanInspector.STAGES, f"Expected stages from {PlanInspector.STAGES}, found {source} and {target}"
+        lines = lambda stage: [str(n) for n in self.plans[stage]]
+        return list(difflib.unified_diff(lines(source), lines(target), fromfile=source, tofile=target, lineterm=""))
+
+
+    def issue(self, severity, issue, detail):
+        return {"name": self.name, "severity": severity, "issue": issue, "detail": detail}
+
+
+    def find_issues(self):
+        """
+        Inspects the plans for:
+          * filter chains that Catalyst had to combine, and predicates repeated within them
+          * filters evaluated above a cached relation, where they cannot be pushed to the source
+          * filters above a scan that did not push any predicate down
+          * scans whose data filters were only partially pushed down, e.g. predicates using a Python UDF
+
+        :return: list of dictionaries with name, severity ("info" or "warning"), issue and detail
+        """
+        issues = []
+
+        analyzed_filters = self.get_operators("analyzed", "Filter")
+        optimized_filters = self.get_operators("optimized", "Filter")
+        if len(analyzed_filters) > builtins.max(1, len(optimized_filters)):
+            issues.append(self.issue("info", "combined_filters", f"{len(analyzed_filters)} Filter operators were combined into {len(optimized_filters)}"))
+
+        predicates = dict()
+        for node in analyzed_filters:
+            for predicate in split_conjuncts(node.details):
+                predicates[predicate] = predicates.get(predicate, 0) + 1
+        for predicate, count in predicates.items():
+            if count > 1: issues.append(self.issue("warning", "redundant_filter", f"\"{predicate}\" is applied {count} times"))
+
+        for node in self.get_operators("physical", "Filter"):
+            descendants = list(node.get_descendants())
+
+            if any(d.operator == "InMemoryTableScan" for d in descendants):
+                issues.append(self.issue("warning", "cached_before_filter", f"Filter {node.details} runs on a cached relation and cannot be pushed to the source"))
+                continue
+
+            for scan in [d for d in descendants if d.operator in PlanInspector.SCAN_OPERATORS]:
+                pushed = scan.get_list("PushedFilters")
+                if pushed is not None and len(pushed) == 0:
+                    issues.append(self.issue("warning", "missed_pushdown", f"Filter {node.details} was not pushed into {scan.operator} {scan.details.split(' ')[0]}"))
+
+            if any(d.operator in ["BatchEvalPython", "ArrowEvalPython"] for d in descendants):
+                issues.append(self.issue("warning", "python_udf_predicate", f"Filter {node.details} depends on a Python UDF, which no source can evaluate"))
+
+        for scan in self.get_scans():
+            pushed = scan.get_list("PushedFilters") or []
+            data_filters = scan.get_list("DataFilters")
+            if data_filters is not None and len(data_filters) > len(pushed):
+                issues.append(self.issue("warning", "non_pushed_predicate", f"{len(pushed)} of {len(data_filters)} data filter(s) were pushed into {scan.operator} {scan.details.split(' ')[0]}: {data_filters}"))
+
+        return issues
+
+
+    def measure(self, timeout_seconds=30):
+        """
+        Runs the query against the "noop" sink and collects the metrics of its stages from the Spark UI's REST API.
+
+        Input bytes are only reported by file-based sources; task time is the sum of executorRunTime
+        over every stage. If the REST API is not reachable from the driver, only the duration is recorded.
+
+        :return: dictionary with seconds, stages, tasks, input_bytes, input_records, shuffle_bytes and task_seconds
+        """
+        import time, uuid
+
+        sc = spark.sparkContext
+        group = f"plan_inspector_{uuid.uuid4().hex}"
+
+        sc.setJobGroup(group, f"Measuring {self.name}")
+        start = time.time()
+        try:
+            self.df.write.format("noop").mode("overwrite").save()
+        finally:
+            sc.setLocalProperty("spark.jobGroup.id", None)
+            sc.setLocalProperty("spark.job.description", None)
+        elapsed = time.time() - start
+
+        tracker = sc.statusTracker()
+        stage_ids = [s for job_id in tracker.getJobIdsForGroup(group) for s in tracker.getJobInfo(job_id).stageIds]
+
+        self.metrics = {"seconds": elapsed, "stages": len(stage_ids)}
+        self.metrics.update(PlanInspector.get_stage_metrics(stage_ids, timeout_seconds))
+        return self.metrics
+
+
+    @staticmethod
+    def get_stage_metrics(stage_ids, timeout_seconds):
+        """
+        Sums the task metrics of the stages, waiting for the listener bus to report every stage as finished.
+        """
+        import json, time, urllib.request
+
+        sc = spark.sparkContext
+        totals = {"tasks": None, "input_bytes": None, "input_records": None, "shuffle_bytes": None, "task_seconds": None}
+        if sc.uiWebUrl is None: return totals
+
+        start = time.time()
+        while True:
+            attempts = []
+            try:
+                for stage_id in stage_ids:
+                    url = f"{sc.uiWebUrl}/api/v1/applications/{sc.applicationId}/stages/{stage_id}"
+                    with urllib.request.urlopen(url, timeout=10) as response:
+                        attempts.extend(json.loads(response.read()))
+            except Exception as e:
+                print(f"WARNING: Unable to read the stage metrics from the Spark UI: {e}")
+                return totals
+
+            if all(a.get("status") in ["COMPLETE", "SKIPPED", "FAILED"] for a in attempts) or time.time() - start > timeout_seconds: break
+            time.sleep(1)
+
+        return {
+            "tasks": builtins.sum(a.get("numCompleteTasks", 0) for a in attempts),
+            "input_bytes": builtins.sum(a.get("inputBytes", 0) for a in attempts),
+            "input_records": builtins.sum(a.get("inputRecords", 0) for a in attempts),
+            "shuffle_bytes": builtins.sum(a.get("shuffleWriteBytes", 0) for a in attempts),
+            "task_seconds": builtins.sum(a.get("executorRunTime", 0) for a in attempts) / 1000,
+        }
+
+
+    def get_signature(self):
+        """
+        Returns the physical plan with expression IDs and file locations removed, stable across runs of the same query.
+        """
+        return "\n".join(str(n) for n in self.plans["physical"])
+
+
+    def get_baseline(self):
+        """
+        Returns a JSON-serializable summary of this query to store and pass to assert_no_regression later.
+        """
+        return {
+            "name": self.name,
+            "signature": self.get_signature(),
+            "warnings": sorted(i["issue"] for i in self.find_issues() if i["severity"] == "warning"),
+            "input_bytes": self.metrics.get("input_bytes"),
+            "task_seconds": self.metrics.get("task_seconds"),
+        }
+
+
+    def assert_no_regression(self, baseline, tolerance=0.25):
+        """
+        Asserts that the query has no more warnings than the baseline and that, if both were measured,
+        its input bytes and task time grew by no more than the tolerance. A changed plan is reported but not failed.
+
+        :param baseline: the result of get_baseline(), or another PlanInspector
+        :param tolerance: allowed relative growth of input_bytes and task_seconds
+        """
+        if isinstance(baseline, PlanInspector): baseline = baseline.get_baseline()
+        current = self.get_baseline()
+
+        if current["signature"] != baseline["signature"]:
+            import difflib
+            print(f"The physical plan of \"{self.name}\" changed:")
+            for line in difflib.unified_diff(baseline["signature"].splitlines(), current["signature"].splitlines(), "baseline", "current", lineterm=""):
+                print(line)
+
+        new_warnings = list(current["warnings"])
+        for warning in baseline["warnings"]:
+            if warning in new_warnings: new_warnings.remove(warning)
+        assert len(new_warnings) == 0, f"Found new plan warning(s) in \"{self.name}\": {new_warnings}"
+
+        for key in ["input_bytes", "task_seconds"]:
+            if current[key] is None or not baseline[key]: continue
+            assert current[key] <= baseline[key] * (1 + tolerance), f"Expected {key} of \"{self.name}\" to be at most {baseline[key] * (1 + tolerance):,.2f}, found {current[key]:,.2f}"
+
+None
+
+# COMMAND ----------
+
+class PlanComparison:
+    """
+    Inspects several variants of the same query side by side, e.g. limit_events_df, better_df and stupid_df.
+
+      Attributes:
+          inspectors: {name: PlanInspector}, in the order the variants were given
+
+      Methods:
+          run(measure=True): measures every variant (optional) and returns the report
+          get_issues(): the issues of every variant
+          display_report(): renders the report and the issues as HTML
+    """
+
+    def __init__(self, variants):
+        self.inspectors = {name: PlanInspector(df, name) for name, df in variants.items()}
+
+
+    def run(self, measure=True):
+        for name, inspector in self.inspectors.items():
+            if measure:
+                print(f"Measuring {name}", end="...")
+                inspector.measure()
+                print(f"""{inspector.metrics.get("seconds"):,.2f} seconds""")
+        return self.get_report()
+
+
+    def get_report(self):
+        report = []
+        for name, inspector in self.inspectors.items():
+            issues = inspector.find_issues()
+            report.append({
+                "variant": name,
+                "analyzed_filters": len(inspector.get_operators("analyzed", "Filter")),
+                "optimized_filters": len(inspector.get_operators("optimized", "Filter")),
+                "physical_operators": len(inspector.plans["physical"]),
+                "warnings": len([i for i in issues if i["severity"] == "warning"]),
+                "seconds": inspector.metrics.get("seconds"),
+                "input_bytes": inspector.metrics.get("input_bytes"),
+                "shuffle_bytes": inspector.metrics.get("shuffle_bytes"),
+                "task_seconds": inspector.metrics.get("task_seconds"),
+            })
+        return report
+
+
+    def get_issues(self):
+        return [i for inspector in self.inspectors.values() for i in inspector.find_issues()]
+
+
+    @staticmethod
+    def to_html(rows):
+        html = """<table style="width:100%"><tr>"""
+        for key in rows[0].keys(): html += f"""<th style="text-align:left">{key}</th>"""
+        html += "</tr>"
+        for row in rows:
+            html += "<tr>"
+            for value in row.values():
+                html += f"""<td>{value:,.2f}</td>""" if type(value) is float else f"""<td>{"" if value is None else value}</td>"""
+            html += "</tr>"
+        html += "</table>"
+        return html
+
+
+    def display_report(self):
+        """
+        Displays one row per variant followed by every issue found.
+        """
+        html = PlanComparison.to_html(self.get_report())
+        issues = self.get_issues()
+        if len(issues) > 0: html += "<br/>" + PlanComparison.to_html(issues)
+        displayHTML(html)
+
+None
+
+# COMMAND ----------
+
+@DBAcademyHelper.monkey_patch
+def inspect_query_plans(self, measure=True, **variants):
+    """
+    Compares the plans, issues and, if measure is True, the runtime metrics of one or more DataFrames.
+
+    Example:
+        DA.inspect_query_plans(limit_events_df=limit_events_df, better_df=better_df, stupid_df=stupid_df)
+
+    :param measure: if True (default), runs every variant against the "noop" sink
+    :param variants: the DataFrames to inspect, by name
+    :return: the PlanComparison
+    """
+    assert len(variants) > 0, "Expected at least one DataFrame to inspect"
+
+    comparison = PlanComparison(variants)
+    comparison.run(measure=measure)
+    comparison.display_report()
+    return comparison
+
+None